@@ -1,24 +1,112 @@
-import struct
+import time
+STARTUP_TIME = time.perf_counter()
+
+import concurrent.futures
 import sys
 import json
-import socket # Added import
-
-from pupil_labs.realtime_api.simple import discover_one_device
-from pupil_labs.real_time_screen_gaze.gaze_mapper import GazeMapper
-
-from PySide6.QtCore import *
-from PySide6.QtGui import *
-from PySide6.QtWidgets import *
 
-import pyautogui
+# pupil_labs, OpenCV and pyautogui are imported lazily by DeviceConnector and CursorActuator
+from PySide6.QtCore import QObject, Qt, QTimer, Signal
+from PySide6.QtWidgets import QApplication
 
 from ui import TagWindow
-from dwell_detector import DwellDetector
+from connection_manager import ConnectionManager, RESUME_TARGET_SECONDS
+from control_server import ControlServer, validateSettings
+from cursor_actuator import CursorActuator
+from device_connector import DeviceConnector
+from gaze_heatmap import GazeHeatmap
+from gaze_quality import NOT_WORN, VALID, QualityGate
+from gaze_pipeline import GazePipeline, PipelineObserver
+from target_index import TargetRegistry
 
-pyautogui.FAILSAFE = False
 # --- Configuration ---
 UNITY_IP = "127.0.0.1"  # IP address
 UNITY_PORT = 5005       # UDP port
+EVENT_OUTPUT = False # Also send eye movement, blink, dwell and click event packets to UNITY_PORT, see gaze_packet.py
+SEQUENCED_OUTPUT = False # Sequence-numbered packets, events (implies EVENT_OUTPUT) acknowledged and retransmitted, see reliable_link.py
+SHARED_MEMORY_RING = False # Also publish gaze to gaze_ring.py shared memory for local consumers
+SCENE_PYRAMID_LEVELS = 0 # Scene frame downscaling before marker detection, see frame_preprocessor.py
+SCENE_DECODE_THREAD = True # Decode scene video on its own thread into pooled frames, see scene_decoder.py
+SCENE_COLOUR = False # Only needed by consumers of colour scene frames; marker detection uses grayscale
+EYE_MOVEMENT_DETECTOR = 'idt' # 'ivt' (velocity) or 'idt' (dispersion), see eye_movement_detector.py
+TARGETS_FILE = None # JSON list of gaze targets in window pixels, see target_index.py
+TARGET_SNAP_RADIUS = 40 # Gaze within this many pixels of a target snaps to it
+BLINK_APERTURE_MM = 2.0 # Both eyelid apertures below this count as a blink, see gaze_quality.py
+MIN_SURFACE_CONFIDENCE = 0.5 # Fraction of the tags detected; mapped samples below this are neither dwelled on nor sent
+ADAPTIVE_DWELL_RADIUS_BOUNDS = (10, 150) # Pixels, limits of the noise-driven dwell radius
+DWELL_EXIT_SCALE = 1.5 # A dwell ends once gaze leaves this many dwell radii, see dwell_detector.DwellClicker
+DWELL_COOLDOWN = 0.5 # Seconds after a dwell click before the next one can fire
+HEATMAP_GRID_SIZE = (192, 108) # Heatmap cells across the surface, see gaze_heatmap.py
+HEATMAP_SIGMA = 2.0 # Gaussian blur in cells
+HEATMAP_HALF_LIFE = 30.0 # Seconds, or None to accumulate for the whole session
+HEATMAP_REFRESH_RATE = 2 # Heatmap snapshots per second while it is shown
+HEATMAP_PORT = None # UDP port to also send PNG heatmap snapshots to on UNITY_IP
+CONTROL_PORT = None # Loopback TCP port of the JSON-RPC control socket (e.g. 5006), see control_server.py; unauthenticated, so any local user can connect
+CONTROL_SOCKET_PATH = None # Unix socket path to serve the control socket on instead, only accessible to this user
+
+# Startup targets, measured from process start and reported on stdout
+TARGET_FIRST_WINDOW_SECONDS = 1.0
+TARGET_FIRST_GAZE_SECONDS = 5.0
+
+# Reconnect after this long without data; time-to-resume target, see connection_manager.py
+STALE_CONNECTION_SECONDS = 2.0
+TARGET_RESUME_SECONDS = RESUME_TARGET_SECONDS
+
+
+class TagWindowObserver(PipelineObserver):
+    """Shows pipeline results in the TagWindow and drives the cursor when mouse control is on."""
+    def __init__(self, app):
+        self.app = app
+        self.tagWindow = app.tagWindow
+
+    def frequencyChanged(self, frequency):
+        self.tagWindow.setFrequency(frequency)
+
+    def markersDetected(self, markerIds):
+        self.tagWindow.showMarkerFeedback(markerIds)
+
+    def effectiveDwellChanged(self, radius, duration, noise):
+        self.tagWindow.setEffectiveDwell(radius, duration, noise)
+
+    def qualityChanged(self, quality):
+        if quality != VALID:
+            # The pipeline ends any dwell, so the progress ring starts over
+            self.tagWindow.setDwellProgress(0.0, False)
+        if quality == NOT_WORN:
+            # Marker detection is suspended, so no stale feedback stays on screen
+            self.tagWindow.showMarkerFeedback([])
+
+    def sampleProcessed(self, sample):
+        self.tagWindow.setDwellProgress(sample.dwellProgress, sample.dwell)
+        self.tagWindow.showGlobalPoint(sample.pointX, sample.pointY)
+        if self.app.mouseEnabled:
+            self.app.cursorActuator.moveTo(sample.pointX, sample.pointY)
+
+    def dwellClicked(self, x, y, sample):
+        if self.app.mouseEnabled:
+            self.app.cursorActuator.click(x, y)
+
+
+class ControlDispatcher(QObject):
+    """Runs control requests on the GUI thread. poll() runs there too, so a request lands between two samples."""
+    requested = Signal(object, object)
+
+    def __init__(self):
+        super().__init__()
+        self.requested.connect(self.run, Qt.QueuedConnection)
+
+    def __call__(self, function):
+        future = concurrent.futures.Future()
+        self.requested.emit(function, future)
+        return future
+
+    def run(self, function, future):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(function())
+        except Exception as e:
+            future.set_exception(e)
 
 
 class PupilPointerApp(QApplication):
@@ -27,76 +115,222 @@ class PupilPointerApp(QApplication):
 
         self.setApplicationDisplayName('Pupil Pointer')
         self.mouseEnabled = False
+        self.heatmapEndpoint = (UNITY_IP, HEATMAP_PORT) if HEATMAP_PORT is not None else None
 
         self.tagWindow = TagWindow()
 
         self.device = None
-        self.dwellDetector = DwellDetector(.75, 75)
-        self.smoothing = 0.3 # Changed from 0.8 to 0.3 for more responsiveness
-        self.gazeFrequency = 0 # Add new instance variable for frequency
+        targets = TargetRegistry(snapRadius=TARGET_SNAP_RADIUS)
+        if TARGETS_FILE is not None:
+            targets.load(TARGETS_FILE)
+        self.heatmap = GazeHeatmap(*HEATMAP_GRID_SIZE, sigma=HEATMAP_SIGMA, halfLife=HEATMAP_HALF_LIFE)
+
+        gazeRing = None
+        if SHARED_MEMORY_RING:
+            from gaze_ring import GazeRingWriter
+            try:
+                gazeRing = GazeRingWriter()
+            except FileExistsError as e:
+                print(f"Shared memory gaze ring disabled: {e}")
+
+        self.pipeline = GazePipeline(
+            (UNITY_IP, UNITY_PORT),
+            smoothing=0.3, # Changed from 0.8 to 0.3 for more responsiveness
+            dwellRadius=self.tagWindow.dwellRadiusInput.value(),
+            adaptiveDwellBounds=ADAPTIVE_DWELL_RADIUS_BOUNDS,
+            dwellExitScale=DWELL_EXIT_SCALE,
+            dwellCooldown=DWELL_COOLDOWN,
+            eyeMovementDetector=EYE_MOVEMENT_DETECTOR,
+            qualityGate=QualityGate(BLINK_APERTURE_MM, MIN_SURFACE_CONFIDENCE),
+            targets=targets,
+            heatmap=self.heatmap,
+            gazeRing=gazeRing,
+            eventOutput=EVENT_OUTPUT,
+            sequenced=SEQUENCED_OUTPUT,
+        )
+        self.pipeline.addObserver(TagWindowObserver(self))
+
+        self.cursorActuator = CursorActuator(self.primaryScreen().refreshRate())
 
-        # Initialize UDP Socket
-        self.udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.connection = ConnectionManager(STALE_CONNECTION_SECONDS, TARGET_RESUME_SECONDS)
+        self.deviceConnector = DeviceConnector(SCENE_PYRAMID_LEVELS, threadedDecode=SCENE_DECODE_THREAD, colour=SCENE_COLOUR)
+        self.deviceConnector.connected.connect(self.onDeviceConnected)
+        self.deviceConnector.gazeMapperChanged.connect(self.onGazeMapperChanged)
 
         self.tagWindow.surfaceChanged.connect(self.onSurfaceChanged)
 
-        self.tagWindow.dwellTimeChanged.connect(self.dwellDetector.setDuration)
-        self.tagWindow.dwellRadiusChanged.connect(self.dwellDetector.setRange)
+        self.tagWindow.dwellTimeChanged.connect(self.pipeline.setDwellDuration)
+        self.tagWindow.dwellRadiusChanged.connect(self.pipeline.setDwellRadius)
+        self.tagWindow.adaptiveDwellChanged.connect(self.pipeline.setAdaptiveDwell)
         self.tagWindow.mouseEnableChanged.connect(self.setMouseEnabled)
-        self.tagWindow.smoothingChanged.connect(self.setSmoothing)
+        self.tagWindow.smoothingChanged.connect(self.pipeline.setSmoothing)
+        self.tagWindow.heatmapEnableChanged.connect(self.setHeatmapEnabled)
         self.tagWindow.leftTagOffsetChanged.connect(self.onSurfaceChanged) # Connect renamed signal
         self.tagWindow.rightTagOffsetChanged.connect(self.onSurfaceChanged) # Connect new signal
 
-        self.last_timestamps = []
-
         self.pollTimer = QTimer()
         self.pollTimer.setInterval(int(1000 / 60)) # Changed from 1000 / 30 to poll at 60Hz 
         self.pollTimer.timeout.connect(self.poll)
 
-        self.surface = None
-        self.firstPoll = True
+        self.heatmapTimer = QTimer()
+        self.heatmapTimer.setInterval(int(1000 / HEATMAP_REFRESH_RATE))
+        self.heatmapTimer.timeout.connect(self.publishHeatmap)
+        if self.heatmapEndpoint is not None:
+            self.heatmapTimer.start()
+
+        self.controlServer = None
+        if CONTROL_PORT is not None or CONTROL_SOCKET_PATH is not None:
+            self.controlServer = ControlServer(
+                {'get_state': self.getControlState, 'set': self.configure},
+                port=CONTROL_PORT, path=CONTROL_SOCKET_PATH, dispatch=ControlDispatcher(),
+            )
 
-        self.mousePosition = None
-        self.gazeMapper = None
+        self.firstPoll = True
 
     def onSurfaceChanged(self):
         self.updateSurface()
 
-    def start(self):
-        self.device = discover_one_device(max_search_duration_seconds=0.25)
+    def reportStartupTime(self, milestone, target):
+        elapsed = time.perf_counter() - STARTUP_TIME
+        verdict = 'within' if elapsed <= target else 'OVER'
+        print(f"Time to {milestone}: {elapsed:.2f} s ({verdict} target of {target:.2f} s)")
 
-        if self.device is None:
-            QTimer.singleShot(1000, self.start)
-            return
-
-        calibration = self.device.get_calibration()
-        self.gazeMapper = GazeMapper(calibration)
+    def start(self):
+        self.reportStartupTime('first window', TARGET_FIRST_WINDOW_SECONDS)
+        self.deviceConnector.start()
+        if self.controlServer is not None:
+            if self.controlServer.start():
+                print(f"Control socket on {self.controlServer.address}")
+            else:
+                print(f"Control socket unavailable: {self.controlServer.error}")
+
+    def getControlState(self):
+        config = self.pipeline.config.current()
+        return {
+            "smoothing": config.smoothing,
+            "dwell_duration": config.dwellDuration,
+            "dwell_radius": config.dwellRadius,
+            "adaptive_dwell": config.adaptiveDwell,
+            "left_tag_offset": self.tagWindow.leftTagOffsetInput.value(),
+            "right_tag_offset": self.tagWindow.rightTagOffsetInput.value(),
+            "mouse_enabled": self.mouseEnabled,
+            "endpoint": list(config.endpoint),
+            "heatmap_endpoint": None if self.heatmapEndpoint is None else list(self.heatmapEndpoint),
+            "surface_size": list(config.surfaceSize),
+            "device": None if self.device is None else str(self.device),
+            "gaze_frequency": self.pipeline.gazeFrequency,
+            "connection": self.connection.getStats(),
+        }
+
+    def configure(self, **settings):
+        """Control socket "set": validates every setting, then applies them together. Returns the new state."""
+        settings = validateSettings(settings)
+
+        pipelineSettings = {
+            field: settings[name] for name, field in (
+                ('smoothing', 'smoothing'), ('dwell_duration', 'dwellDuration'), ('dwell_radius', 'dwellRadius'),
+                ('adaptive_dwell', 'adaptiveDwell'), ('endpoint', 'endpoint'),
+            ) if name in settings
+        }
+        if pipelineSettings:
+            self.pipeline.updateConfig(**pipelineSettings)
+
+        # Show the new values without the inputs' signals setting the pipeline again one by one
+        tagWindow = self.tagWindow
+        for name, widget in (
+            ('smoothing', tagWindow.smoothingInput), ('dwell_duration', tagWindow.dwellTimeInput),
+            ('dwell_radius', tagWindow.dwellRadiusInput),
+        ):
+            if name in settings:
+                widget.blockSignals(True)
+                widget.setValue(settings[name])
+                widget.blockSignals(False)
+
+        # These also change the window (radius input, markers, cursor), so they go through the inputs;
+        # the adaptive dwell checkbox sets the pipeline to the value it already has
+        if 'adaptive_dwell' in settings:
+            tagWindow.adaptiveDwellInput.setChecked(settings['adaptive_dwell'])
+        if 'left_tag_offset' in settings:
+            tagWindow.leftTagOffsetInput.setValue(settings['left_tag_offset'])
+        if 'right_tag_offset' in settings:
+            tagWindow.rightTagOffsetInput.setValue(settings['right_tag_offset'])
+        if 'mouse_enabled' in settings:
+            tagWindow.mouseEnabledInput.setChecked(settings['mouse_enabled'])
+
+        if 'heatmap_endpoint' in settings:
+            self.heatmapEndpoint = settings['heatmap_endpoint']
+            self.setHeatmapEnabled(tagWindow.heatmapEnabledInput.isChecked())
+
+        return self.getControlState()
+
+    def onDeviceConnected(self, device, gazeMapper):
+        self.device = device
+        self.connection.markConnected()
 
         self.tagWindow.setStatus(f'Connected to {self.device}. One moment...')
 
+        # A reconnect brings a freshly calibrated mapper; no smoothing or dwell state carries over
+        self.pipeline.reset()
         self.updateSurface()
+        self.pipeline.setGazeMapper(gazeMapper)
         self.pollTimer.start()
-        self.firstPoll = True
 
-    def updateSurface(self):
-        if self.gazeMapper is None:
-            return
+    def onGazeMapperChanged(self, device, gazeMapper):
+        # The cached calibration was outdated; a reconnect may already have replaced the device
+        if device is self.device:
+            self.pipeline.setGazeMapper(gazeMapper)
 
-        self.gazeMapper.clear_surfaces()
-        self.surface = self.gazeMapper.add_surface(
-            self.tagWindow.getMarkerVerts(),
-            self.tagWindow.getSurfaceSize()
-        )
+    def onConnectionLost(self, reason):
+        print(f"Connection to {self.device} lost ({reason}), reconnecting...")
+        self.pollTimer.stop()
+        self.connection.markLost(reason)
+        self.tagWindow.setStatus(f'Connection lost ({reason}). Reconnecting...')
+
+        lostDevice = self.device
+        self.device = None
+        self.deviceConnector.reconnect(lostDevice)
+
+    def updateSurface(self):
+        width, height = self.tagWindow.getSurfaceSize()
+        if width > 0 and height > 0:
+            # Geometry and markers in one config swap, so no sample maps with one but not the other
+            transform = self.tagWindow.getSurfaceTransform()
+            self.pipeline.setSurfaceGeometry(*transform.geometry, self.tagWindow.getMarkerVerts())
+        else:
+            self.pipeline.setMarkers(self.tagWindow.getMarkerVerts())
 
     def setMouseEnabled(self, enabled):
         self.mouseEnabled = enabled
+        if enabled:
+            self.cursorActuator.start()
 
-    def setSmoothing(self, value):
-        self.smoothing = value
+    def setHeatmapEnabled(self, enabled):
+        if enabled or self.heatmapEndpoint is not None:
+            self.heatmapTimer.start()
+        else:
+            self.heatmapTimer.stop()
+
+    def publishHeatmap(self):
+        if self.heatmap.sampleCount == 0:
+            return
+
+        # snapshot() is only recomputed if samples arrived since the last tick
+        if self.tagWindow.heatmapEnabledInput.isChecked():
+            self.tagWindow.setHeatmap(self.heatmap.snapshotImage())
+
+        if self.heatmapEndpoint is not None:
+            try:
+                self.pipeline.udpSocket.sendto(self.heatmap.encodePng(), self.heatmapEndpoint)
+            except Exception as e:
+                print(f"Error sending heatmap: {e}")
 
     def poll(self):
-        # Changed timeout_seconds from 1/15 to 1/100 (10ms)
-        frameAndGaze = self.device.receive_matched_scene_video_frame_and_gaze(timeout_seconds=1/100)
+        try:
+            # Changed timeout_seconds from 1/15 to 1/100 (10ms)
+            frameAndGaze = self.device.receive_matched_scene_video_frame_and_gaze(timeout_seconds=1/100)
+        except Exception as e:
+            self.onConnectionLost(repr(e))
+            return
 
         # Removed self.device.estimate_time_offset() from the poll loop
         # estimate_offset = self.device.estimate_time_offset( # This call can remain if useful
@@ -105,120 +339,37 @@ class PupilPointerApp(QApplication):
 
         
         if frameAndGaze is None:
+            self.pipeline.serviceLink() # Events keep being retransmitted while no samples arrive
+            if self.connection.isStale():
+                self.onConnectionLost(f'no data for {STALE_CONNECTION_SECONDS:.1f} s')
             return # No new frame and gaze data, so exit poll early
 
+        resumeTime = self.connection.markData()
+        if resumeTime is not None:
+            verdict = 'within' if self.connection.isResumeWithinTarget(resumeTime) else 'OVER'
+            print(f"Time to resume: {resumeTime:.2f} s ({verdict} target of {TARGET_RESUME_SECONDS:.2f} s)")
+
         self.tagWindow.setStatus(f'Streaming data from {self.device}')
+        if self.firstPoll:
+            self.reportStartupTime('first gaze sample', TARGET_FIRST_GAZE_SECONDS)
         self.firstPoll = False
 
-        frame, gaze = frameAndGaze
+        self.pipeline.process(*frameAndGaze)
 
-        if gaze and hasattr(gaze, 'timestamp_unix_seconds'):
-            current_gaze_timestamp = gaze.timestamp_unix_seconds
-            
-            if len(self.last_timestamps) < 2:
-                self.last_timestamps.append(current_gaze_timestamp)
-            else:
-                self.last_timestamps[0] = self.last_timestamps[1]
-                self.last_timestamps[1] = current_gaze_timestamp
-
-            if len(self.last_timestamps) == 2:
-                time_difference = self.last_timestamps[1] - self.last_timestamps[0]
-                if time_difference > 1e-6:  # Ensure a positive and non-trivial time difference (e.g., > 1 microsecond)
-                    self.gazeFrequency = 1.0 / time_difference
-                    self.tagWindow.setFrequency(self.gazeFrequency)
-                # else: # Optional: handle cases where timestamps are identical or too close
-                    # self.tagWindow.setFrequency(0) # Or display "N/A", or keep last valid frequency
-
-        result = self.gazeMapper.process_frame(frame, gaze)
-
-        markerIds = [int(marker.uid.split(':')[-1]) for marker in result.markers]
-        self.tagWindow.showMarkerFeedback(markerIds)
-        
-        if self.surface.uid in result.mapped_gaze:
-            for surface_gaze in result.mapped_gaze[self.surface.uid]:
-                current_smoothed_norm_x = 0.0
-                current_smoothed_norm_y = 0.0
-                if self.mousePosition is None:
-                    self.mousePosition = [surface_gaze.x, surface_gaze.y] 
-
-                    current_smoothed_norm_x = self.mousePosition[0]
-                    current_smoothed_norm_y = self.mousePosition[1]
-                else:
-                    current_smoothed_norm_x = self.mousePosition[0] * self.smoothing + surface_gaze.x * (1.0 - self.smoothing)
-                    current_smoothed_norm_y = self.mousePosition[1] * self.smoothing + surface_gaze.y * (1.0 - self.smoothing)
-
-                window_width = self.tagWindow.width()
-                window_height = self.tagWindow.height()
-                
-                candidate_screen_x = 0.0
-                candidate_screen_y = 0.0
-                if window_width > 0 and window_height > 0:
-                    candidate_screen_x = current_smoothed_norm_x * window_width
-                    candidate_screen_y = current_smoothed_norm_y * window_height
-                else: 
-                    candidate_screen_x = current_smoothed_norm_x * 1920 
-                    candidate_screen_y = current_smoothed_norm_y * 1080
-
-
-                dwell_timestamp = gaze.timestamp_unix_seconds if gaze and hasattr(gaze, 'timestamp_unix_seconds') else 0
-                if dwell_timestamp == 0 and self.last_timestamps: 
-                    dwell_timestamp = self.last_timestamps[-1]
-                
-                changed, dwell, dwellPosition = self.dwellDetector.addPoint(candidate_screen_x, candidate_screen_y, dwell_timestamp)
-
-                final_norm_x = 0.0
-                final_norm_y = 0.0
-                final_screen_qpoint = QPoint()
-
-                if dwell and dwellPosition is not None:
-                    if window_width > 0 and window_height > 0:
-                        final_norm_x = dwellPosition[0] / window_width
-                        final_norm_y = 1.0 - (dwellPosition[1] / window_height)
-                    else: 
-                        final_norm_x = current_smoothed_norm_x
-                        final_norm_y = current_smoothed_norm_y
-                    
-                    final_screen_qpoint = QPoint(int(dwellPosition[0]), int(dwellPosition[1]))
-                else:
-                    final_norm_x = current_smoothed_norm_x
-                    final_norm_y = current_smoothed_norm_y
-                    final_screen_qpoint = QPoint(int(candidate_screen_x), int(candidate_screen_y))
-
-                final_norm_x = max(0.0, min(1.0, final_norm_x))
-                final_norm_y = max(0.0, min(1.0, final_norm_y))
-                self.mousePosition = [final_norm_x, final_norm_y]
-
-                mousePoint = self.tagWindow.updatePoint(final_norm_x, final_norm_y) 
-                try:
-                    message = f"{mousePoint.x()},{mousePoint.y(),},  {current_gaze_timestamp}"
-                    packet = struct.pack('<ffd', mousePoint.x(), mousePoint.y(), current_gaze_timestamp)
-                    self.udp_socket.sendto(packet, (UNITY_IP, UNITY_PORT))
-                    print(f"Sent UDP data: {message}")
-                except Exception as e:
-                    print(f"Error sending UDP data: {e}")
-
-
-                if changed and dwell and dwellPosition is not None:
-                    self.tagWindow.setClicked(False)
-                    if self.mouseEnabled:
-                        pyautogui.click(x=int(dwellPosition[0]), y=int(dwellPosition[1]))
-                else:
-                    self.tagWindow.setClicked(False)
-
-                if self.mouseEnabled:
-                    QCursor().setPos(final_screen_qpoint) 
-
-            if len(result.mapped_gaze[self.surface.uid]) == 0:
-                print("No gaze data")
     def exec(self):
         self.tagWindow.setStatus('Looking for a device...')
         self.tagWindow.showMaximized()
-        QTimer.singleShot(1000, self.start)
+        QTimer.singleShot(0, self.start)
         super().exec()
+        if self.controlServer is not None:
+            self.controlServer.stop()
+        self.deviceConnector.stop()
         if self.device is not None:
             self.device.close()
-        if self.udp_socket: 
-            self.udp_socket.close()
+        self.pipeline.close()
+        self.cursorActuator.stop()
+        print(f"Cursor actuator: {self.cursorActuator.getStats()}")
+        print(f"Connection: {self.connection.getStats()}")
 
 def run():
     app = PupilPointerApp()
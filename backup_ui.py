@@ -6,64 +6,7 @@ from PySide6.QtWidgets import *
 
 from pupil_labs.real_time_screen_gaze import marker_generator
 
-PHYSICAL_SCREEN_WIDTH = 1920
-PHYSICAL_SCREEN_HEIGHT = 1080
-
-# Dimensions des AprilTags physiques
-TAG_PATTERN_SIZE = 114  # Taille du motif AprilTag lui-même (sans bordure papier)
-PAPER_TAG_SIZE = 168    # Taille totale du tag avec sa bordure papier
-PAPER_TO_PATTERN_OFFSET = (PAPER_TAG_SIZE - TAG_PATTERN_SIZE) / 2 # 27 pixels
-
-# Marge verticale pour le positionnement des tags (à ajuster selon votre installation)
-# C'est la distance entre le bord supérieur/inférieur de l'écran et le bord supérieur/inférieur du MOTIF AprilTag.
-VERTICAL_MARGIN_TOP = 0
-VERTICAL_MARGIN_BOTTOM = 0 # Peut être différent de VERTICAL_MARGIN_TOP si besoin
-
-# Coordonnées des coins des AprilTags physiques (motif 114x114px)
-# par rapport au coin supérieur gauche de l'écran (0,0).
-# Ordre des sommets : [Top-Left, Top-Right, Bottom-Right, Bottom-Left]
-
-# Tag 0: En haut à gauche, sur le bord GAUCHE de l'écran
-X_LEFT_TL = -PAPER_TAG_SIZE + PAPER_TO_PATTERN_OFFSET # Coordonnée X du coin supérieur gauche du motif
-X_LEFT_TR = -PAPER_TO_PATTERN_OFFSET                 # Coordonnée X du coin supérieur droit du motif
-Y_TOP_TL = VERTICAL_MARGIN_TOP
-Y_TOP_BR = VERTICAL_MARGIN_TOP + TAG_PATTERN_SIZE
-
-# Tag 3: En bas à gauche, sur le bord GAUCHE de l'écran (conventionnellement, le 3ème tag est en bas à gauche)
-Y_BOTTOM_TL = PHYSICAL_SCREEN_HEIGHT - VERTICAL_MARGIN_BOTTOM - TAG_PATTERN_SIZE
-Y_BOTTOM_BR = PHYSICAL_SCREEN_HEIGHT - VERTICAL_MARGIN_BOTTOM
-
-# Tag 1: En haut à droite, sur le bord DROIT de l'écran
-X_RIGHT_TL = PHYSICAL_SCREEN_WIDTH + PAPER_TO_PATTERN_OFFSET
-X_RIGHT_TR = PHYSICAL_SCREEN_WIDTH + PAPER_TAG_SIZE - PAPER_TO_PATTERN_OFFSET
-
-# Tag 2: En bas à droite, sur le bord DROIT de l'écran
-PHYSICAL_MARKER_VERTICES = {
-    0: [ # Tag en haut à gauche (sur le bord GAUCHE)
-        (X_LEFT_TL, Y_TOP_TL),
-        (X_LEFT_TR, Y_TOP_TL),
-        (X_LEFT_TR, Y_TOP_BR),
-        (X_LEFT_TL, Y_TOP_BR),
-    ],
-    1: [ # Tag en haut à droite (sur le bord DROIT)
-        (X_RIGHT_TL, Y_TOP_TL),
-        (X_RIGHT_TR, Y_TOP_TL),
-        (X_RIGHT_TR, Y_TOP_BR),
-        (X_RIGHT_TL, Y_TOP_BR),
-    ],
-    2: [ # Tag en bas à droite (sur le bord DROIT)
-        (X_RIGHT_TL, Y_BOTTOM_TL),
-        (X_RIGHT_TR, Y_BOTTOM_TL),
-        (X_RIGHT_TR, Y_BOTTOM_BR),
-        (X_RIGHT_TL, Y_BOTTOM_BR),
-    ],
-    3: [ # Tag en bas à gauche (sur le bord GAUCHE)
-        (X_LEFT_TL, Y_BOTTOM_TL),
-        (X_LEFT_TR, Y_BOTTOM_TL),
-        (X_LEFT_TR, Y_BOTTOM_BR),
-        (X_LEFT_TL, Y_BOTTOM_BR),
-    ],
-}
+from marker_layout import PHYSICAL_MARKER_VERTICES, PHYSICAL_SCREEN_HEIGHT, PHYSICAL_SCREEN_WIDTH, screenLayout
 
 class TagWindow(QWidget):
     surfaceChanged = Signal()
@@ -199,18 +142,5 @@ class TagWindow(QWidget):
         self.setMask(mask)
 
     def getCornerRect(self, cornerIdx):
-        tagSize = 100
-        tagPadding = tagSize / 8
-        tagSizePadded = tagSize + tagPadding*2
-
-        if cornerIdx == 0:
-            return QRect(0, 0, tagSizePadded, tagSizePadded)
-
-        elif cornerIdx == 1:
-            return QRect(self.width()-tagSizePadded, 0, tagSizePadded, tagSizePadded)
-
-        elif cornerIdx == 2:
-            return QRect(self.width()-tagSizePadded, self.height()-tagSizePadded, tagSizePadded, tagSizePadded)
-
-        elif cornerIdx == 3:
-            return QRect(0, self.height()-tagSizePadded, tagSizePadded, tagSizePadded)
+        left, top, size = screenLayout(self.width(), self.height(), 100).rects[cornerIdx]
+        return QRect(left, top, size, size)
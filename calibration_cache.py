@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import time
+
+CALIBRATION_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pupil_pointer', 'calibrations')
+CALIBRATION_MAX_AGE_SECONDS = 7 * 24 * 3600 # Older entries are fetched again; revalidate() renews them
+
+
+def calibrationBytes(calibration):
+    """Raw calibration blob as sent by the device (pupil_labs.neon_recording.calib.Calibration)."""
+    return calibration.source.tobytes()
+
+
+def cacheableSerial(serial):
+    # Pupil Invisible and devices without glasses report None, "default" or "unknown"
+    return serial not in (None, '', 'default', 'unknown')
+
+
+class CalibrationCache():
+    """Calibration blobs on disk, keyed by module serial and calibration version.
+
+    Each entry is the raw blob plus a JSON header with its size and SHA-256.
+    The header also records the serial and version found inside the blob. An
+    entry is only used if all of these still match and it is younger than
+    maxAge; anything else is a miss, and the calibration is fetched from the
+    device again. A hit may still be outdated (e.g. the module was
+    recalibrated), so callers check it against the device once per process
+    with revalidate(), after connecting, and replace their mapper if it
+    changed.
+    """
+    def __init__(self, directory=CALIBRATION_CACHE_DIR, maxAge=CALIBRATION_MAX_AGE_SECONDS):
+        self.directory = directory
+        self.maxAge = maxAge
+        self.verified = set() # Serials whose calibration came from the device in this process
+        self.hits = 0
+        self.misses = 0
+        self.changes = 0
+
+    def path(self, serial, version, extension):
+        return os.path.join(self.directory, f'{serial}-v{version}.{extension}')
+
+    def versions(self, serial):
+        if not os.path.isdir(self.directory):
+            return []
+
+        prefix = f'{serial}-v'
+        versions = []
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name.endswith('.json'):
+                try:
+                    versions.append(int(name[len(prefix):-len('.json')]))
+                except ValueError:
+                    pass
+
+        return sorted(versions, reverse=True)
+
+    def loadEntry(self, serial, version):
+        from pupil_labs.neon_recording.calib import Calibration
+
+        try:
+            with open(self.path(serial, version, 'json')) as file:
+                header = json.load(file)
+            with open(self.path(serial, version, 'bin'), 'rb') as file:
+                blob = file.read()
+        except (OSError, ValueError):
+            return None
+
+        if header.get('serial') != serial or header.get('version') != version:
+            return None
+        if self.maxAge is not None and not time.time() - header.get('stored_unix_seconds', 0) <= self.maxAge:
+            return None
+        if len(blob) != Calibration.dtype.itemsize or len(blob) != header.get('size'):
+            return None
+        if hashlib.sha256(blob).hexdigest() != header.get('sha256'):
+            return None
+
+        calibration = Calibration.from_buffer(blob)
+        if calibration.serial != header.get('calibration_serial') or int(calibration.version) != version:
+            return None
+
+        return calibration
+
+    def load(self, serial):
+        """Returns the newest valid cached calibration for serial, or None."""
+        if cacheableSerial(serial):
+            for version in self.versions(serial):
+                calibration = self.loadEntry(serial, version)
+                if calibration is not None:
+                    self.hits += 1
+                    return calibration
+
+        self.misses += 1
+        return None
+
+    def store(self, serial, calibration):
+        self.verified.add(serial)
+        if not cacheableSerial(serial):
+            return
+
+        version = int(calibration.version)
+        blob = calibrationBytes(calibration)
+        header = {
+            "serial": serial,
+            "calibration_serial": calibration.serial,
+            "version": version,
+            "size": len(blob),
+            "sha256": hashlib.sha256(blob).hexdigest(),
+            "stored_unix_seconds": time.time(),
+        }
+
+        # Written to temporary files and renamed, so readers never see a partial entry
+        os.makedirs(self.directory, exist_ok=True)
+        for extension, data, mode in (('bin', blob, 'wb'), ('json', json.dumps(header), 'w')):
+            path = self.path(serial, version, extension)
+            with open(path + '.tmp', mode) as file:
+                file.write(data)
+            os.replace(path + '.tmp', path)
+
+    def invalidate(self, serial):
+        for version in self.versions(serial):
+            for extension in ('json', 'bin'):
+                try:
+                    os.remove(self.path(serial, version, extension))
+                except OSError:
+                    pass
+
+    def needsRevalidation(self, serial):
+        return cacheableSerial(serial) and serial not in self.verified
+
+    def revalidate(self, serial, cached, calibration):
+        """Stores calibration, as just fetched from the device. Returns it if it differs from cached, else None."""
+        changed = calibrationBytes(calibration) != calibrationBytes(cached)
+        if changed:
+            self.changes += 1
+            self.invalidate(serial)
+        # Stored again either way, which renews the entry's age
+        self.store(serial, calibration)
+        return calibration if changed else None
+
+    def getCalibration(self, device, serial=None):
+        """Cached calibration of a simple.Device, fetched and stored on a miss."""
+        serial = device.module_serial if serial is None else serial
+        calibration = self.load(serial)
+        if calibration is None:
+            calibration = device.get_calibration()
+            self.store(serial, calibration)
+
+        return calibration
+
+    def revalidateCalibration(self, device, calibration, serial=None):
+        """Checks a calibration from getCalibration() against the device, unless it came from there.
+
+        Blocks for the round trip getCalibration() saved, so call it once
+        the device is streaming. Returns the device's calibration if it
+        changed, else None.
+        """
+        serial = device.module_serial if serial is None else serial
+        if not self.needsRevalidation(serial):
+            return None
+
+        return self.revalidate(serial, calibration, device.get_calibration())
+
+
+class GazeMapperCache():
+    """Warmed-up gaze mappers by module serial, reused on reconnect within one process.
+
+    A reused mapper keeps its AprilTag detector and frame buffers. It is only
+    reused if it was built from the same calibration blob.
+    """
+    def __init__(self):
+        self.mappers = {} # serial -> (calibration blob, mapper)
+
+    def get(self, serial, calibration, create):
+        """Returns the mapper for serial, or create(calibration) if there is none for this calibration."""
+        if not cacheableSerial(serial):
+            return create(calibration)
+
+        blob = calibrationBytes(calibration)
+        entry = self.mappers.get(serial)
+        if entry is not None and entry[0] == blob:
+            mapper = entry[1]
+            mapper.clear_surfaces()
+            mapper._detected_markers = []
+            mapper._surface_locations = {}
+            return mapper
+
+        mapper = create(calibration)
+        self.mappers[serial] = (blob, mapper)
+        return mapper
@@ -0,0 +1,94 @@
+import collections
+import random
+import time
+
+# Time from noticing a lost connection to the first sample on the new one
+RESUME_TARGET_SECONDS = 5.0
+
+
+class ExponentialBackoff():
+    """Reconnect delays that double per failed attempt, up to maxDelay, with jitter so devices don't retry in lockstep."""
+    def __init__(self, initialDelay=0.25, maxDelay=8.0, factor=2.0, jitter=0.1):
+        self.initialDelay = initialDelay
+        self.maxDelay = maxDelay
+        self.factor = factor
+        self.jitter = jitter
+        self.attempts = 0
+
+    def next(self):
+        delay = min(self.maxDelay, self.initialDelay * self.factor**self.attempts)
+        self.attempts += 1
+        return delay * random.uniform(1.0 - self.jitter, 1.0 + self.jitter)
+
+    def reset(self):
+        self.attempts = 0
+
+
+class ConnectionManager():
+    """Health and recovery bookkeeping for one device connection.
+
+    It does no I/O itself. The owner (the Qt app, a supervisor session,
+    data_sender) reports what happens: markConnected, markData and markLost.
+    It then asks isStale() as its health check and nextRetryDelay() while
+    reconnecting. The time from markLost to the first markData after it is
+    the time-to-resume, checked against resumeTarget.
+    """
+    def __init__(self, staleTimeout=2.0, resumeTarget=RESUME_TARGET_SECONDS, backoff=None, history=32):
+        self.staleTimeout = staleTimeout
+        self.resumeTarget = resumeTarget
+        self.backoff = backoff if backoff is not None else ExponentialBackoff()
+
+        self.connected = False
+        self.lastDataTime = 0.0
+        self.lostTime = None
+        self.lostReason = None
+        self.connects = 0
+        self.losses = 0
+        self.resumeTimes = collections.deque(maxlen=history)
+
+    def markConnected(self, now=None):
+        self.connected = True
+        self.connects += 1
+        self.lastDataTime = time.monotonic() if now is None else now
+
+    def markData(self, now=None):
+        """Returns the time-to-resume if this is the first data since a loss, else None."""
+        now = time.monotonic() if now is None else now
+        self.lastDataTime = now
+        if self.lostTime is None:
+            return None
+
+        resumeTime = now - self.lostTime
+        self.resumeTimes.append(resumeTime)
+        self.lostTime = None
+        self.backoff.reset()
+        return resumeTime
+
+    def markLost(self, reason, now=None):
+        self.connected = False
+        self.lostReason = reason
+        if self.lostTime is None:
+            self.lostTime = time.monotonic() if now is None else now
+            self.losses += 1
+
+    def isStale(self, now=None):
+        now = time.monotonic() if now is None else now
+        return self.connected and now - self.lastDataTime > self.staleTimeout
+
+    def nextRetryDelay(self):
+        return self.backoff.next()
+
+    def isResumeWithinTarget(self, resumeTime):
+        return resumeTime <= self.resumeTarget
+
+    def getStats(self):
+        resumeTimes = list(self.resumeTimes)
+        return {
+            "connected": self.connected,
+            "losses": self.losses,
+            "last_lost_reason": self.lostReason,
+            "resumes": len(resumeTimes),
+            "mean_resume_seconds": sum(resumeTimes) / len(resumeTimes) if resumeTimes else None,
+            "max_resume_seconds": max(resumeTimes) if resumeTimes else None,
+            "resumes_over_target": sum(1 for resumeTime in resumeTimes if resumeTime > self.resumeTarget),
+        }
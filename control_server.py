@@ -0,0 +1,313 @@
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import os
+import socket
+import threading
+import time
+
+CONTROL_HOST = "127.0.0.1"
+CONTROL_PORT = 5006
+MAX_REQUEST_SIZE = 64 * 1024
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+
+class ControlError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def checkNumber(kind, low, high):
+    def check(name, value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or (kind is int and value != int(value)):
+            raise ControlError(INVALID_PARAMS, f"{name} must be {'an integer' if kind is int else 'a number'}")
+        if not low <= value <= high:
+            raise ControlError(INVALID_PARAMS, f"{name} must be between {low} and {high}")
+        return kind(value)
+    return check
+
+
+def checkBool(name, value):
+    if not isinstance(value, bool):
+        raise ControlError(INVALID_PARAMS, f"{name} must be true or false")
+    return value
+
+
+def checkEndpoint(name, value, optional=False):
+    if value is None and optional:
+        return None
+    if not (isinstance(value, (list, tuple)) and len(value) == 2 and isinstance(value[0], str)
+            and isinstance(value[1], int) and 0 < value[1] < 65536):
+        raise ControlError(INVALID_PARAMS, f"{name} must be [host, port]")
+    return (value[0], value[1])
+
+
+# Settings "set" accepts, with their checks. Ranges match the TagWindow inputs.
+SETTINGS = {
+    'smoothing': checkNumber(float, 0.0, 1.0),
+    'dwell_duration': checkNumber(float, 0.0, 20.0),
+    'dwell_radius': checkNumber(int, 0, 512),
+    'adaptive_dwell': checkBool,
+    'left_tag_offset': checkNumber(int, -4096, 4096),
+    'right_tag_offset': checkNumber(int, -4096, 4096),
+    'mouse_enabled': checkBool,
+    'endpoint': checkEndpoint,
+    'heatmap_endpoint': lambda name, value: checkEndpoint(name, value, optional=True),
+}
+
+
+def validateSettings(settings):
+    """Checks every setting before any is applied, so a request changes all of them or none. Returns them converted."""
+    unknown = sorted(set(settings) - set(SETTINGS))
+    if unknown:
+        raise ControlError(INVALID_PARAMS, f"Unknown settings: {', '.join(unknown)}")
+
+    return {name: SETTINGS[name](name, value) for name, value in settings.items()}
+
+
+def runInline(function):
+    future = concurrent.futures.Future()
+    try:
+        future.set_result(function())
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+class ControlServer():
+    """Newline-delimited JSON-RPC 2.0 over loopback TCP or a Unix socket, served on its own asyncio thread.
+
+    methods maps method names to callables taking the request params as
+    keyword arguments (an object) or positional arguments (an array).
+    dispatch(function) runs a call where it is safe to touch the
+    application and returns a concurrent.futures.Future; the app passes one
+    that runs it on the GUI thread between samples. Nothing here runs on
+    the sample path: a slow or misbehaving client only delays its own
+    replies. There is no authentication: any local user can connect to the
+    TCP port, while the Unix socket is made accessible to its owner only.
+    """
+    def __init__(self, methods, host=CONTROL_HOST, port=CONTROL_PORT, path=None, dispatch=runInline):
+        self.methods = dict(methods)
+        self.host = host
+        self.port = port
+        self.path = path
+        self.dispatch = dispatch
+
+        self.loop = None
+        self.stopped = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.error = None
+        self.address = None
+
+        self.requests = 0
+        self.errors = 0
+        self.clients = 0
+
+    def start(self):
+        """Starts serving. Returns False (with the reason in error) if the socket could not be opened."""
+        self.thread = threading.Thread(target=lambda: asyncio.run(self.serve()), name='ControlServer', daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        return self.error is None
+
+    def stop(self):
+        if self.loop is not None and self.thread.is_alive():
+            self.loop.call_soon_threadsafe(self.stopped.set)
+            self.thread.join()
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        try:
+            if self.path is not None:
+                if os.path.exists(self.path):
+                    os.unlink(self.path) # Left behind by a previous run
+                server = await asyncio.start_unix_server(self.handleClient, self.path, limit=MAX_REQUEST_SIZE)
+                os.chmod(self.path, 0o600)
+                self.address = self.path
+            else:
+                server = await asyncio.start_server(self.handleClient, self.host, self.port, limit=MAX_REQUEST_SIZE)
+                self.address = server.sockets[0].getsockname()[:2]
+        except OSError as e:
+            self.error = e
+            self.ready.set()
+            return
+
+        self.ready.set()
+        async with server:
+            await self.stopped.wait()
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def handleClient(self, reader, writer):
+        self.clients += 1
+        try:
+            while not reader.at_eof():
+                try:
+                    line = await reader.readline()
+                except ValueError: # Longer than MAX_REQUEST_SIZE
+                    response = self.errorResponse(None, INVALID_REQUEST, "Request too large")
+                    writer.write(json.dumps(response).encode() + b'\n')
+                    break
+
+                if not line.strip():
+                    continue
+
+                response = await self.handleLine(line)
+                if response is not None:
+                    writer.write(json.dumps(response).encode() + b'\n')
+                    await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handleLine(self, line):
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return self.errorResponse(None, PARSE_ERROR, "Parse error")
+
+        if isinstance(request, list):
+            if not request:
+                return self.errorResponse(None, INVALID_REQUEST, "Empty batch")
+            responses = [response for response in [await self.handleRequest(item) for item in request] if response is not None]
+            return responses or None
+
+        return await self.handleRequest(request)
+
+    async def handleRequest(self, request):
+        self.requests += 1
+        if not isinstance(request, dict) or request.get('jsonrpc') != '2.0' or not isinstance(request.get('method'), str):
+            return self.errorResponse(request.get('id') if isinstance(request, dict) else None, INVALID_REQUEST, "Invalid request")
+
+        requestId = request.get('id')
+        notification = 'id' not in request
+        method = self.methods.get(request['method'])
+        params = request.get('params', {})
+        if method is None:
+            response = self.errorResponse(requestId, METHOD_NOT_FOUND, f"Method not found: {request['method']}")
+        elif not isinstance(params, (dict, list)):
+            response = self.errorResponse(requestId, INVALID_PARAMS, "params must be an object or an array")
+        else:
+            call = (lambda: method(**params)) if isinstance(params, dict) else (lambda: method(*params))
+            try:
+                result = await asyncio.wrap_future(self.dispatch(call))
+                response = {"jsonrpc": "2.0", "id": requestId, "result": result}
+            except ControlError as e:
+                response = self.errorResponse(requestId, e.code, e.message)
+            except TypeError as e:
+                response = self.errorResponse(requestId, INVALID_PARAMS, str(e))
+            except Exception as e:
+                response = self.errorResponse(requestId, INTERNAL_ERROR, repr(e))
+
+        return None if notification else response
+
+    def errorResponse(self, requestId, code, message):
+        self.errors += 1
+        return {"jsonrpc": "2.0", "id": requestId, "error": {"code": code, "message": message}}
+
+    def getStats(self):
+        return {"requests": self.requests, "errors": self.errors, "clients": self.clients}
+
+
+class ControlClient():
+    """Blocking client, for scripts and the command line."""
+    def __init__(self, host=CONTROL_HOST, port=CONTROL_PORT, path=None, timeout=5.0):
+        if path is not None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(timeout)
+            self.sock.connect(path)
+        else:
+            self.sock = socket.create_connection((host, port), timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.file = self.sock.makefile('rb')
+        self.nextId = 1
+
+    def call(self, method, **params):
+        """Returns the result, or raises ControlError."""
+        request = {"jsonrpc": "2.0", "id": self.nextId, "method": method, "params": params}
+        self.nextId += 1
+        self.sock.sendall(json.dumps(request).encode() + b'\n')
+        response = json.loads(self.file.readline())
+        if 'error' in response:
+            raise ControlError(response['error']['code'], response['error']['message'])
+        return response['result']
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+
+def parseValue(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def benchmark(requests=2000):
+    """Round trip of a small request to an in-process server, and of a set that validates and applies settings."""
+    state = {"smoothing": 0.3}
+
+    def configure(**settings):
+        state.update(validateSettings(settings))
+        return state
+
+    server = ControlServer({'get_state': lambda: state, 'set': configure}, port=0)
+    if not server.start():
+        raise server.error
+
+    client = ControlClient(*server.address)
+    results = {}
+    try:
+        for method, params in (('get_state', {}), ('set', {"smoothing": 0.5, "dwell_radius": 40})):
+            start = time.perf_counter()
+            for _ in range(requests):
+                client.call(method, **params)
+            results[f"{method}_us"] = (time.perf_counter() - start) / requests * 1e6
+    finally:
+        client.close()
+        server.stop()
+
+    return results
+
+
+def main():
+    """Calls a method on a running app's control socket, e.g. `set smoothing=0.5 mouse_enabled=true`."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('method', nargs='?', default='get_state')
+    parser.add_argument('params', nargs='*', help='name=value, values are parsed as JSON')
+    parser.add_argument('--host', default=CONTROL_HOST)
+    parser.add_argument('--port', type=int, default=CONTROL_PORT)
+    parser.add_argument('--path', help='Unix socket path instead of TCP')
+    parser.add_argument('--benchmark', action='store_true')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        for name, value in benchmark().items():
+            print(f"{name}: {value:.0f}")
+        return
+
+    params = dict(param.split('=', 1) for param in args.params)
+    client = ControlClient(args.host, args.port, args.path)
+    try:
+        print(json.dumps(client.call(args.method, **{name: parseValue(value) for name, value in params.items()}), indent=1))
+    except ControlError as e:
+        print(f"Error {e.code}: {e.message}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import collections
+import threading
+import time
+
+
+class CursorActuator():
+    """Moves the OS cursor and injects clicks on its own thread.
+
+    Only the latest cursor target is kept (intermediate ones are dropped) and
+    moves are limited to the display refresh rate. Clicks are queued and never
+    coalesced, up to maxPendingClicks.
+    """
+    def __init__(self, refreshRate=60.0, maxPendingClicks=8):
+        self.minMoveInterval = 1.0 / refreshRate if refreshRate > 0 else 0.0
+        self.maxPendingClicks = maxPendingClicks
+
+        self.condition = threading.Condition()
+        self.pendingMove = None
+        self.pendingClicks = collections.deque()
+        self.lastMoveTime = 0.0
+        self.running = False
+        self.thread = None
+        self.backend = None
+
+        self.resetStats()
+
+    def resetStats(self):
+        self.moveCount = 0
+        self.clickCount = 0
+        self.droppedMoves = 0
+        self.droppedClicks = 0
+        self.latencyTotal = 0.0
+        self.latencyMax = 0.0
+
+    def setRefreshRate(self, refreshRate):
+        with self.condition:
+            self.minMoveInterval = 1.0 / refreshRate if refreshRate > 0 else 0.0
+
+    def start(self):
+        if self.running:
+            return
+
+        self.running = True
+        self.thread = threading.Thread(target=self.run, name='CursorActuator', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def moveTo(self, x, y):
+        with self.condition:
+            if self.pendingMove is not None:
+                self.droppedMoves += 1
+            self.pendingMove = (int(x), int(y), time.perf_counter())
+            self.condition.notify()
+
+    def click(self, x, y):
+        with self.condition:
+            if len(self.pendingClicks) >= self.maxPendingClicks:
+                self.droppedClicks += 1
+                return
+            self.pendingClicks.append((int(x), int(y), time.perf_counter()))
+            self.condition.notify()
+
+    def getStats(self):
+        with self.condition:
+            actions = self.moveCount + self.clickCount
+            return {
+                "moves": self.moveCount,
+                "clicks": self.clickCount,
+                "dropped_moves": self.droppedMoves,
+                "dropped_clicks": self.droppedClicks,
+                "mean_latency_ms": 1000 * self.latencyTotal / actions if actions else 0.0,
+                "max_latency_ms": 1000 * self.latencyMax,
+            }
+
+    def loadBackend(self):
+        # Imported here so pyautogui's platform setup never runs on the gaze thread
+        import pyautogui
+        pyautogui.FAILSAFE = False
+        return pyautogui
+
+    def nextAction(self):
+        with self.condition:
+            while self.running:
+                if self.pendingClicks:
+                    return ('click',) + self.pendingClicks.popleft()
+
+                if self.pendingMove is not None:
+                    wait = self.lastMoveTime + self.minMoveInterval - time.perf_counter()
+                    if wait <= 0:
+                        move = self.pendingMove
+                        self.pendingMove = None
+                        return ('move',) + move
+                    self.condition.wait(wait)
+                else:
+                    self.condition.wait()
+
+            return None
+
+    def recordLatency(self, enqueuedAt):
+        latency = time.perf_counter() - enqueuedAt
+        with self.condition:
+            self.latencyTotal += latency
+            self.latencyMax = max(self.latencyMax, latency)
+
+    def run(self):
+        if self.backend is None:
+            self.backend = self.loadBackend()
+
+        while True:
+            action = self.nextAction()
+            if action is None:
+                return
+
+            kind, x, y, enqueuedAt = action
+            self.recordLatency(enqueuedAt)
+            try:
+                if kind == 'click':
+                    self.backend.click(x=x, y=y, _pause=False)
+                    self.clickCount += 1
+                else:
+                    self.backend.moveTo(x, y, _pause=False)
+                    self.lastMoveTime = time.perf_counter()
+                    self.moveCount += 1
+            except Exception as e:
+                print(f"Error actuating cursor: {e}")
@@ -1,19 +1,37 @@
 import asyncio
+import collections
 import json  # WARNING: Slow for 200Hz, consider a binary format.
 # socket import is not strictly needed here anymore as AsyncUDPSender handles its needs.
 
-from pupil_labs.real_time_screen_gaze.gaze_mapper import GazeMapper
+from calibration_cache import CalibrationCache, GazeMapperCache
+from connection_manager import ConnectionManager
+from frame_preprocessor import FramePreprocessor, PreprocessingGazeMapper
+from eye_movement_detector import createDetector
+from gaze_codec import GazeDeltaEncoder
+from gaze_quality import VALID, QualityGate, markerConfidence
+from gaze_packet import packEvent
+from gaze_sample import GazeSample
+from marker_layout import insetLayout
+from reliable_link import SequencedSender
 # Use asynchronous components
 from pupil_labs.realtime_api.discovery import Network
 from pupil_labs.realtime_api.device import Device
 from pupil_labs.realtime_api.streaming.gaze import RTSPGazeStreamer
 from pupil_labs.realtime_api.streaming.video import RTSPVideoFrameStreamer
-from pupil_labs.realtime_api.streaming.
+from pupil_labs.realtime_api.simple.models import MatchedItem
 from pupil_labs.realtime_api import models # For Status, GazeData, VideoFrame if type hinting
 
 # --- Configuration ---
 UNITY_IP = "127.0.0.1"  # IP address
 UNITY_PORT = 5005       # UDP port
+SCENE_PYRAMID_LEVELS = 0
+EYE_MOVEMENT_DETECTOR = 'idt' # 'ivt' or 'idt'
+STALE_CONNECTION_SECONDS = 2.0 # Reconnect after this long without a matched item
+# 'json' sends data_payload (~1.3 KB per sample); 'delta' sends quantized, delta-encoded samples
+# (~45 bytes) and binary eye movement events, for remote sinks, see gaze_codec.py
+REMOTE_ENCODING = 'json'
+# With 'delta', send eye movement events sequence-numbered and retransmit them until acknowledged, see reliable_link.py
+REMOTE_RELIABLE_EVENTS = False
 
 # pixels
 SCREEN_WIDTH_PX = 1920
@@ -23,44 +41,86 @@ screen_surface_size_px = (SCREEN_WIDTH_PX, SCREEN_HEIGHT_PX)
 MARKER_DISPLAY_SIZE_PX = 80
 PADDING_PX = 50
 
-marker_verts_screen_px = {
-    0: [
-        (PADDING_PX, PADDING_PX),
-        (PADDING_PX + MARKER_DISPLAY_SIZE_PX, PADDING_PX),
-        (PADDING_PX + MARKER_DISPLAY_SIZE_PX, PADDING_PX + MARKER_DISPLAY_SIZE_PX),
-        (PADDING_PX, PADDING_PX + MARKER_DISPLAY_SIZE_PX),
-    ],
-    1: [
-        (SCREEN_WIDTH_PX - PADDING_PX - MARKER_DISPLAY_SIZE_PX, PADDING_PX),
-        (SCREEN_WIDTH_PX - PADDING_PX, PADDING_PX),
-        (SCREEN_WIDTH_PX - PADDING_PX, PADDING_PX + MARKER_DISPLAY_SIZE_PX),
-        (SCREEN_WIDTH_PX - PADDING_PX - MARKER_DISPLAY_SIZE_PX, PADDING_PX + MARKER_DISPLAY_SIZE_PX),
-    ],
-    2: [
-        (PADDING_PX, SCREEN_HEIGHT_PX - PADDING_PX - MARKER_DISPLAY_SIZE_PX),
-        (PADDING_PX + MARKER_DISPLAY_SIZE_PX, SCREEN_HEIGHT_PX - PADDING_PX - MARKER_DISPLAY_SIZE_PX),
-        (PADDING_PX + MARKER_DISPLAY_SIZE_PX, SCREEN_HEIGHT_PX - PADDING_PX),
-        (PADDING_PX, SCREEN_HEIGHT_PX - PADDING_PX),
-    ],
-    3: [
-        (SCREEN_WIDTH_PX - PADDING_PX - MARKER_DISPLAY_SIZE_PX, SCREEN_HEIGHT_PX - PADDING_PX - MARKER_DISPLAY_SIZE_PX),
-        (SCREEN_WIDTH_PX - PADDING_PX, SCREEN_HEIGHT_PX - PADDING_PX - MARKER_DISPLAY_SIZE_PX),
-        (SCREEN_WIDTH_PX - PADDING_PX, SCREEN_HEIGHT_PX - PADDING_PX),
-        (SCREEN_WIDTH_PX - PADDING_PX - MARKER_DISPLAY_SIZE_PX, SCREEN_HEIGHT_PX - PADDING_PX),
-    ],
-}
+# Marker ids 0-3: top-left, top-right, bottom-left, bottom-right
+marker_verts_screen_px = insetLayout(SCREEN_WIDTH_PX, SCREEN_HEIGHT_PX, MARKER_DISPLAY_SIZE_PX, PADDING_PX).markers
+
+class AckProtocol(asyncio.DatagramProtocol):
+    """Hands acks from the receiver to the SequencedSender."""
+    def __init__(self, link: SequencedSender):
+        self.link = link
+
+    def datagram_received(self, data, addr):
+        self.link.handleAck(data)
+
+
+class DataMatcher:
+    """Pairs each scene frame with gaze from a second stream, read by its own task.
+
+    Gaze is matched the way simple.Device does it: the first sample after the
+    frame, else the newest one. Frames that arrive before any gaze are dropped.
+    """
+    def __init__(self, gaze_streamer: RTSPGazeStreamer, frame_streamer: RTSPVideoFrameStreamer, gaze_history: int = 400):
+        self.gaze_streamer = gaze_streamer
+        self.frame_streamer = frame_streamer
+        self.gaze = collections.deque(maxlen=gaze_history)
+        self.gaze_task = None
+
+    async def __aenter__(self):
+        await self.gaze_streamer.__aenter__()
+        try:
+            await self.frame_streamer.__aenter__()
+        except BaseException:
+            await self.gaze_streamer.__aexit__(None, None, None)
+            raise
+        self.gaze_task = asyncio.create_task(self.receive_gaze())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.gaze_task.cancel()
+        try:
+            await self.gaze_task
+        except (asyncio.CancelledError, Exception):
+            pass
+        await self.frame_streamer.__aexit__(*exc_info)
+        await self.gaze_streamer.__aexit__(*exc_info)
+
+    async def receive_gaze(self):
+        async for gaze in self.gaze_streamer.receive():
+            self.gaze.append(gaze)
+        raise ConnectionError("gaze stream ended")
+
+    def match_gaze(self, timestamp):
+        if not self.gaze:
+            return None
+
+        gaze = self.gaze.popleft()
+        while gaze.timestamp_unix_seconds <= timestamp and self.gaze:
+            gaze = self.gaze.popleft()
+        return gaze
+
+    async def receive(self):
+        async for frame in self.frame_streamer.receive():
+            if self.gaze_task.done():
+                # Raises the gaze stream's error
+                self.gaze_task.result()
+            gaze = self.match_gaze(frame.timestamp_unix_seconds)
+            if gaze is not None:
+                yield MatchedItem(frame, gaze)
+
 
 class AsyncUDPSender:
     """Class to send data via UDP asynchronously."""
-    def __init__(self, host: str, port: int):
+    def __init__(self, host: str, port: int, encoding: str = 'json', reliable_events: bool = False):
         self.host = host
         self.port = port
         self.transport = None
+        self.encoder = GazeDeltaEncoder() if encoding == 'delta' else None
+        self.link = SequencedSender(self.send_packet) if self.encoder is not None and reliable_events else None
 
     async def connect(self):
         loop = asyncio.get_running_loop()
         self.transport, _ = await loop.create_datagram_endpoint(
-            lambda: asyncio.DatagramProtocol(),
+            lambda: AckProtocol(self.link) if self.link is not None else asyncio.DatagramProtocol(),
             remote_addr=(self.host, self.port)
         )
         print(f"UDP Sender ready to send to {self.host}:{self.port}")
@@ -75,117 +135,192 @@ class AsyncUDPSender:
         except Exception as e:
             print(f"Error sending UDP data: {e}")
 
+    def send_packet(self, packet: bytes):
+        self.transport.sendto(packet)
+
+    def send_sample(self, sample: GazeSample, data_payload: dict, events):
+        """Sends one sample as data_payload JSON, or delta-encoded followed by its eye movement events."""
+        if self.encoder is None:
+            self.send_data(data_payload)
+            return
+
+        if not self.transport:
+            print("Error: UDP transport not initialized. Call connect() first.")
+            return
+        try:
+            self.transport.sendto(self.encoder.encode(sample))
+            for event in events:
+                if self.link is not None:
+                    self.link.sendEvent(packEvent(event))
+                else:
+                    self.transport.sendto(packEvent(event))
+            if self.link is not None:
+                self.link.service()
+        except Exception as e:
+            print(f"Error sending UDP data: {e}")
+
+    def request_keyframe(self):
+        """The next delta-encoded sample is a keyframe, e.g. after a reconnect."""
+        if self.encoder is not None:
+            self.encoder.requestKeyframe()
+
     def close(self):
+        if self.link is not None:
+            print(f"Reliable events: {self.link.getStats()}")
         if self.transport:
             self.transport.close()
             print("UDP Sender connection closed.")
 
 
-async def stream_data_from_matcher(matcher: DataMatcher, gaze_mapper: GazeMapper, surface_definition, udp_sender: AsyncUDPSender):
-    """Main loop to retrieve, process, and send data using DataMatcher."""
+def create_gaze_mapper(calibration):
+    return PreprocessingGazeMapper(calibration, FramePreprocessor(SCENE_PYRAMID_LEVELS))
+
+def add_screen_surface(gaze_mapper: PreprocessingGazeMapper):
+    surface_definition = gaze_mapper.add_surface(
+        marker_verts_px=marker_verts_screen_px,
+        surface_size_px=screen_surface_size_px
+    )
+    print(f"Surface '{surface_definition.name}' (ID: {surface_definition.uid}) added to GazeMapper.")
+    return surface_definition
+
+async def revalidate_calibration(async_pl_device: Device, module_serial, calibration, calibration_cache: CalibrationCache, gaze_mappers: GazeMapperCache):
+    """Checks a cached calibration against the device. Returns (gaze_mapper, surface_definition) if it changed, else None."""
+    try:
+        calibration = calibration_cache.revalidate(module_serial, calibration, await async_pl_device.get_calibration())
+    except Exception as e:
+        # The cached calibration stays in use
+        print(f"Error checking the calibration: {e!r}")
+        return None
+    if calibration is None:
+        return None
+
+    print("Calibration changed on the device, replacing the gaze mapper.")
+    gaze_mapper = gaze_mappers.get(module_serial, calibration, create_gaze_mapper)
+    return gaze_mapper, add_screen_surface(gaze_mapper)
+
+async def stream_data_from_matcher(matcher: DataMatcher, gaze_mapper: PreprocessingGazeMapper, surface_definition, udp_sender: AsyncUDPSender, connection: ConnectionManager, calibration_check: asyncio.Task = None):
+    """Main loop to retrieve, process, and send data using DataMatcher.
+
+    calibration_check is a running revalidate_calibration(); its mapper is used from when it finishes.
+    Raises ConnectionError if no item arrives for connection.staleTimeout, so the caller can reconnect.
+    """
     print("Starting data streaming with matcher...")
+    # One sample and one payload are filled in place for every item instead of building new dicts.
+    # They are created per connection, so no filter state carries over a reconnect.
+    sample = GazeSample()
+    raw_gaze_data_to_send = {}
+    surface_gaze_items = []
+    surface_gaze_list_to_send = []
+    eye_movement_events = []
+    detected_events = []
+    eye_movement_detector = createDetector(EYE_MOVEMENT_DETECTOR)
+    quality_gate = QualityGate()
+    data_payload = {
+        "raw_gaze_data": raw_gaze_data_to_send,
+        "surface_gaze_data": surface_gaze_list_to_send,
+        "eye_movement_events": eye_movement_events
+    }
     async with matcher: # Use matcher as an async context manager
-        async for item in matcher.receive(): # item is MatchedItem(gaze, frame)
+        items = matcher.receive().__aiter__()
+        connection.markConnected()
+        udp_sender.request_keyframe()
+        while True:
+            try:
+                item = await asyncio.wait_for(items.__anext__(), connection.staleTimeout) # item is MatchedItem(gaze, frame)
+            except asyncio.TimeoutError:
+                raise ConnectionError(f"no data for {connection.staleTimeout:.1f} s")
+            except StopAsyncIteration:
+                raise ConnectionError("stream ended")
+
             gaze: models.GazeData = item.gaze
             frame: models.VideoFrame = item.frame
 
             if frame is None or gaze is None:
                 continue
 
+            if calibration_check is not None and calibration_check.done():
+                changed = calibration_check.result()
+                calibration_check = None
+                if changed is not None:
+                    gaze_mapper, surface_definition = changed
+
+            resume_time = connection.markData()
+            if resume_time is not None:
+                verdict = 'within' if connection.isResumeWithinTarget(resume_time) else 'OVER'
+                print(f"Time to resume: {resume_time:.2f} s ({verdict} target of {connection.resumeTarget:.2f} s)")
+
+            sample.fillFromGaze(gaze)
+            eye_movement_events.clear()
+            detected_events.clear()
+
+            # Blinks and samples while not worn are neither mapped nor sent; the blink goes out with the next valid sample
+            blink = quality_gate.addSample(sample)
+            if blink is not None:
+                eye_movement_events.append(blink.toDict())
+                detected_events.append(blink)
+            if sample.quality != VALID:
+                eye_movement_detector.reset()
+                continue
+
             surface_gaze_result = gaze_mapper.process_frame(frame, gaze)
+            sample.writeRawGaze(raw_gaze_data_to_send, 'x_raw_normalized', 'y_raw_normalized')
+
+            event = eye_movement_detector.addPoint(sample.x, sample.y, sample.timestamp)
+            if event is not None:
+                eye_movement_events.append(event.toDict())
+                detected_events.append(event)
 
-            raw_gaze_data_to_send = {
-                "timestamp_unix_seconds": gaze.timestamp_unix_seconds,
-                "x_raw_normalized": gaze.x,
-                "y_raw_normalized": gaze.y,
-                "worn": gaze.worn,
-                "pupil_diameter_left": gaze.pupil_diameter_left,
-                "eyeball_center_left_x": gaze.eyeball_center_left_x,
-                "eyeball_center_left_y": gaze.eyeball_center_left_y,
-                "eyeball_center_left_z": gaze.eyeball_center_left_z,
-                "optical_axis_left_x": gaze.optical_axis_left_x,
-                "optical_axis_left_y": gaze.optical_axis_left_y,
-                "optical_axis_left_z": gaze.optical_axis_left_z,
-                "pupil_diameter_right": gaze.pupil_diameter_right,
-                "eyeball_center_right_x": gaze.eyeball_center_right_x,
-                "eyeball_center_right_y": gaze.eyeball_center_right_y,
-                "eyeball_center_right_z": gaze.eyeball_center_right_z,
-                "optical_axis_right_x": gaze.optical_axis_right_x,
-                "optical_axis_right_y": gaze.optical_axis_right_y,
-                "optical_axis_right_z": gaze.optical_axis_right_z,
-                "eyelid_angle_top_left": getattr(gaze, 'eyelid_angle_top_left', None),
-                "eyelid_angle_bottom_left": getattr(gaze, 'eyelid_angle_bottom_left', None),
-                "eyelid_aperture_left": getattr(gaze, 'eyelid_aperture_left', None),
-                "eyelid_angle_top_right": getattr(gaze, 'eyelid_angle_top_right', None),
-                "eyelid_angle_bottom_right": getattr(gaze, 'eyelid_angle_bottom_right', None),
-                "eyelid_aperture_right": getattr(gaze, 'eyelid_aperture_right', None),
-            }
-
-            surface_gaze_list_to_send = []
+            surface_gaze_list_to_send.clear()
             if surface_definition.uid in surface_gaze_result.mapped_gaze:
+                marker_ids = [int(marker.uid.split(':')[-1]) for marker in surface_gaze_result.markers]
+                confidence = markerConfidence(marker_ids, marker_verts_screen_px)
                 for surf_gaze_item in surface_gaze_result.mapped_gaze[surface_definition.uid]:
-                    surface_gaze_list_to_send.append({
-                        "timestamp_unix_seconds": surf_gaze_item.timestamp_unix_seconds,
-                        "x_surface_px": surf_gaze_item.x,
-                        "y_surface_px": surf_gaze_item.y,
-                        "on_surf": surf_gaze_item.on_surf,
-                        "confidence": surf_gaze_item.confidence,
-                    })
-
-            data_payload = {
-                "raw_gaze_data": raw_gaze_data_to_send,
-                "surface_gaze_data": surface_gaze_list_to_send
-            }
-            udp_sender.send_data(data_payload)
+                    sample.fillFromSurfaceGaze(surf_gaze_item, confidence)
+                    if not quality_gate.isConfident(sample):
+                        continue
+                    index = len(surface_gaze_list_to_send)
+                    if index == len(surface_gaze_items):
+                        surface_gaze_items.append({})
+                    surface_gaze_list_to_send.append(
+                        sample.writeSurfaceGaze(surface_gaze_items[index], 'x_surface_px', 'y_surface_px')
+                    )
+            if not surface_gaze_list_to_send:
+                # Not carried over from the previous frame into delta-encoded samples
+                sample.surfaceX = sample.surfaceY = sample.onSurface = sample.confidence = None
 
-async def run_main_application():
-    """Main function to initialize and start the streaming loop."""
-    network = Network()
-    async_pl_device = None
-    udp_sender = None
+            udp_sender.send_sample(sample, data_payload, detected_events)
 
+async def stream_from_device(device_info, udp_sender: AsyncUDPSender, connection: ConnectionManager, calibration_cache: CalibrationCache, gaze_mappers: GazeMapperCache):
+    """Connects, gets the (cached) calibration, rebuilds the surface and streams until the connection fails."""
+    async_pl_device = Device(host=device_info.address, port=device_info.port)
+    calibration_check = None
     try:
-        print("Searching for a Pupil Labs device (async)...")
-        device_info = await network.wait_for_new_device(timeout_seconds=10)
-       
-        if device_info is None:
-            print("No Pupil Labs device found.")
-            return
-        # device_info is DiscoveredDeviceInfo, has .name, .address, .port
-        print(f"Device info found: {device_info.name} at {device_info.address}:{device_info.port}")
-
-        async_pl_device = Device(host=device_info.address, port=device_info.port)
-        
         # Get status to confirm connection and get stream URLs
         # This will implicitly connect if the Device class handles it upon first API call.
         status = await async_pl_device.get_status()
         print(f"Connected to: {status.phone.device_name if status.phone else 'Unknown Device Name'}") # status.phone might be None
 
-        calibration = await async_pl_device.get_calibration()
-        print("Calibration received.")
-
-        gaze_mapper = GazeMapper(calibration)
-
-        surface_definition = gaze_mapper.add_surface(
-            marker_verts_px=marker_verts_screen_px,
-            surface_size_px=screen_surface_size_px
-        )
-        print(f"Surface '{surface_definition.name}' (ID: {surface_definition.uid}) added to GazeMapper.")
+        module_serial = status.hardware.module_serial
+        calibration = calibration_cache.load(module_serial)
+        if calibration is None:
+            calibration = await async_pl_device.get_calibration()
+            calibration_cache.store(module_serial, calibration)
+            print("Calibration received.")
+        else:
+            print("Calibration loaded from cache.")
 
-        udp_sender = AsyncUDPSender(host=UNITY_IP, port=UNITY_PORT)
-        await udp_sender.connect()
+        gaze_mapper = gaze_mappers.get(module_serial, calibration, create_gaze_mapper)
+        surface_definition = add_screen_surface(gaze_mapper)
 
         # Get streaming URLs from status
         gaze_url = status.direct_gaze_url()
         video_url = status.direct_scene_video_url()
 
         if not gaze_url:
-            print("Could not get gaze streaming URL from device status.")
-            return
+            raise ConnectionError("Could not get gaze streaming URL from device status.")
         if not video_url:
-            print("Could not get scene video streaming URL from device status.")
-            return
-            
+            raise ConnectionError("Could not get scene video streaming URL from device status.")
+
         print(f"Gaze stream URL: {gaze_url}")
         print(f"Video stream URL: {video_url}")
 
@@ -193,24 +328,64 @@ async def run_main_application():
         video_streamer = RTSPVideoFrameStreamer(url=video_url)
         matcher = DataMatcher(gaze_streamer=gaze_streamer, frame_streamer=video_streamer)
 
-        await stream_data_from_matcher(matcher, gaze_mapper, surface_definition, udp_sender)
+        if calibration_cache.needsRevalidation(module_serial):
+            # Fetched while streaming, so the cache still saves the round trip before the first sample
+            calibration_check = asyncio.create_task(
+                revalidate_calibration(async_pl_device, module_serial, calibration, calibration_cache, gaze_mappers)
+            )
+
+        await stream_data_from_matcher(matcher, gaze_mapper, surface_definition, udp_sender, connection, calibration_check)
+    finally:
+        if calibration_check is not None:
+            calibration_check.cancel()
+        print("Closing device connection (async)...")
+        try:
+            await async_pl_device.close()
+        except Exception as e:
+            print(f"Error closing device: {e!r}")
+
+async def run_main_application():
+    """Main function to initialize and start the streaming loop, reconnecting with backoff when the device drops."""
+    network = Network()
+    udp_sender = None
+    connection = ConnectionManager(STALE_CONNECTION_SECONDS)
+    calibration_cache = CalibrationCache()
+    gaze_mappers = GazeMapperCache()
+    device_info = None
+
+    try:
+        udp_sender = AsyncUDPSender(host=UNITY_IP, port=UNITY_PORT, encoding=REMOTE_ENCODING, reliable_events=REMOTE_RELIABLE_EVENTS)
+        await udp_sender.connect()
+
+        while True:
+            if device_info is None:
+                print("Searching for a Pupil Labs device (async)...")
+                device_info = await network.wait_for_new_device(timeout_seconds=10)
+                if device_info is None:
+                    print("No Pupil Labs device found.")
+                    continue
+                # device_info is DiscoveredDeviceInfo, has .name, .address, .port
+                print(f"Device info found: {device_info.name} at {device_info.address}:{device_info.port}")
+
+            # A lost device is retried at the same address; it is not announced as new again
+            try:
+                await stream_from_device(device_info, udp_sender, connection, calibration_cache, gaze_mappers)
+            except Exception as e:
+                connection.markLost(repr(e))
+                delay = connection.nextRetryDelay()
+                print(f"Connection lost ({e!r}), reconnecting in {delay:.2f} s")
+                await asyncio.sleep(delay)
 
     except KeyboardInterrupt:
         print("\nStreaming stopped by user.")
     except ConnectionRefusedError:
         print(f"Connection error: Is the UDP receiver on {UNITY_IP}:{UNITY_PORT} active?")
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        import traceback
-        traceback.print_exc()
     finally:
         if udp_sender:
             udp_sender.close()
-        if async_pl_device:
-            print("Closing device connection (async)...")
-            await async_pl_device.close()
         print("Closing network discovery...")
         await network.close() # Close the network discovery
+        print(f"Connection: {connection.getStats()}")
         print("Application terminated.")
 
 if __name__ == "__main__":
@@ -0,0 +1,118 @@
+import threading
+
+from PySide6.QtCore import QObject, Signal
+
+from calibration_cache import CalibrationCache, GazeMapperCache
+from connection_manager import ExponentialBackoff
+
+
+class DeviceConnector(QObject):
+    """Discovers a device and prepares its GazeMapper on a background thread.
+
+    The pupil_labs, OpenCV and AprilTag imports happen on that thread too, so
+    neither they nor the network round trips delay or freeze the UI. After a
+    connection is lost, reconnect() closes the dead device on the same thread
+    and first retries its address, then falls back to discovery, with
+    exponential backoff between attempts. Calibrations come from the on-disk
+    CalibrationCache when valid, so connecting skips that round trip, and a
+    reconnecting device gets its warmed-up mapper back. A cached calibration
+    is checked against the device on a separate thread after connected is
+    emitted; if it changed, gazeMapperChanged brings a mapper built from the
+    new one. With threadedDecode, the device is wrapped in a
+    scene_decoder.DecodedSceneDevice, so scene video is decoded on its own
+    thread into pooled (grayscale unless colour) frames.
+    """
+    connected = Signal(object, object) # device, gazeMapper
+    gazeMapperChanged = Signal(object, object) # device, gazeMapper
+
+    def __init__(self, pyramidLevels=0, searchDuration=1.0, backoff=None, threadedDecode=False, colour=False):
+        super().__init__()
+
+        self.pyramidLevels = pyramidLevels
+        self.threadedDecode = threadedDecode
+        self.colour = colour
+        self.searchDuration = searchDuration
+        self.backoff = backoff if backoff is not None else ExponentialBackoff()
+        self.calibrationCache = CalibrationCache()
+        self.gazeMappers = GazeMapperCache()
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self, lostDevice=None):
+        if self.thread is not None and self.thread.is_alive():
+            return
+
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, args=(lostDevice,), name='DeviceConnector', daemon=True)
+        self.thread.start()
+
+    def reconnect(self, lostDevice):
+        self.start(lostDevice)
+
+    def stop(self):
+        self.stopped.set()
+
+    def findDevice(self, lostDevice):
+        from pupil_labs.realtime_api.simple import Device, discover_one_device
+
+        if lostDevice is not None:
+            try:
+                return Device(lostDevice.address, lostDevice.port, lostDevice.full_name, lostDevice.dns_name)
+            except Exception as e:
+                print(f"Reconnecting to {lostDevice.address}:{lostDevice.port} failed: {e!r}")
+
+        return discover_one_device(max_search_duration_seconds=self.searchDuration)
+
+    def run(self, lostDevice=None):
+        if lostDevice is not None:
+            try:
+                lostDevice.close()
+            except Exception as e:
+                print(f"Error closing {lostDevice}: {e!r}")
+
+        self.backoff.reset()
+        while not self.stopped.is_set():
+            device = self.findDevice(lostDevice)
+            if device is None:
+                self.stopped.wait(self.backoff.next())
+                continue
+
+            try:
+                calibration = self.calibrationCache.getCalibration(device)
+                gazeMapper = self.gazeMappers.get(device.module_serial, calibration, self.createGazeMapper)
+                if self.threadedDecode:
+                    from scene_decoder import DecodedSceneDevice
+                    device = DecodedSceneDevice(device, self.colour)
+            except Exception as e:
+                print(f"Error preparing {device}: {e}")
+                device.close()
+                self.stopped.wait(self.backoff.next())
+                continue
+
+            if self.stopped.is_set():
+                device.close()
+                return
+
+            self.connected.emit(device, gazeMapper)
+            # On its own thread: this one must end now, or a reconnect() during the round trip would be dropped
+            threading.Thread(
+                target=self.revalidate, args=(device, calibration), name='CalibrationCheck', daemon=True
+            ).start()
+            return
+
+    def createGazeMapper(self, calibration):
+        from frame_preprocessor import FramePreprocessor, PreprocessingGazeMapper
+
+        return PreprocessingGazeMapper(calibration, FramePreprocessor(self.pyramidLevels))
+
+    def revalidate(self, device, calibration):
+        try:
+            calibration = self.calibrationCache.revalidateCalibration(device, calibration)
+            if calibration is None or self.stopped.is_set():
+                return
+
+            print(f"Calibration of {device} changed, replacing the gaze mapper")
+            self.gazeMapperChanged.emit(device, self.gazeMappers.get(device.module_serial, calibration, self.createGazeMapper))
+        except Exception as e:
+            # The cached calibration stays in use
+            print(f"Error checking the calibration of {device}: {e!r}")
@@ -0,0 +1,352 @@
+import argparse
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from calibration_cache import CalibrationCache, GazeMapperCache
+from connection_manager import ConnectionManager
+from gaze_pipeline import GazePipeline
+from marker_layout import CORNERS, insetLayout, loadLayout, loadProfile
+
+# Simulated scene camera, as on Neon
+SCENE_SIZE = (1600, 1200)
+SCENE_FRAME_RATE = 30
+
+
+class DeviceSession():
+    """One device and its own pipeline.
+
+    open(), step() and close() block, and the supervisor runs them on its
+    shared worker pool. A session only ever has one of them in flight, so the
+    pipeline state needs no locking. The deviceId stays the same across
+    reconnects; each reconnect starts the pipeline from a clean state, reusing
+    the cached calibration and warmed-up mapper of the same module. A cached
+    calibration is checked against the device by revalidate(), which may run
+    alongside step(): it only leaves a new mapper for step() to swap in.
+    """
+    def __init__(self, deviceId, name, connect, pipeline, connection, calibrationCache, gazeMappers, pyramidLevels=0):
+        self.deviceId = deviceId
+        self.name = name
+        self.connect = connect # Returns a new device, e.g. simple.Device.from_discovered_device
+        self.pipeline = pipeline
+        self.connection = connection
+        self.calibrationCache = calibrationCache
+        self.gazeMappers = gazeMappers
+        self.pyramidLevels = pyramidLevels
+
+        self.device = None
+        self.calibration = None
+        self.changedGazeMapper = None
+        self.framesProcessed = 0
+        self.lastResumeTime = None
+
+    def createGazeMapper(self, calibration):
+        from frame_preprocessor import FramePreprocessor, PreprocessingGazeMapper
+
+        return PreprocessingGazeMapper(calibration, FramePreprocessor(self.pyramidLevels))
+
+    def open(self):
+        self.device = self.connect()
+        self.calibration = self.calibrationCache.getCalibration(self.device)
+        gazeMapper = self.gazeMappers.get(self.device.module_serial, self.calibration, self.createGazeMapper)
+        self.changedGazeMapper = None
+        self.pipeline.reset()
+        self.pipeline.setGazeMapper(gazeMapper)
+        self.connection.markConnected()
+
+    def needsRevalidation(self):
+        return self.device is not None and self.calibrationCache.needsRevalidation(self.device.module_serial)
+
+    def revalidate(self):
+        device = self.device
+        try:
+            calibration = self.calibrationCache.revalidateCalibration(device, self.calibration)
+            if calibration is not None:
+                print(f"Device {self.deviceId}: calibration changed, replacing the gaze mapper")
+                self.changedGazeMapper = self.gazeMappers.get(device.module_serial, calibration, self.createGazeMapper)
+        except Exception as e:
+            # The cached calibration stays in use
+            print(f"Device {self.deviceId}: error checking the calibration: {e!r}")
+
+    def step(self, maxCount=8):
+        """Processes the matched frames and gaze already received, up to maxCount. Returns how many."""
+        gazeMapper = self.changedGazeMapper
+        if gazeMapper is not None:
+            self.changedGazeMapper = None
+            self.pipeline.setGazeMapper(gazeMapper)
+
+        count = 0
+        while count < maxCount:
+            frameAndGaze = self.device.receive_matched_scene_video_frame_and_gaze(timeout_seconds=0)
+            if frameAndGaze is None:
+                break
+
+            self.pipeline.process(*frameAndGaze)
+            count += 1
+
+        if count > 0:
+            self.framesProcessed += count
+            resumeTime = self.connection.markData()
+            if resumeTime is not None:
+                self.lastResumeTime = resumeTime
+
+        return count
+
+    def close(self):
+        if self.device is not None:
+            try:
+                self.device.close()
+            except Exception as e:
+                print(f"Error closing device {self.deviceId}: {e}")
+            self.device = None
+
+
+class DeviceSupervisor():
+    """Runs the pipelines of several devices from one process.
+
+    Devices are discovered on an asyncio loop and each gets a DeviceSession.
+    The blocking work (connecting, decoding, marker detection and mapping)
+    runs on one shared thread pool. OpenCV and AprilTag release the GIL, so
+    the sessions run in parallel. Output carries the device id (see
+    gaze_packet.DEVICE_GAZE_PACKET). A session that fails, or that sends no
+    data for staleTimeout, is closed and reconnected with exponential
+    backoff. Waiting sessions do not hold a worker, so the others keep
+    running.
+    """
+    def __init__(self, endpoint, markerVerts, surfaceSize, workers=None, pyramidLevels=0,
+                 staleTimeout=3.0, pollInterval=0.005):
+        self.endpoint = endpoint
+        self.markerVerts = markerVerts
+        self.surfaceSize = surfaceSize
+        self.pyramidLevels = pyramidLevels
+        self.staleTimeout = staleTimeout
+        self.pollInterval = pollInterval
+
+        self.pool = ThreadPoolExecutor(workers or os.cpu_count(), thread_name_prefix='DevicePipeline')
+        self.sessions = {} # name -> DeviceSession
+        self.calibrationCache = CalibrationCache()
+        self.gazeMappers = GazeMapperCache() # Only touched by each module's own session
+        self.tasks = []
+        self.stopped = asyncio.Event()
+
+    def addDevice(self, name, connect):
+        """Starts a session for a device, or returns the running one. Call from the supervisor's loop."""
+        if name in self.sessions:
+            return self.sessions[name]
+
+        deviceId = len(self.sessions)
+        pipeline = GazePipeline(self.endpoint, self.surfaceSize, deviceId=deviceId, verbose=False)
+        pipeline.setMarkers(self.markerVerts)
+
+        session = DeviceSession(
+            deviceId, name, connect, pipeline, ConnectionManager(self.staleTimeout),
+            self.calibrationCache, self.gazeMappers, self.pyramidLevels
+        )
+        self.sessions[name] = session
+        self.tasks.append(asyncio.create_task(self.runSession(session)))
+        print(f"Device {deviceId}: {name}")
+        return session
+
+    async def runSession(self, session):
+        loop = asyncio.get_running_loop()
+        connection = session.connection
+        while not self.stopped.is_set():
+            try:
+                if session.device is None:
+                    await loop.run_in_executor(self.pool, session.open)
+                    if session.needsRevalidation():
+                        # Not awaited: frames are processed meanwhile
+                        loop.run_in_executor(self.pool, session.revalidate)
+
+                if await loop.run_in_executor(self.pool, session.step) == 0:
+                    if connection.isStale():
+                        raise ConnectionError(f"no data for {self.staleTimeout:.1f} s")
+                    await asyncio.sleep(self.pollInterval)
+
+                elif session.lastResumeTime is not None:
+                    print(f"Device {session.deviceId}: resumed after {session.lastResumeTime:.2f} s")
+                    session.lastResumeTime = None
+
+            except Exception as e:
+                connection.markLost(repr(e))
+                delay = connection.nextRetryDelay()
+                print(f"Device {session.deviceId}: {e!r}, reconnecting in {delay:.2f} s")
+                await loop.run_in_executor(self.pool, session.close)
+                try:
+                    await asyncio.wait_for(self.stopped.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+        await loop.run_in_executor(self.pool, session.close)
+        session.pipeline.close()
+
+    async def discover(self):
+        from pupil_labs.realtime_api.discovery import Network
+        from pupil_labs.realtime_api.simple import Device
+
+        async with Network() as network:
+            while not self.stopped.is_set():
+                info = await network.wait_for_new_device(timeout_seconds=1.0)
+                if info is not None:
+                    self.addDevice(info.name, lambda info=info: Device.from_discovered_device(info))
+
+    async def run(self, discover=True, duration=None):
+        """Supervises until stop() is called (or for duration seconds)."""
+        self.stopped.clear()
+        if discover:
+            self.tasks.append(asyncio.create_task(self.discover()))
+
+        if duration is None:
+            await self.stopped.wait()
+        else:
+            try:
+                await asyncio.wait_for(self.stopped.wait(), duration)
+            except asyncio.TimeoutError:
+                self.stopped.set()
+
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks.clear()
+
+    def stop(self):
+        self.stopped.set()
+
+    def close(self):
+        self.pool.shutdown()
+
+    def getStats(self):
+        return {
+            session.deviceId: {
+                "name": session.name,
+                "frames": session.framesProcessed,
+                **session.connection.getStats(),
+            }
+            for session in self.sessions.values()
+        }
+
+
+def renderSimulatedScene(markerVerts, surfaceSize, sceneSize=SCENE_SIZE):
+    """Scene camera image of the surface, seen head-on and scaled to fit, with its markers drawn white-padded."""
+    import cv2
+    import numpy as np
+    from pupil_labs.real_time_screen_gaze import marker_generator
+
+    scale = 0.7 * min(sceneSize[0] / surfaceSize[0], sceneSize[1] / surfaceSize[1])
+    offset = ((sceneSize[0] - scale*surfaceSize[0]) / 2, (sceneSize[1] - scale*surfaceSize[1]) / 2)
+
+    scene = np.full((sceneSize[1], sceneSize[0]), 96, dtype=np.uint8)
+    for markerId, verts in markerVerts.items():
+        (left, top), (right, bottom) = verts[0], verts[2]
+        size = int(scale * (right - left))
+        marker = cv2.resize(marker_generator.generate_marker(markerId), (size, size), interpolation=cv2.INTER_NEAREST)
+        x, y = int(offset[0] + scale*left), int(offset[1] + scale*top)
+        padding = size // 4
+        scene[y - padding:y + size + padding, x - padding:x + size + padding] = 255
+        scene[y:y + size, x:x + size] = marker
+
+    return cv2.cvtColor(scene, cv2.COLOR_GRAY2BGR), scale, offset
+
+
+class SimulatedDevice():
+    """Stands in for simple.Device: matched scene frames and gaze on the surface, at frameRate or as fast as read."""
+    module_serial = None # Never cached
+
+    def __init__(self, scene, gazeCenter, frameRate=SCENE_FRAME_RATE):
+        import numpy as np
+
+        self.scene = scene
+        self.gazeCenter = gazeCenter
+        self.frameRate = frameRate
+        self.nextFrameTime = time.monotonic()
+        self.rng = np.random.default_rng()
+        focalLength = 890.0
+        self.calibration = {
+            "scene_camera_matrix": np.array([
+                [focalLength, 0, scene.shape[1] / 2], [0, focalLength, scene.shape[0] / 2], [0, 0, 1]
+            ]),
+            "scene_distortion_coefficients": np.zeros(8),
+        }
+
+    def get_calibration(self):
+        return self.calibration
+
+    def receive_matched_scene_video_frame_and_gaze(self, timeout_seconds=None):
+        from pupil_labs.realtime_api import GazeData
+        from pupil_labs.realtime_api.simple.models import MatchedItem, SimpleVideoFrame
+
+        if self.frameRate is not None:
+            now = time.monotonic()
+            if now < self.nextFrameTime:
+                return None
+            self.nextFrameTime = max(self.nextFrameTime + 1 / self.frameRate, now - 1 / self.frameRate)
+
+        timestamp = time.time()
+        x, y = self.gazeCenter + self.rng.normal(0, 5, 2)
+        return MatchedItem(SimpleVideoFrame(self.scene, timestamp), GazeData(float(x), float(y), True, timestamp))
+
+    def close(self):
+        pass
+
+
+def benchmark(deviceCounts=(1, 2, 4, 8), seconds=5.0, workers=None):
+    """Aggregate frames per second with simulated devices producing frames as fast as they are read."""
+    layout = insetLayout(1920, 1080, 200, 50, CORNERS)
+    markerVerts, surfaceSize = layout.markers, layout.surfaceSize
+    scene, scale, offset = renderSimulatedScene(markerVerts, surfaceSize)
+    gazeCenter = (offset[0] + scale*surfaceSize[0] / 2, offset[1] + scale*surfaceSize[1] / 2)
+
+    results = []
+    for count in deviceCounts:
+        supervisor = DeviceSupervisor(('127.0.0.1', 5005), markerVerts, surfaceSize, workers=workers, staleTimeout=seconds)
+
+        async def run():
+            for index in range(count):
+                supervisor.addDevice(f'simulated-{index}', lambda: SimulatedDevice(scene, gazeCenter, frameRate=None))
+            await supervisor.run(discover=False, duration=seconds)
+
+        asyncio.run(run())
+        supervisor.close()
+
+        frames = sum(stats['frames'] for stats in supervisor.getStats().values())
+        throughput = frames / seconds
+        results.append({
+            "devices": count,
+            "frames_per_second": throughput,
+            "per_device": throughput / count,
+            "devices_at_30_hz": throughput / SCENE_FRAME_RATE,
+        })
+
+    return results
+
+
+def main():
+    """Discovers every device on the network and runs a pipeline for each, without a display."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--markers', help='JSON marker file, see marker_layout.loadLayout')
+    parser.add_argument('--layout', default='physical', help='Marker layout profile, used without --markers (default: physical)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5005)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--pyramid-levels', type=int, default=0)
+    parser.add_argument('--benchmark', action='store_true', help='Measure throughput with simulated devices instead')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        for result in benchmark(workers=args.workers):
+            print(f"{result['devices']} devices: {result['frames_per_second']:.0f} frames/s "
+                  f"({result['per_device']:.0f} per device, capacity {result['devices_at_30_hz']:.1f} devices at 30 Hz)")
+        return
+
+    layout = loadLayout(args.markers) if args.markers is not None else loadProfile(args.layout)
+    supervisor = DeviceSupervisor((args.host, args.port), layout.markers, layout.surfaceSize, args.workers, args.pyramid_levels)
+    try:
+        asyncio.run(supervisor.run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.close()
+        print(supervisor.getStats())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,37 @@
+import argparse
+import bisect
+import collections
 import numpy as np
 import math
+import time
+
+# Upper bound on the points kept, whatever the timestamps do (e.g. a device clock that stops)
+MAX_DWELL_POINTS = 8192
+
+# Dwell clicks: a dwell ends once the gaze stays this many times the dwell radius away for DWELL_EXIT_DELAY
+DWELL_EXIT_SCALE = 1.5
+DWELL_EXIT_DELAY = 0.1 # Seconds, so a single stray sample does not end a dwell
+DWELL_COOLDOWN = 0.5 # Seconds after a click before the next one can fire
+DWELL_MAX_GAP = 0.5 # Seconds without samples after which a dwell starts over
+
+ARMING = 'arming'
+DWELLING = 'dwelling'
 
 class DwellDetector():
+    """Detects when the last minimumDelay seconds of points all lie within range of their centre.
+
+    Points older than the window are dropped as new ones arrive, and the
+    window restarts if timestamps go backwards, so memory stays bounded.
+    """
     def __init__(self, minimumDelayInSeconds, rangeInPixels):
         self.minimumDelay = minimumDelayInSeconds
         self.range = rangeInPixels
-        self.points = np.empty(shape=[0, 3])
+        self.points = collections.deque(maxlen=MAX_DWELL_POINTS) # (x, y, timestamp)
+
+        self.inDwell = False
 
+    def reset(self):
+        self.points.clear()
         self.inDwell = False
 
     def setDuration(self, duration):
@@ -16,17 +41,22 @@ class DwellDetector():
         self.range = rangeInPixels
 
     def addPoint(self, x, y, timestamp):
-        point = np.array([x, y, timestamp])
+        points = self.points
+        if points and timestamp < points[-1][2]:
+            # e.g. a reconnect to a device with another clock; the old points would never expire
+            points.clear()
 
-        self.points = np.append(self.points, [point], axis=0)
-        if self.points[-1,2] - self.points[0,2] < self.minimumDelay:
+        points.append((x, y, timestamp))
+        if timestamp - points[0][2] < self.minimumDelay:
             return False, False, None
 
         minTimestamp = timestamp - self.minimumDelay - .0001
-        self.points = self.points[self.points[:,2] >= minTimestamp]
+        while points[0][2] < minTimestamp:
+            points.popleft()
 
-        center = np.mean(self.points[:,:2], axis=0)
-        distances = np.sqrt(np.sum(self.points[:,:2] - center, axis=1)**2)
+        window = np.array(points)[:,:2]
+        center = np.mean(window, axis=0)
+        distances = np.sqrt(np.sum((window - center)**2, axis=1))
 
         if np.max(distances) < self.range:
             inDwell = True
@@ -37,3 +67,381 @@ class DwellDetector():
         self.inDwell = inDwell
 
         return changed, inDwell, center
+
+    def addSample(self, sample):
+        changed, inDwell, center = self.addPoint(sample.screenX, sample.screenY, sample.timestamp)
+
+        sample.dwellChanged = changed
+        sample.dwell = inDwell
+        if center is None:
+            sample.dwellX = sample.dwellY = None
+        else:
+            sample.dwellX, sample.dwellY = float(center[0]), float(center[1])
+
+
+class DwellClicker():
+    """Dwell-click state machine with hysteresis, a cooldown and progress, O(1) per sample.
+
+    While arming, each sample within range of the running centre of the
+    current candidate adds to it. Two consecutive samples outside range
+    start a new candidate at the first of them; a single one is ignored as
+    a stray. progress goes from 0 to 1 over minimumDelay seconds in range,
+    counted from the end of the cooldown; at 1 the clicker clicks at the
+    centre and enters the dwell. The dwell only ends after the gaze has
+    stayed further than exitScale times the range for exitDelay seconds,
+    so gaze hovering at the range boundary no longer ends and restarts the
+    dwell with a click each time. Has the interface of DwellDetector, and
+    records the timestamps of the candidate's first sample (dwellStart),
+    the click and the release.
+    """
+    def __init__(self, minimumDelayInSeconds, rangeInPixels, exitScale=DWELL_EXIT_SCALE, exitDelay=DWELL_EXIT_DELAY,
+                 cooldown=DWELL_COOLDOWN, maxGap=DWELL_MAX_GAP):
+        self.minimumDelay = minimumDelayInSeconds
+        self.range = rangeInPixels
+        self.exitScale = exitScale
+        self.exitDelay = exitDelay
+        self.cooldown = cooldown
+        self.maxGap = maxGap
+        self.clicks = 0
+        self.reset()
+
+    def reset(self):
+        self.state = ARMING
+        self.lastTimestamp = None
+        self.cooldownEnd = None
+        self.clickTime = None
+        self.releaseTime = None
+        self.exitStart = None
+        self.startCandidate(None, 0.0, 0.0)
+
+    def setDuration(self, duration):
+        self.minimumDelay = duration
+
+    def setRange(self, rangeInPixels):
+        self.range = rangeInPixels
+
+    def setCooldown(self, cooldown):
+        self.cooldown = cooldown
+
+    @property
+    def inDwell(self):
+        return self.state == DWELLING
+
+    def startCandidate(self, timestamp, x, y):
+        self.dwellStart = timestamp
+        self.sumX = x
+        self.sumY = y
+        self.count = 0 if timestamp is None else 1
+        self.centerX = x
+        self.centerY = y
+        self.progress = 0.0
+        self.stray = None
+
+    def addToCenter(self, x, y):
+        self.sumX += x
+        self.sumY += y
+        self.count += 1
+        self.centerX = self.sumX / self.count
+        self.centerY = self.sumY / self.count
+
+    def addPoint(self, x, y, timestamp):
+        """Returns (changed, inDwell, center) as DwellDetector.addPoint does. changed and inDwell together mean a click."""
+        last = self.lastTimestamp
+        self.lastTimestamp = timestamp
+        if last is None or timestamp < last or timestamp - last > self.maxGap:
+            # A gap in the data or another clock: nothing continues across it
+            changed = self.state == DWELLING
+            if changed:
+                self.releaseTime = last if last is not None and timestamp > last else timestamp
+            self.state = ARMING
+            self.exitStart = None
+            self.cooldownEnd = None
+            self.startCandidate(timestamp, x, y)
+            return changed, False, (x, y)
+
+        dx = x - self.centerX
+        dy = y - self.centerY
+        squaredDistance = dx*dx + dy*dy
+
+        if self.state == DWELLING:
+            exitRange = self.range * self.exitScale
+            if squaredDistance <= exitRange * exitRange:
+                self.exitStart = None
+                if squaredDistance <= self.range * self.range:
+                    self.addToCenter(x, y)
+                return False, True, (self.centerX, self.centerY)
+
+            if self.exitStart is None:
+                self.exitStart = timestamp
+            if timestamp - self.exitStart < self.exitDelay:
+                return False, True, (self.centerX, self.centerY)
+
+            self.state = ARMING
+            self.releaseTime = self.exitStart
+            self.exitStart = None
+            self.startCandidate(timestamp, x, y)
+            return True, False, (x, y)
+
+        if squaredDistance > self.range * self.range:
+            if self.stray is None:
+                # Held back until the next sample shows whether the gaze moved
+                self.stray = (timestamp, x, y)
+                return False, False, (self.centerX, self.centerY)
+
+            strayTimestamp, strayX, strayY = self.stray
+            self.startCandidate(strayTimestamp, strayX, strayY)
+            if (x - strayX)**2 + (y - strayY)**2 > self.range * self.range:
+                self.startCandidate(timestamp, x, y)
+                return False, False, (x, y)
+
+        self.stray = None
+        self.addToCenter(x, y)
+        start = self.dwellStart if self.cooldownEnd is None else max(self.dwellStart, self.cooldownEnd)
+        elapsed = timestamp - start
+        if elapsed >= self.minimumDelay:
+            self.progress = 1.0
+        elif self.minimumDelay > 0:
+            self.progress = max(0.0, elapsed / self.minimumDelay)
+        else:
+            # A zero dwell time still waits for the cooldown
+            self.progress = 0.0
+        if self.progress < 1.0:
+            return False, False, (self.centerX, self.centerY)
+
+        self.state = DWELLING
+        self.clickTime = timestamp
+        self.cooldownEnd = timestamp + self.cooldown
+        self.clicks += 1
+        return True, True, (self.centerX, self.centerY)
+
+    def addSample(self, sample):
+        changed, inDwell, center = self.addPoint(sample.screenX, sample.screenY, sample.timestamp)
+
+        sample.dwellChanged = changed
+        sample.dwell = inDwell
+        sample.dwellX, sample.dwellY = center
+        sample.dwellProgress = self.progress
+
+
+class DwellNoiseEstimator():
+    """Online estimate of gaze noise during fixations, used to size the dwell radius.
+
+    Samples are grouped into stable periods: a period ends when a sample lands
+    further than twice the current radius (at most maxRadius) from the
+    period's running mean, i.e. on a saccade, or after a gap in the data or a
+    step back of the clock (e.g. a reconnect to another device).
+    Until the first estimate, and again if nothing was stable for
+    timeConstant seconds (the noise grew), the gate is maxRadius. Once a
+    period has lasted settleTime, each sample's squared distance from that
+    mean is folded into an exponentially weighted average, so the state is
+    a handful of floats whatever the session length.
+    The radius is radiusScale times the RMS distance, clamped to the bounds.
+    """
+    def __init__(self, initialRadius=25, minRadius=10, maxRadius=150, radiusScale=3.0, settleTime=0.1, timeConstant=10.0, maxGap=0.5):
+        self.initialRadius = initialRadius
+        self.minRadius = minRadius
+        self.maxRadius = maxRadius
+        self.radiusScale = radiusScale
+        self.settleTime = settleTime
+        self.timeConstant = timeConstant
+        self.maxGap = maxGap
+        self.reset()
+
+    def reset(self):
+        self.meanSquaredDistance = None
+        self.lastStableTimestamp = None
+        self.startPeriod(None)
+
+    def startPeriod(self, timestamp):
+        self.periodStart = timestamp
+        self.lastTimestamp = timestamp
+        self.sumX = 0.0
+        self.sumY = 0.0
+        self.count = 0
+
+    def setInitialRadius(self, radius):
+        self.initialRadius = radius
+
+    @property
+    def noise(self):
+        """RMS distance from the fixation centre in pixels, or None before the first stable period."""
+        if self.meanSquaredDistance is None:
+            return None
+        return math.sqrt(self.meanSquaredDistance)
+
+    @property
+    def radius(self):
+        if self.meanSquaredDistance is None:
+            return self.initialRadius
+        return max(self.minRadius, min(self.maxRadius, self.radiusScale * self.noise))
+
+    def addPoint(self, x, y, timestamp):
+        if self.lastTimestamp is not None and timestamp == self.lastTimestamp:
+            return
+        if self.lastTimestamp is None or not 0 < timestamp - self.lastTimestamp <= self.maxGap:
+            if self.lastTimestamp is not None and timestamp < self.lastTimestamp and self.lastStableTimestamp is not None:
+                # The estimate is kept, and now ages on the new clock
+                self.lastStableTimestamp = timestamp
+            self.startPeriod(timestamp)
+
+        dt = timestamp - self.lastTimestamp
+        self.lastTimestamp = timestamp
+
+        if self.count > 0:
+            centerX = self.sumX / self.count
+            centerY = self.sumY / self.count
+            squaredDistance = (x - centerX)**2 + (y - centerY)**2
+            if self.lastStableTimestamp is not None and timestamp - self.lastStableTimestamp > self.timeConstant:
+                self.meanSquaredDistance = None
+                self.lastStableTimestamp = None
+
+            gate = self.maxRadius if self.meanSquaredDistance is None else min(2 * self.radius, self.maxRadius)
+            if squaredDistance > gate**2:
+                self.startPeriod(timestamp)
+
+            elif timestamp - self.periodStart >= self.settleTime:
+                if self.meanSquaredDistance is None:
+                    self.meanSquaredDistance = squaredDistance
+                else:
+                    alpha = 1.0 - math.exp(-dt / self.timeConstant)
+                    self.meanSquaredDistance += alpha * (squaredDistance - self.meanSquaredDistance)
+                self.lastStableTimestamp = timestamp
+
+        self.sumX += x
+        self.sumY += y
+        self.count += 1
+
+    def addSample(self, sample):
+        self.addPoint(sample.screenX, sample.screenY, sample.timestamp)
+
+
+def simulateTrace(seconds=600.0, rate=200.0, radius=75.0, duration=0.75, seed=0):
+    """Screen-pixel gaze alternating between scanning and intended dwell clicks on targets.
+
+    Scanning fixations last 150-600 ms, shorter than the dwell duration,
+    and land at least three radii apart. Intended dwells are held 0.4-2.5 s
+    beyond the duration with noise of 15-30% of the radius, about what
+    adaptive dwell settles on, so the farthest samples reach the radius.
+    One sample in a hundred strays 1.5-2.5 radii, as when tracking
+    briefly fails. Returns timestamps, x, y and the intended dwells as
+    (start, end) pairs.
+    """
+    rng = np.random.default_rng(seed)
+    count = int(seconds * rate)
+    xs = np.empty(count)
+    ys = np.empty(count)
+    intended = []
+    index = 0
+    center = np.array([960.0, 540.0])
+
+    def nextCenter():
+        previous = center
+        while True:
+            candidate = rng.uniform((100, 100), (1820, 980))
+            if np.hypot(*(candidate - previous)) > 3 * radius:
+                return candidate
+
+    while index < count:
+        if rng.random() < 0.3:
+            length = int(rng.uniform(duration + 0.4, duration + 2.5) * rate)
+            sigma = rng.uniform(0.15, 0.3) * radius
+            intended.append((index / rate, min(index + length, count) / rate))
+        else:
+            length = int(rng.uniform(0.15, 0.6) * rate)
+            sigma = 0.2 * radius
+        center = nextCenter()
+        end = min(index + length, count)
+        xs[index:end], ys[index:end] = (center[:, None] + rng.normal(0, sigma, (2, end - index)))
+        index = end
+
+    strays = np.flatnonzero(rng.random(count) < 0.01)
+    angles = rng.uniform(0, 2 * math.pi, len(strays))
+    distances = rng.uniform(1.5, 2.5, len(strays)) * radius
+    xs[strays] += distances * np.cos(angles)
+    ys[strays] += distances * np.sin(angles)
+    return np.arange(count) / rate, xs, ys, intended
+
+
+def loadGazeTrace(path):
+    """Worn samples of a Neon gaze.csv export (timestamp [ns], gaze x [px], gaze y [px], worn), in scene camera pixels."""
+    import csv
+
+    timestamps, xs, ys = [], [], []
+    with open(path, newline='') as file:
+        for row in csv.DictReader(file):
+            if row.get('worn', '1') in ('0', 'False', 'false'):
+                continue
+            timestamps.append(int(row['timestamp [ns]']) * 1e-9)
+            xs.append(float(row['gaze x [px]']))
+            ys.append(float(row['gaze y [px]']))
+    return np.array(timestamps), np.array(xs), np.array(ys), None
+
+
+def clickTimes(detector, timestamps, xs, ys):
+    """Timestamps of the clicks a detector makes on a trace, and its cost per sample in microseconds."""
+    clicks = []
+    start = time.perf_counter()
+    for timestamp, x, y in zip(timestamps.tolist(), xs.tolist(), ys.tolist()):
+        changed, inDwell, _ = detector.addPoint(x, y, timestamp)
+        if changed and inDwell:
+            clicks.append(timestamp)
+    return clicks, (time.perf_counter() - start) / len(timestamps) * 1e6
+
+
+def scoreClicks(clicks, intended, seconds):
+    """The first click within an intended dwell is correct; any other click is false."""
+    result = {"clicks": len(clicks), "clicks_per_minute": len(clicks) / seconds * 60}
+    if intended is None:
+        return result
+
+    hits = set()
+    false = 0
+    starts = [start for start, _ in intended]
+    for click in clicks:
+        index = bisect.bisect_right(starts, click) - 1
+        if index >= 0 and click <= intended[index][1] and index not in hits:
+            hits.add(index)
+        else:
+            false += 1
+    result.update(
+        false_clicks=false,
+        false_clicks_per_minute=false / seconds * 60,
+        missed_dwells=len(intended) - len(hits),
+        intended_dwells=len(intended),
+    )
+    return result
+
+
+def benchmark(path=None, duration=0.75, radius=75.0):
+    """False and missed clicks, and cost per sample, of DwellDetector vs DwellClicker on a recorded or simulated trace.
+
+    Without labels (a recorded trace), every click of a session recorded
+    without intending any click is a false one.
+    """
+    timestamps, xs, ys, intended = loadGazeTrace(path) if path is not None else simulateTrace(radius=radius, duration=duration)
+    seconds = timestamps[-1] - timestamps[0]
+    results = {}
+    for name, detector in (('sliding_window', DwellDetector(duration, radius)), ('clicker', DwellClicker(duration, radius))):
+        clicks, cost = clickTimes(detector, timestamps, xs, ys)
+        results[name] = dict(scoreClicks(clicks, intended, seconds), us_per_sample=cost)
+    return results
+
+
+def main():
+    """Compares dwell click detection on a Neon gaze.csv export, or on a simulated session with known intent."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--trace', help='gaze.csv of a recording; all clicks count as false')
+    parser.add_argument('--duration', type=float, default=0.75, help='Dwell duration in seconds')
+    parser.add_argument('--radius', type=float, default=75.0, help='Dwell radius in the trace\'s pixels')
+    args = parser.parse_args()
+
+    for name, result in benchmark(args.trace, args.duration, args.radius).items():
+        line = f"{name}: {result['clicks']} clicks ({result['clicks_per_minute']:.1f}/min)"
+        if 'false_clicks' in result:
+            line += (f", {result['false_clicks']} false ({result['false_clicks_per_minute']:.2f}/min), "
+                     f"{result['missed_dwells']} of {result['intended_dwells']} intended dwells missed")
+        print(f"{line}, {result['us_per_sample']:.1f} us per sample")
+
+
+if __name__ == "__main__":
+    main()
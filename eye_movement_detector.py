@@ -0,0 +1,301 @@
+import collections
+import math
+
+FIXATION = 'fixation'
+SACCADE = 'saccade'
+
+# Neon scene camera: 1600 px over ~103 degrees
+SCENE_PIXELS_PER_DEGREE = 15.5
+
+
+class EyeMovementEvent():
+    __slots__ = ('kind', 'start', 'end', 'x', 'y', 'sampleCount')
+
+    def __init__(self, kind, start, end, x, y, sampleCount):
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.x = x # Fixation centroid, or saccade landing point
+        self.y = y
+        self.sampleCount = sampleCount
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    def toDict(self):
+        return {
+            "type": self.kind,
+            "start_timestamp_unix_seconds": self.start,
+            "end_timestamp_unix_seconds": self.end,
+            "x": self.x,
+            "y": self.y,
+        }
+
+    def __repr__(self):
+        return f'EyeMovementEvent({self.kind}, {self.start:.3f}-{self.end:.3f}, ({self.x:.1f}, {self.y:.1f}))'
+
+
+class IVTDetector():
+    """Velocity-threshold (I-VT) fixation/saccade classification.
+
+    Each sample is classified by its velocity relative to the newest sample
+    at least velocityWindow seconds older, which averages out noise at 200 Hz
+    (4 samples back) and compares consecutive samples at the ~30 Hz of
+    frame-matched gaze. Consecutive samples of the same class form an event.
+    Only running sums and the samples within the window are kept, so every
+    update is amortized O(1). Coordinates can be in any unit; the velocity
+    threshold is in those units per second.
+    """
+    def __init__(self, velocityThreshold=30 * SCENE_PIXELS_PER_DEGREE, minFixationDuration=0.06, velocityWindow=0.02):
+        self.velocityThreshold = velocityThreshold
+        self.minFixationDuration = minFixationDuration
+        self.velocityWindow = velocityWindow
+        self.reset()
+
+    def reset(self):
+        self.history = collections.deque()
+        self.kind = None
+        self.start = 0.0
+        self.end = 0.0
+        self.sumX = 0.0
+        self.sumY = 0.0
+        self.lastX = 0.0
+        self.lastY = 0.0
+        self.count = 0
+
+    def setVelocityThreshold(self, threshold):
+        self.velocityThreshold = threshold
+
+    def finishEvent(self):
+        if self.count == 0:
+            return None
+
+        if self.kind == FIXATION:
+            if self.end - self.start < self.minFixationDuration:
+                return None
+            return EyeMovementEvent(FIXATION, self.start, self.end, self.sumX / self.count, self.sumY / self.count, self.count)
+
+        return EyeMovementEvent(SACCADE, self.start, self.end, self.lastX, self.lastY, self.count)
+
+    def addPoint(self, x, y, timestamp):
+        """Returns the event that this sample completed, or None."""
+        history = self.history
+        if len(history) > 0 and timestamp <= history[-1][2]:
+            return None
+
+        history.append((x, y, timestamp))
+        if len(history) == 1:
+            return None
+
+        # Keep the newest sample that is still at least velocityWindow old, allowing for rounding of float timestamps
+        while len(history) > 2 and timestamp - history[1][2] >= self.velocityWindow - 1e-6:
+            history.popleft()
+
+        previousX, previousY, previousTimestamp = history[0]
+        dt = timestamp - previousTimestamp
+        velocity = math.hypot(x - previousX, y - previousY) / dt
+        kind = FIXATION if velocity < self.velocityThreshold else SACCADE
+
+        event = None
+        if kind != self.kind:
+            event = self.finishEvent()
+            self.kind = kind
+            self.start = history[-2][2]
+            self.sumX = self.sumY = 0.0
+            self.count = 0
+
+        self.end = timestamp
+        self.sumX += x
+        self.sumY += y
+        self.lastX = x
+        self.lastY = y
+        self.count += 1
+
+        return event
+
+    def flush(self):
+        """Returns the event in progress, if complete enough to report, and resets."""
+        event = self.finishEvent()
+        self.reset()
+        return event
+
+
+class MonotonicWindow():
+    """Sliding window minimum and maximum with amortized O(1) push/pop."""
+    def __init__(self):
+        self.minimums = collections.deque()
+        self.maximums = collections.deque()
+
+    def clear(self):
+        self.minimums.clear()
+        self.maximums.clear()
+
+    def push(self, index, value):
+        while self.minimums and self.minimums[-1][1] >= value:
+            self.minimums.pop()
+        self.minimums.append((index, value))
+
+        while self.maximums and self.maximums[-1][1] <= value:
+            self.maximums.pop()
+        self.maximums.append((index, value))
+
+    def popBefore(self, index):
+        while self.minimums and self.minimums[0][0] < index:
+            self.minimums.popleft()
+        while self.maximums and self.maximums[0][0] < index:
+            self.maximums.popleft()
+
+    def range(self):
+        return self.maximums[0][1] - self.minimums[0][1]
+
+
+class IDTDetector():
+    """Dispersion-threshold (I-DT) fixation/saccade classification.
+
+    The window dispersion ((max x - min x) + (max y - min y)) is tracked with
+    monotonic deques and running sums, so each update is amortized O(1). A
+    window that stays within dispersionThreshold for minFixationDuration is a
+    fixation. It grows until a sample breaks the threshold, and the samples
+    between two fixations form a saccade. While in a fixation only its
+    bounds, sums and count are kept, so a long fixation does not grow the
+    window.
+    """
+    def __init__(self, dispersionThreshold=1.0 * SCENE_PIXELS_PER_DEGREE, minFixationDuration=0.1):
+        self.dispersionThreshold = dispersionThreshold
+        self.minFixationDuration = minFixationDuration
+        self.reset()
+
+    def reset(self):
+        self.window = collections.deque() # (index, x, y, timestamp)
+        self.windowX = MonotonicWindow()
+        self.windowY = MonotonicWindow()
+        self.sumX = 0.0
+        self.sumY = 0.0
+        self.index = 0
+        self.inFixation = False
+        self.saccadeStart = None
+        self.saccadeCount = 0
+        # The fixation in progress: start, end, sample count and x/y bounds
+        self.fixationStart = self.fixationEnd = None
+        self.fixationCount = 0
+        self.minX = self.maxX = self.minY = self.maxY = 0.0
+
+    def setDispersionThreshold(self, threshold):
+        self.dispersionThreshold = threshold
+
+    def dispersion(self):
+        return self.windowX.range() + self.windowY.range()
+
+    def push(self, index, x, y, timestamp):
+        self.window.append((index, x, y, timestamp))
+        self.sumX += x
+        self.sumY += y
+
+    def popOldest(self):
+        index, x, y, _ = self.window.popleft()
+        self.sumX -= x
+        self.sumY -= y
+        self.windowX.popBefore(index + 1)
+        self.windowY.popBefore(index + 1)
+
+        # Samples dropped between two fixations belong to the saccade
+        if self.saccadeStart is not None:
+            self.saccadeCount += 1
+
+    def fixationEvent(self):
+        count = self.fixationCount
+        return EyeMovementEvent(FIXATION, self.fixationStart, self.fixationEnd, self.sumX / count, self.sumY / count, count)
+
+    def startFixation(self):
+        """Replaces the window by the fixation's bounds, which only grow until it ends."""
+        self.inFixation = True
+        self.fixationStart = self.window[0][3]
+        self.fixationEnd = self.window[-1][3]
+        self.fixationCount = len(self.window)
+        self.minX, self.maxX = self.windowX.minimums[0][1], self.windowX.maximums[0][1]
+        self.minY, self.maxY = self.windowY.minimums[0][1], self.windowY.maximums[0][1]
+
+    def addPoint(self, x, y, timestamp):
+        """Returns the event that this sample completed, or None."""
+        index = self.index
+        self.index += 1
+
+        if self.inFixation:
+            minX, maxX = min(self.minX, x), max(self.maxX, x)
+            minY, maxY = min(self.minY, y), max(self.maxY, y)
+            if (maxX - minX) + (maxY - minY) <= self.dispersionThreshold:
+                self.minX, self.maxX, self.minY, self.maxY = minX, maxX, minY, maxY
+                self.sumX += x
+                self.sumY += y
+                self.fixationCount += 1
+                self.fixationEnd = timestamp
+                return None
+
+            # This sample ends the fixation and starts a new window
+            fixation = self.fixationEvent()
+            self.window.clear()
+            self.windowX.clear()
+            self.windowY.clear()
+            self.sumX = self.sumY = 0.0
+            self.windowX.push(index, x)
+            self.windowY.push(index, y)
+            self.push(index, x, y, timestamp)
+
+            self.inFixation = False
+            self.saccadeStart = fixation.end
+            self.saccadeCount = 0
+            return fixation
+
+        self.windowX.push(index, x)
+        self.windowY.push(index, y)
+        self.push(index, x, y, timestamp)
+        while len(self.window) > 1 and self.dispersion() > self.dispersionThreshold:
+            self.popOldest()
+
+        if self.window[-1][3] - self.window[0][3] < self.minFixationDuration:
+            return None
+
+        self.startFixation()
+        _, landingX, landingY, landingTime = self.window[0]
+        self.window.clear()
+        self.windowX.clear()
+        self.windowY.clear()
+        if self.saccadeStart is None:
+            return None
+
+        saccade = EyeMovementEvent(SACCADE, self.saccadeStart, landingTime, landingX, landingY, self.saccadeCount + 1)
+        self.saccadeStart = None
+        self.saccadeCount = 0
+        return saccade
+
+    def flush(self):
+        """Returns the fixation in progress, if any, and resets."""
+        event = self.fixationEvent() if self.inFixation else None
+        self.reset()
+        return event
+
+
+def createDetector(kind, **kwargs):
+    if kind == 'ivt':
+        return IVTDetector(**kwargs)
+    elif kind == 'idt':
+        return IDTDetector(**kwargs)
+
+    raise ValueError(f"Unknown eye movement detector '{kind}', expected 'ivt' or 'idt'")
+
+
+def detectEvents(detector, xs, ys, timestamps):
+    """Batch mode: runs a fresh streaming detector over recorded arrays and returns all events."""
+    detector.reset()
+    events = []
+    for x, y, timestamp in zip(xs, ys, timestamps):
+        event = detector.addPoint(float(x), float(y), float(timestamp))
+        if event is not None:
+            events.append(event)
+
+    event = detector.flush()
+    if event is not None:
+        events.append(event)
+
+    return events
@@ -0,0 +1,199 @@
+import sys
+import time
+
+import cv2
+import numpy as np
+import pupil_apriltags
+
+from pupil_labs.real_time_screen_gaze.gaze_mapper import GazeMapper, create_apriltag_marker_uid
+from surface_tracker import CornerId, Marker
+
+TAG_FAMILY = "tag36h11"
+SUBPIX_CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 0.01)
+
+
+class FramePreprocessor():
+    """Grayscale + pyramid downscaling of scene frames into reused buffers.
+
+    Markers are detected on the smallest pyramid level and only their corners
+    are refined on the full resolution grayscale image.
+    """
+    def __init__(self, pyramidLevels=0, refineCorners=True, quadDecimate=2.0):
+        self.pyramidLevels = pyramidLevels
+        self.refineCorners = refineCorners
+        self.quadDecimate = quadDecimate
+
+        self.grayBuffer = None
+        self.pyramidBuffers = []
+        self.detector = None
+
+    def setPyramidLevels(self, levels):
+        self.pyramidLevels = levels
+        self.pyramidBuffers = []
+        if self.detector is not None:
+            self.detector.tag_detector_ptr.contents.quad_decimate = self.getQuadDecimate()
+
+    def setRefineCorners(self, refine):
+        self.refineCorners = refine
+
+    def getQuadDecimate(self):
+        # The pyramid already decimates the image, so the detector only does it at level 0
+        return self.quadDecimate if self.pyramidLevels == 0 else 1.0
+
+    def getDetector(self):
+        # Detectors are reconfigured rather than recreated: destroying one can crash pupil_apriltags
+        if self.detector is None:
+            self.detector = pupil_apriltags.Detector(
+                families=TAG_FAMILY, nthreads=2, quad_decimate=self.getQuadDecimate(), decode_sharpening=1.0
+            )
+
+        return self.detector
+
+    def allocateBuffers(self, height, width):
+        self.grayBuffer = np.empty((height, width), dtype=np.uint8)
+        self.pyramidBuffers = []
+        for _ in range(self.pyramidLevels):
+            height, width = (height + 1) // 2, (width + 1) // 2
+            self.pyramidBuffers.append(np.empty((height, width), dtype=np.uint8))
+
+    def process(self, image):
+        """Returns (full resolution gray, smallest pyramid level). Both are reused between calls.
+
+        A grayscale image (e.g. a scene_decoder.PooledFrame) is used as is, without a copy.
+        """
+        height, width = image.shape[:2]
+        if self.grayBuffer is None or self.grayBuffer.shape != (height, width) \
+                or len(self.pyramidBuffers) != self.pyramidLevels:
+            self.allocateBuffers(height, width)
+
+        if image.ndim == 2:
+            gray = image
+        else:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=self.grayBuffer)
+
+        level = gray
+        for buffer in self.pyramidBuffers:
+            cv2.pyrDown(level, dst=buffer, dstsize=(buffer.shape[1], buffer.shape[0]))
+            level = buffer
+
+        return gray, level
+
+    def detectCorners(self, image):
+        """Returns a list of (tag id, 4x2 corners in full resolution pixels)."""
+        gray, small = self.process(image)
+        detections = self.getDetector().detect(small)
+
+        scale = 2 ** self.pyramidLevels
+        uniqueDetections = {int(d.tag_id): d for d in detections}
+
+        results = []
+        for tagId, detection in uniqueDetections.items():
+            corners = np.asarray(detection.corners, dtype=np.float32) * scale
+            if self.pyramidLevels > 0 and self.refineCorners:
+                window = scale + 1
+                cv2.cornerSubPix(gray, corners.reshape(-1, 1, 2), (window, window), (-1, -1), SUBPIX_CRITERIA)
+
+            results.append((tagId, corners))
+
+        return results
+
+    def detectMarkers(self, image, camera):
+        markers = []
+        for tagId, corners in self.detectCorners(image):
+            vertices = camera.undistort_points_on_image_plane([[point] for point in corners.astype(np.float64)])
+            markers.append(Marker.from_vertices(
+                uid=create_apriltag_marker_uid(TAG_FAMILY, tagId),
+                undistorted_image_space_vertices=vertices,
+                starting_with=CornerId.TOP_LEFT,
+                clockwise=True,
+            ))
+
+        return markers
+
+
+class PreprocessingGazeMapper(GazeMapper):
+    """GazeMapper that runs marker detection through a FramePreprocessor."""
+    def __init__(self, calibration, preprocessor=None, surfaces=()):
+        super().__init__(calibration, surfaces)
+        self.preprocessor = preprocessor if preprocessor is not None else FramePreprocessor()
+
+    def process_scene(self, frame):
+        if not self._detector:
+            return
+
+        if hasattr(frame, 'pixels'):
+            # scene_decoder.PooledFrame: grayscale unless colour was asked for
+            frame = frame.pixels
+
+        elif hasattr(frame, 'bgr_pixels'):
+            frame = frame.bgr_pixels
+
+        elif hasattr(frame, 'bgr_buffer'):
+            frame = frame.bgr_buffer()
+
+        self._detected_markers = self.preprocessor.detectMarkers(frame, self._camera)
+
+        self._surface_locations = {
+            surface.uid: self._tracker.locate_surface(
+                surface=surface,
+                markers=self._detected_markers,
+            )
+            for surface in self._surfaces
+        }
+
+
+def loadRecordedFrames(path, maxFrames=500):
+    capture = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < maxFrames:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        frames.append(frame)
+
+    capture.release()
+    return frames
+
+
+def benchmark(frames, maxPyramidLevels=2, expectedMarkers=4):
+    """Detection rate versus CPU cost for each pyramid level on recorded frames."""
+    preprocessor = FramePreprocessor()
+    results = []
+    for levels in range(maxPyramidLevels + 1):
+        for refine in ([False] if levels == 0 else [False, True]):
+            preprocessor.setPyramidLevels(levels)
+            preprocessor.setRefineCorners(refine)
+            preprocessor.detectCorners(frames[0]) # warm up buffers
+
+            detected = 0
+            start = time.process_time()
+            for frame in frames:
+                detected += min(expectedMarkers, len(preprocessor.detectCorners(frame)))
+            cpuTime = time.process_time() - start
+
+            results.append({
+                "pyramid_levels": levels,
+                "refine_corners": refine,
+                "detection_rate": detected / (expectedMarkers * len(frames)),
+                "cpu_ms_per_frame": 1000 * cpuTime / len(frames),
+            })
+
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(f"Usage: {sys.argv[0]} <recorded scene video> [max pyramid levels]")
+        sys.exit(1)
+
+    frames = loadRecordedFrames(sys.argv[1])
+    if len(frames) == 0:
+        print(f"No frames could be read from {sys.argv[1]}")
+        sys.exit(1)
+
+    maxLevels = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    for result in benchmark(frames, maxLevels):
+        print(
+            f"levels={result['pyramid_levels']} refine={result['refine_corners']!s:5} "
+            f"detection={result['detection_rate']:.1%} cpu={result['cpu_ms_per_frame']:.2f} ms/frame"
+        )
@@ -0,0 +1,302 @@
+import json
+import struct
+import time
+
+from gaze_sample import EYE_STATE_FIELDS
+from reliable_link import NEW, SequenceStats
+
+# Quantization step per GazeSample field, in the field's unit. Fields not listed are not sent.
+DEFAULT_PRECISIONS = {
+    'timestamp': 1e-4, # seconds
+    'x': 0.1, 'y': 0.1, # scene camera pixels
+    'worn': 1,
+    'surfaceX': 1e-4, 'surfaceY': 1e-4, # normalized surface coordinates
+    'onSurface': 1,
+    'confidence': 0.01,
+    **{name: 0.01 for name in EYE_STATE_FIELDS}, # mm
+    **{name: 1e-4 for name in EYE_STATE_FIELDS if name.startswith(('optical_axis', 'eyelid_angle'))}, # unit vector, radians
+}
+BOOL_FIELDS = ('worn', 'onSurface')
+
+# Send a keyframe after this many delta packets, so a receiver recovers from a lost packet within it
+KEYFRAME_INTERVAL = 30
+
+# Magic, packet kind, sequence number (wraps at 2**16), keyframe number (wraps at 2**8)
+CODEC_HEADER = struct.Struct('<BBHB')
+CODEC_MAGIC = 0xD7
+KEYFRAME = 1
+DELTA = 2
+
+
+def writeVarint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def readVarint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def zigzag(value):
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def unzigzag(value):
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+class GazeDeltaEncoder():
+    """Compact binary encoding of GazeSample fields for remote sinks.
+
+    Every field is quantized to its precision, so the receiver gets each value
+    to within half a step. Fields are written as zigzag varints: keyframes hold
+    absolute values, and the packets in between only hold the change from the
+    last keyframe, in quantized steps, so rounding errors never accumulate. A
+    lost delta packet costs only its own sample; a receiver that misses a
+    keyframe (they are numbered) skips deltas until the next one. A bit mask
+    marks the fields present (None and NaN are absent). Packets also carry a
+    sequence number for loss statistics.
+    """
+    def __init__(self, precisions=None, keyframeInterval=KEYFRAME_INTERVAL):
+        self.precisions = dict(DEFAULT_PRECISIONS if precisions is None else precisions)
+        self.fields = tuple(self.precisions)
+        self.scales = tuple(1.0 / self.precisions[name] for name in self.fields)
+        self.keyframeInterval = keyframeInterval
+
+        self.reference = [None] * len(self.fields) # Quantized keyframe values
+        self.sequence = 0
+        self.keyframeNumber = 0
+        self.sinceKeyframe = None
+        self.buffer = bytearray()
+
+    def requestKeyframe(self):
+        self.sinceKeyframe = None
+
+    def encode(self, sample):
+        keyframe = self.sinceKeyframe is None or self.sinceKeyframe >= self.keyframeInterval
+        if keyframe:
+            self.sinceKeyframe = 0
+            self.keyframeNumber = (self.keyframeNumber + 1) & 0xFF
+        else:
+            self.sinceKeyframe += 1
+
+        out = self.buffer
+        del out[:]
+        out += CODEC_HEADER.pack(CODEC_MAGIC, KEYFRAME if keyframe else DELTA, self.sequence, self.keyframeNumber)
+        self.sequence = (self.sequence + 1) & 0xFFFF
+
+        mask = 0
+        values = []
+        reference = self.reference
+        for index, name in enumerate(self.fields):
+            value = getattr(sample, name)
+            if value is None or value != value:
+                if keyframe:
+                    reference[index] = None
+                continue
+
+            quantized = int(round(value * self.scales[index]))
+            base = None if keyframe else reference[index]
+            if keyframe:
+                reference[index] = quantized
+            values.append(zigzag(quantized if base is None else quantized - base))
+            mask |= 1 << index
+
+        writeVarint(out, mask)
+        for value in values:
+            writeVarint(out, value)
+
+        return bytes(out)
+
+
+class GazeDeltaDecoder():
+    """Receiving side of GazeDeltaEncoder. Needs the same precisions.
+
+    Packets older than the newest one seen are counted as reordered (or
+    duplicates) and dropped, like late samples on the sequenced gaze channel,
+    so a late keyframe never replaces a newer reference.
+    """
+    def __init__(self, precisions=None):
+        self.precisions = dict(DEFAULT_PRECISIONS if precisions is None else precisions)
+        self.fields = tuple(self.precisions)
+        self.steps = tuple(self.precisions[name] for name in self.fields)
+        self.isBool = tuple(name in BOOL_FIELDS for name in self.fields)
+
+        self.reference = [None] * len(self.fields)
+        self.keyframeNumber = None
+        self.sequences = SequenceStats()
+        self.values = {}
+
+        self.decoded = 0
+        self.keyframes = 0
+        self.skipped = 0
+        self.invalid = 0
+
+    def decode(self, data):
+        """Returns {field: value} (reused between calls, None for absent fields), or None while waiting for a keyframe."""
+        if len(data) < CODEC_HEADER.size:
+            self.invalid += 1
+            return None
+
+        magic, kind, sequence, keyframeNumber = CODEC_HEADER.unpack_from(data)
+        if magic != CODEC_MAGIC or kind not in (KEYFRAME, DELTA):
+            self.invalid += 1
+            return None
+
+        # Unwrapped around the highest sequence number seen, so a late packet is not taken for a gap
+        highest = self.sequences.highest
+        if highest is not None:
+            sequence = highest + ((sequence - highest + 0x8000) & 0xFFFF) - 0x8000
+        if self.sequences.update(sequence) != NEW:
+            return None
+
+        keyframe = kind == KEYFRAME
+        if not keyframe and keyframeNumber != self.keyframeNumber:
+            # Relative to a keyframe that was lost
+            self.skipped += 1
+            return None
+        self.keyframeNumber = keyframeNumber
+
+        mask, offset = readVarint(data, CODEC_HEADER.size)
+        reference = self.reference
+        values = self.values
+        for index, name in enumerate(self.fields):
+            if not mask >> index & 1:
+                if keyframe:
+                    reference[index] = None
+                values[name] = None
+                continue
+
+            value, offset = readVarint(data, offset)
+            value = unzigzag(value)
+            if keyframe:
+                reference[index] = value
+            base = None if keyframe else reference[index]
+            quantized = value if base is None else base + value
+            values[name] = bool(quantized) if self.isBool[index] else quantized * self.steps[index]
+
+        self.decoded += 1
+        self.keyframes += kind == KEYFRAME
+        return values
+
+    def getStats(self):
+        return {
+            "decoded": self.decoded,
+            "keyframes": self.keyframes,
+            "lost": self.sequences.lost,
+            "reordered": self.sequences.reordered,
+            "duplicates": self.sequences.duplicates,
+            "skipped_until_keyframe": self.skipped,
+            "invalid": self.invalid,
+        }
+
+
+def simulateSamples(count, rate=200.0, seed=0):
+    """Neon-like samples: fixations with small jitter, saccades between them, slowly varying eye state."""
+    import numpy as np
+
+    from gaze_sample import GazeSample
+
+    rng = np.random.default_rng(seed)
+    samples = []
+    center = np.array([800.0, 600.0])
+    timestamp = time.time()
+    eyeState = {name: float(rng.uniform(-1, 1)) for name in EYE_STATE_FIELDS}
+    for index in range(count):
+        if rng.random() < 1 / 60: # ~300 ms fixations
+            center = rng.uniform((0, 0), (1600, 1200))
+
+        sample = GazeSample()
+        sample.timestamp = timestamp + index / rate + rng.normal(0, 2e-4)
+        sample.x, sample.y = center + rng.normal(0, 3, 2)
+        sample.worn = True
+        for name in EYE_STATE_FIELDS:
+            eyeState[name] += rng.normal(0, 0.002)
+            setattr(sample, name, eyeState[name])
+        sample.surfaceX, sample.surfaceY = sample.x / 1600, 1 - sample.y / 1200
+        sample.onSurface = True
+        sample.confidence = 1.0
+        samples.append(sample)
+
+    return samples
+
+
+def jsonPayload(sample, rawGaze, surfaceGaze):
+    """The data_payload data_sender.py sends per sample."""
+    return {
+        "raw_gaze_data": sample.writeRawGaze(rawGaze, 'x_raw_normalized', 'y_raw_normalized'),
+        "surface_gaze_data": [sample.writeSurfaceGaze(surfaceGaze, 'x_surface_px', 'y_surface_px')],
+        "eye_movement_events": [],
+    }
+
+
+def benchmark(count=20000, keyframeInterval=KEYFRAME_INTERVAL, lossRate=0.05):
+    """Bytes per sample and encode cost of data_sender's JSON vs delta packets, plus reconstruction error and loss recovery."""
+    import random
+
+    samples = simulateSamples(count)
+    results = {}
+
+    rawGaze, surfaceGaze = {}, {}
+    start = time.perf_counter()
+    jsonBytes = sum(len(json.dumps(jsonPayload(sample, rawGaze, surfaceGaze)).encode('utf-8')) for sample in samples)
+    results['json'] = {"bytes_per_sample": jsonBytes / count, "encode_us": (time.perf_counter() - start) / count * 1e6}
+
+    encoder = GazeDeltaEncoder(keyframeInterval=keyframeInterval)
+    start = time.perf_counter()
+    packets = [encoder.encode(sample) for sample in samples]
+    encodeTime = time.perf_counter() - start
+    keyframes = [len(packet) for packet in packets if packet[1] == KEYFRAME]
+    deltas = [len(packet) for packet in packets if packet[1] == DELTA]
+    results['delta'] = {
+        "bytes_per_sample": sum(map(len, packets)) / count,
+        "keyframe_bytes": sum(keyframes) / len(keyframes),
+        "delta_bytes": sum(deltas) / max(len(deltas), 1),
+        "encode_us": encodeTime / count * 1e6,
+    }
+
+    decoder = GazeDeltaDecoder()
+    start = time.perf_counter()
+    maxError = {}
+    for sample, packet in zip(samples, packets):
+        values = decoder.decode(packet)
+        for name, value in values.items():
+            step = decoder.precisions[name]
+            error = abs(float(value) - float(getattr(sample, name))) / step
+            maxError[name] = max(maxError.get(name, 0.0), error)
+    results['delta']['decode_us'] = (time.perf_counter() - start) / count * 1e6
+    results['delta']['max_error_steps'] = max(maxError.values())
+
+    # Random loss: every delivered sample is decoded exactly or skipped until the next keyframe
+    rng = random.Random(1)
+    decoder = GazeDeltaDecoder()
+    delivered = 0
+    for packet in packets:
+        if rng.random() >= lossRate:
+            delivered += 1
+            decoder.decode(packet)
+    results['loss'] = dict(decoder.getStats(), loss_rate=lossRate, delivered=delivered)
+
+    return results
+
+
+if __name__ == "__main__":
+    results = benchmark()
+    print(f"JSON:  {results['json']['bytes_per_sample']:.0f} bytes/sample, {results['json']['encode_us']:.1f} us to encode")
+    delta = results['delta']
+    print(f"Delta: {delta['bytes_per_sample']:.1f} bytes/sample (keyframes {delta['keyframe_bytes']:.0f}, "
+          f"deltas {delta['delta_bytes']:.1f}), {delta['encode_us']:.1f} us to encode, {delta['decode_us']:.1f} us to decode, "
+          f"max error {delta['max_error_steps']:.2f} steps")
+    loss = results['loss']
+    print(f"With {loss['loss_rate']:.0%} loss: {loss['decoded']} of {loss['delivered']} delivered samples decoded, "
+          f"{loss['skipped_until_keyframe']} skipped until a keyframe")
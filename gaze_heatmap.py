@@ -0,0 +1,143 @@
+import math
+import time
+
+import numpy as np
+
+# Stored values are rescaled once the running weight grows past this
+RENORMALIZE_WEIGHT = 1e30
+
+
+class GazeHeatmap():
+    """Accumulates surface gaze into a fixed-resolution grid.
+
+    Adding a sample is O(1): one cell is incremented. Exponential time decay
+    is not applied to the grid. Instead, every new sample is weighted by
+    exp((t - t0) / tau), and reads scale the grid by one scalar. The Gaussian
+    blur is separable and only runs when a snapshot is requested after new
+    samples were added. OpenCV is imported by the first snapshot, so it stays
+    off the startup path.
+    """
+    def __init__(self, width, height, sigma=2.0, halfLife=None):
+        self.width = width
+        self.height = height
+        self.grid = np.zeros((height, width), dtype=np.float64)
+        self.setSigma(sigma)
+        self.setHalfLife(halfLife)
+
+        self.referenceTime = None
+        self.lastTime = None
+        self.weight = 1.0
+        self.sampleCount = 0
+        self.snapshotCache = None
+
+    def setSigma(self, sigma):
+        self.sigma = sigma
+        size = max(3, 2 * math.ceil(3 * sigma) + 1)
+        # Same column as cv2.getGaussianKernel(size, sigma)
+        offsets = np.arange(size, dtype=np.float64) - (size - 1) / 2
+        kernel = np.exp(-offsets**2 / (2 * sigma**2))
+        self.kernel = (kernel / kernel.sum()).reshape(-1, 1)
+        self.snapshotCache = None
+
+    def setHalfLife(self, halfLife):
+        """halfLife in seconds, or None to accumulate forever."""
+        self.tau = halfLife / math.log(2) if halfLife else None
+        self.snapshotCache = None
+
+    def clear(self):
+        self.grid.fill(0)
+        self.referenceTime = None
+        self.lastTime = None
+        self.weight = 1.0
+        self.sampleCount = 0
+        self.snapshotCache = None
+
+    def add(self, normX, normY, timestamp):
+        """Adds a normalized surface position (y up, as mapped by GazeMapper)."""
+        if not (0.0 <= normX <= 1.0 and 0.0 <= normY <= 1.0):
+            return
+
+        if self.referenceTime is None:
+            self.referenceTime = timestamp
+        self.lastTime = timestamp
+
+        if self.tau is not None:
+            self.weight = math.exp((timestamp - self.referenceTime) / self.tau)
+            if self.weight > RENORMALIZE_WEIGHT:
+                self.grid *= 1.0 / self.weight
+                self.referenceTime = timestamp
+                self.weight = 1.0
+
+        column = min(int(normX * self.width), self.width - 1)
+        row = min(int((1.0 - normY) * self.height), self.height - 1)
+        self.grid[row, column] += self.weight
+        self.sampleCount += 1
+        self.snapshotCache = None
+
+    def decayScale(self, now=None):
+        if self.tau is None or self.referenceTime is None:
+            return 1.0
+
+        now = self.lastTime if now is None else now
+        return math.exp(-(now - self.referenceTime) / self.tau)
+
+    def snapshot(self):
+        """Blurred, decayed heat per cell (float32), in samples. Cached until the next add()."""
+        if self.snapshotCache is None:
+            import cv2
+
+            self.snapshotCache = cv2.sepFilter2D(
+                self.grid.astype(np.float32), -1, self.kernel, self.kernel, borderType=cv2.BORDER_CONSTANT
+            )
+            self.snapshotCache *= self.decayScale()
+
+        return self.snapshotCache
+
+    def snapshotImage(self):
+        """BGR uint8 colour map of the snapshot, normalized to its maximum."""
+        import cv2
+
+        heat = self.snapshot()
+        peak = float(heat.max())
+        scaled = np.zeros(heat.shape, dtype=np.uint8) if peak <= 0 else (heat * (255.0 / peak)).astype(np.uint8)
+        return cv2.applyColorMap(scaled, cv2.COLORMAP_JET)
+
+    def encodePng(self):
+        """Compressed snapshot to send over the network."""
+        import cv2
+
+        ok, data = cv2.imencode('.png', self.snapshotImage())
+        return data.tobytes() if ok else b''
+
+
+def benchmark(rate=200, seconds=10, sizes=((1920, 1080), (3840, 2160))):
+    """Per-sample add() cost on full resolution grids, which must not depend on the grid size."""
+    count = rate * seconds
+    rng = np.random.default_rng(0)
+    points = rng.random((count, 2)).tolist()
+
+    results = []
+    for width, height in sizes:
+        heatmap = GazeHeatmap(width, height, sigma=20, halfLife=5)
+        start = time.perf_counter()
+        for index, (x, y) in enumerate(points):
+            heatmap.add(x, y, index / rate)
+        addTime = (time.perf_counter() - start) / count
+
+        start = time.perf_counter()
+        heatmap.snapshot()
+        snapshotTime = time.perf_counter() - start
+
+        results.append({
+            "grid": f"{width}x{height}",
+            "add_us": 1e6 * addTime,
+            "snapshot_ms": 1000 * snapshotTime,
+            "budget_at_rate": f"{100 * addTime * rate:.3f}% of one core",
+        })
+
+    return results
+
+
+if __name__ == "__main__":
+    for result in benchmark():
+        print(result)
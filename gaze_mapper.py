@@ -2,10 +2,12 @@ import socket
 import json
 import threading
 from pupil_labs.real_time_screen_gaze import marker_generator
-from pupil_labs.real_time_screen_gaze.gaze_mapper import GazeMapper
 from pupil_labs.realtime_api.simple import discover_one_device
 from PIL import Image, ImageTk
 import tkinter as tk
+from calibration_cache import CalibrationCache
+from frame_preprocessor import FramePreprocessor, PreprocessingGazeMapper
+from gaze_sample import GazeSample
 
 # --- UDP Setup ---
 unity_ip = "127.0.0.1"
@@ -17,6 +19,7 @@ screen_width = 1920
 screen_height = 1080
 N_MARKERS = 4
 MARKER_SIZE = 256
+SCENE_PYRAMID_LEVELS = 0
 
 marker_verts = {
     0: [(0, 0), (MARKER_SIZE, 0), (MARKER_SIZE, MARKER_SIZE), (0, MARKER_SIZE)],  # Top-left
@@ -62,13 +65,14 @@ def main():
         if device is None:
             print("No device found.")
             return
-        calibration = device.get_calibration()
+        calibration_cache = CalibrationCache()
+        calibration = calibration_cache.getCalibration(device)
         print("Calibration:", calibration)
     except Exception as e:
         print("Error discovering device:", e)
         return
 
-    gaze_mapper = GazeMapper(calibration)
+    gaze_mapper = PreprocessingGazeMapper(calibration, FramePreprocessor(SCENE_PYRAMID_LEVELS))
     screen_surface = gaze_mapper.add_surface(marker_verts, screen_size)
     print("Ready to stream gaze data...")
 
@@ -82,53 +86,41 @@ def main():
     marker_thread.start()
 
     # --- Main Loop ---
+    # Filled in place for every sample
+    sample = GazeSample()
+    raw_gaze = {}
+    surface_gaze = []
+    surface_gaze_items = []
+    data = {"raw_gaze": raw_gaze, "surface_gaze": surface_gaze}
+    revalidated = False
     while True:
         frame, gaze = device.receive_matched_scene_video_frame_and_gaze()
+        if not revalidated:
+            # Checked once the device streams, so a cached calibration still saves the round trip before it
+            revalidated = True
+            changed = calibration_cache.revalidateCalibration(device, calibration)
+            if changed is not None:
+                print("Calibration changed on the device, rebuilding the gaze mapper")
+                calibration = changed
+                gaze_mapper = PreprocessingGazeMapper(calibration, FramePreprocessor(SCENE_PYRAMID_LEVELS))
+                screen_surface = gaze_mapper.add_surface(marker_verts, screen_size)
+
         result = gaze_mapper.process_frame(frame, gaze)
 
         # --- Prepare Data ---
-        data = {
-            "raw_gaze": {
-                "x": gaze.x,
-                "y": gaze.y,
-                "worn": gaze.worn,
-                "pupil_diameter_left": gaze.pupil_diameter_left,
-                "eyeball_center_left_x": gaze.eyeball_center_left_x,
-                "eyeball_center_left_y": gaze.eyeball_center_left_y,
-                "eyeball_center_left_z": gaze.eyeball_center_left_z,
-                "optical_axis_left_x": gaze.optical_axis_left_x,
-                "optical_axis_left_y": gaze.optical_axis_left_y,
-                "optical_axis_left_z": gaze.optical_axis_left_z,
-                "pupil_diameter_right": gaze.pupil_diameter_right,
-                "eyeball_center_right_x": gaze.eyeball_center_right_x,
-                "eyeball_center_right_y": gaze.eyeball_center_right_y,
-                "eyeball_center_right_z": gaze.eyeball_center_right_z,
-                "optical_axis_right_x": gaze.optical_axis_right_x,
-                "optical_axis_right_y": gaze.optical_axis_right_y,
-                "optical_axis_right_z": gaze.optical_axis_right_z,
-                "eyelid_angle_top_left": gaze.eyelid_angle_top_left,
-                "eyelid_angle_bottom_left": gaze.eyelid_angle_bottom_left,
-                "eyelid_aperture_left": gaze.eyelid_aperture_left,
-                "eyelid_angle_top_right": gaze.eyelid_angle_top_right,
-                "eyelid_angle_bottom_right": gaze.eyelid_angle_bottom_right,
-                "eyelid_aperture_right": gaze.eyelid_aperture_right,
-                "timestamp_unix_seconds": gaze.timestamp_unix_seconds,
-            },
-            "surface_gaze": []
-        }
+        sample.fillFromGaze(gaze)
+        sample.writeRawGaze(raw_gaze)
+        surface_gaze.clear()
         if len(result.mapped_gaze[screen_surface.uid]) == 0:
             print("No gaze data available")
             continue
 
-        for surface_gaze in result.mapped_gaze[screen_surface.uid]:
-            data["surface_gaze"].append({
-                "timestamp_unix_seconds": surface_gaze.timestamp_unix_seconds,
-                "x": surface_gaze.x,
-                "y": surface_gaze.y,
-                "on_surf": surface_gaze.on_surf,
-                "confidence": surface_gaze.confidence,
-            })
-            print(f"Surface Gaze: {surface_gaze.x}, {surface_gaze.y}, {surface_gaze.on_surf}, {surface_gaze.confidence}")
+        for index, mapped_gaze in enumerate(result.mapped_gaze[screen_surface.uid]):
+            if index == len(surface_gaze_items):
+                surface_gaze_items.append({})
+            sample.fillFromSurfaceGaze(mapped_gaze)
+            surface_gaze.append(sample.writeSurfaceGaze(surface_gaze_items[index]))
+            print(f"Surface Gaze: {sample.surfaceX}, {sample.surfaceY}, {sample.onSurface}, {sample.confidence}")
 
         # --- Send Data via UDP ---
         sock.sendto(json.dumps(data).encode(), (unity_ip, unity_port))
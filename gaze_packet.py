@@ -0,0 +1,74 @@
+import collections
+import struct
+
+# Screen point sent by app.py: x, y (global screen pixels), gaze timestamp (unix seconds)
+GAZE_PACKET = struct.Struct('<ffd')
+# The same followed by the id of the gaze target hit (-1 for none), sent once targets are registered
+GAZE_TARGET_PACKET = struct.Struct('<ffdi')
+# The same followed by the id of the device it came from, sent when one process runs several devices
+DEVICE_GAZE_PACKET = struct.Struct('<ffdiI')
+
+# Event: kind, start and end timestamps (unix seconds), x, y (scene camera pixels for eye movements and blinks,
+# global screen pixels for dwell and click events)
+EVENT_PACKET = struct.Struct('<Bddff')
+DEVICE_EVENT_PACKET = struct.Struct('<BddffI')
+EVENT_KINDS = ('fixation', 'saccade', 'dwell_start', 'dwell_end', 'click', 'blink')
+
+# Dwell and click events sent by the pipeline, packed like eye_movement_detector.EyeMovementEvent
+PointerEvent = collections.namedtuple('PointerEvent', ['kind', 'start', 'end', 'x', 'y'])
+
+
+def packGaze(x, y, timestamp, targetId=None, deviceId=None):
+    if deviceId is not None:
+        return DEVICE_GAZE_PACKET.pack(x, y, timestamp, -1 if targetId is None else targetId, deviceId)
+
+    if targetId is None:
+        return GAZE_PACKET.pack(x, y, timestamp)
+
+    return GAZE_TARGET_PACKET.pack(x, y, timestamp, targetId)
+
+
+def unpackGaze(data):
+    """Returns (x, y, timestamp), or None if data is not a gaze packet."""
+    if len(data) not in (GAZE_PACKET.size, GAZE_TARGET_PACKET.size, DEVICE_GAZE_PACKET.size):
+        return None
+
+    return GAZE_PACKET.unpack_from(data)
+
+
+def unpackGazeTarget(data):
+    """Returns the target id of a gaze packet (-1 for none), or None if it carries none."""
+    if len(data) not in (GAZE_TARGET_PACKET.size, DEVICE_GAZE_PACKET.size):
+        return None
+
+    return GAZE_TARGET_PACKET.unpack_from(data)[3]
+
+
+def unpackDeviceId(data):
+    """Returns the device id of a gaze or event packet, or None if it carries none."""
+    if len(data) == DEVICE_GAZE_PACKET.size:
+        return DEVICE_GAZE_PACKET.unpack_from(data)[4]
+    elif len(data) == DEVICE_EVENT_PACKET.size:
+        return DEVICE_EVENT_PACKET.unpack_from(data)[5]
+
+    return None
+
+
+def packEvent(event, deviceId=None):
+    kind = EVENT_KINDS.index(event.kind) + 1
+    if deviceId is not None:
+        return DEVICE_EVENT_PACKET.pack(kind, event.start, event.end, event.x, event.y, deviceId)
+
+    return EVENT_PACKET.pack(kind, event.start, event.end, event.x, event.y)
+
+
+def unpackEvent(data):
+    """Returns (kind, start, end, x, y), or None if data is not an event packet."""
+    if len(data) not in (EVENT_PACKET.size, DEVICE_EVENT_PACKET.size):
+        return None
+
+    kind, start, end, x, y = EVENT_PACKET.unpack_from(data)
+    if not 1 <= kind <= len(EVENT_KINDS):
+        return None
+
+    return EVENT_KINDS[kind - 1], start, end, x, y
@@ -0,0 +1,464 @@
+import argparse
+import collections
+import socket
+
+from dwell_detector import DWELL_COOLDOWN, DWELL_EXIT_SCALE, DwellClicker, DwellNoiseEstimator
+from eye_movement_detector import createDetector
+from gaze_heatmap import GazeHeatmap
+from gaze_quality import NOT_WORN, VALID, QualityGate, markerConfidence
+from gaze_packet import PointerEvent, packEvent, packGaze
+from gaze_sample import GazeSample
+from handoff import SnapshotStore
+from marker_layout import loadLayout, loadProfile
+from reliable_link import SequencedSender
+from surface_transform import SurfaceTransform
+from target_index import NO_TARGET, TargetRegistry
+
+DEFAULT_SURFACE_SIZE = (1920, 1080)
+
+# Settings that may change while samples are processed, swapped as a whole, see handoff.SnapshotStore
+PipelineConfig = collections.namedtuple('PipelineConfig', [
+    'smoothing', 'dwellDuration', 'dwellRadius', 'adaptiveDwell', 'surfaceSize', 'margin', 'origin', 'markerVerts', 'endpoint'
+])
+
+
+class PipelineObserver():
+    """Receives the results of a GazePipeline.
+
+    All methods are no-ops, so observers (TagWindow, the cursor, loggers)
+    only override what they use. They are called on the thread that feeds
+    the pipeline.
+    """
+    def frequencyChanged(self, frequency):
+        pass
+
+    def markersDetected(self, markerIds):
+        pass
+
+    def effectiveDwellChanged(self, radius, duration, noise):
+        pass
+
+    def qualityChanged(self, quality):
+        pass
+
+    def sampleProcessed(self, sample):
+        pass
+
+    def dwellClicked(self, x, y, sample):
+        """x and y are global screen pixels, at the dwell center or the center of the target it hit."""
+        pass
+
+
+class GazePipeline():
+    """Per-sample processing from a matched scene frame and gaze to a screen point.
+
+    Samples are first classified by a QualityGate: during blinks and while
+    the device is not worn, nothing is detected, mapped or sent, and a dwell
+    in progress ends. Blinks are sent as events.
+
+    Marker mapping, smoothing, dwell, clamping, target hit testing and output
+    (UDP, shared memory ring) run here without Qt. The surface geometry is
+    given explicitly: its size in pixels, the margin between the surface edge
+    and the gaze area, and the origin of the surface on the screen. All
+    conversions between normalized, window and screen coordinates go through
+    one SurfaceTransform, rebuilt only when that geometry changes.
+
+    Event packets (eye movements, blinks, dwells and clicks, see
+    gaze_packet.py) are only sent with eventOutput or sequenced output, so
+    a receiver that only knows gaze packets never gets one.
+
+    With sequenced output, packets carry sequence numbers (see
+    reliable_link.py): gaze stays fire-and-forget, while eye movement, dwell
+    and click events are retransmitted until the receiver acknowledges them.
+
+    The setters may be called from any thread. They replace an immutable
+    PipelineConfig, which process() picks up before the next sample, so a
+    sample never sees half of a change and the hot path takes no lock.
+    """
+    def __init__(self, endpoint, surfaceSize=DEFAULT_SURFACE_SIZE, smoothing=0.3, dwellDuration=.75, dwellRadius=75,
+                 adaptiveDwellBounds=(10, 150), dwellExitScale=DWELL_EXIT_SCALE, dwellCooldown=DWELL_COOLDOWN,
+                 eyeMovementDetector='idt', targets=None, heatmap=None, gazeRing=None,
+                 qualityGate=None, deviceId=None, eventOutput=False, sequenced=False, verbose=True):
+        self.deviceId = deviceId # Added to every packet when several devices share the endpoint
+        # A receiver of sequenced output knows the framing, and with it the event packets
+        self.eventOutput = eventOutput or sequenced
+        self.verbose = verbose
+        self.config = SnapshotStore(PipelineConfig(
+            smoothing, dwellDuration, dwellRadius, False, tuple(surfaceSize), 0, (0, 0), None, tuple(endpoint)
+        ))
+        self.appliedConfig = None
+
+        self.dwellDetector = DwellClicker(dwellDuration, dwellRadius, dwellExitScale, cooldown=dwellCooldown)
+        self.dwellNoiseEstimator = DwellNoiseEstimator(dwellRadius, *adaptiveDwellBounds)
+        self.adaptiveDwell = False
+        self.eyeMovementDetector = createDetector(eyeMovementDetector)
+        self.qualityGate = qualityGate if qualityGate is not None else QualityGate()
+        self.targets = targets if targets is not None else TargetRegistry()
+        self.heatmap = heatmap if heatmap is not None else GazeHeatmap(192, 108)
+        self.gazeRing = gazeRing
+
+        self.udpSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.link = None
+        if sequenced:
+            # Acks come back on the same socket and are read between samples
+            self.udpSocket.setblocking(False)
+            self.link = SequencedSender(self.sendPacket)
+        self.dwellStart = None
+        self.observers = []
+
+        self.gazeMapper = None
+        self.surface = None
+        self.surfaceKey = None # (gazeMapper, surfaceSize, markerVerts) the surface was built from
+        self.applyConfig()
+
+        self.sample = GazeSample()
+        self.gazeFrequency = 0
+
+    def addObserver(self, observer):
+        self.observers.append(observer)
+
+    def removeObserver(self, observer):
+        self.observers.remove(observer)
+
+    def updateConfig(self, **changes):
+        """Changes several PipelineConfig fields at once; the next sample sees all of them or none."""
+        return self.config.update(**changes)
+
+    def applyConfig(self):
+        """Adopts the latest config snapshot. Runs on the processing thread, between samples."""
+        config = self.config.current()
+        previous = self.appliedConfig
+        if config is previous:
+            return
+
+        self.appliedConfig = config
+        self.smoothing = config.smoothing
+        self.surfaceSize = config.surfaceSize
+        if previous is None or (config.surfaceSize, config.margin, config.origin) != (
+                previous.surfaceSize, previous.margin, previous.origin):
+            self.transform = SurfaceTransform(*config.surfaceSize, config.margin, *config.origin)
+        self.markerVerts = config.markerVerts
+        self.endpoint = config.endpoint
+
+        if previous is None or config.dwellDuration != previous.dwellDuration:
+            self.dwellDetector.setDuration(config.dwellDuration)
+
+        if previous is None or (config.dwellRadius, config.adaptiveDwell) != (previous.dwellRadius, previous.adaptiveDwell):
+            self.dwellNoiseEstimator.setInitialRadius(config.dwellRadius)
+            self.adaptiveDwell = config.adaptiveDwell
+            if not config.adaptiveDwell:
+                self.dwellDetector.setRange(config.dwellRadius)
+
+        self.updateSurface()
+
+    def setSurfaceGeometry(self, width, height, margin=0, originX=0, originY=0, markerVerts=None):
+        changes = {"surfaceSize": (width, height), "margin": margin, "origin": (originX, originY)}
+        if markerVerts is not None:
+            changes["markerVerts"] = markerVerts
+        self.updateConfig(**changes)
+
+    def setMarkers(self, markerVerts):
+        """Marker vertices in surface pixels, {marker id: [top-left, top-right, bottom-right, bottom-left]}."""
+        self.updateConfig(markerVerts=markerVerts)
+
+    def setEndpoint(self, host, port):
+        self.updateConfig(endpoint=(host, port))
+
+    def setGazeMapper(self, gazeMapper):
+        """Called on the processing thread."""
+        self.gazeMapper = gazeMapper
+        # A reused mapper may have had its surfaces cleared, so always rebuild
+        self.surfaceKey = None
+        self.appliedConfig = None
+        self.applyConfig()
+
+    def updateSurface(self):
+        """Rebuilds the mapper's surface, unless the markers and surface size are unchanged (e.g. the window only moved)."""
+        if self.gazeMapper is None or self.markerVerts is None:
+            return
+
+        surfaceKey = (self.gazeMapper, self.surfaceSize, self.markerVerts)
+        if self.surfaceKey is not None and self.surfaceKey[0] is surfaceKey[0] and self.surfaceKey[1:] == surfaceKey[1:]:
+            return
+
+        self.gazeMapper.clear_surfaces()
+        self.surface = self.gazeMapper.add_surface(self.markerVerts, self.surfaceSize)
+        self.surfaceKey = surfaceKey
+
+    def reset(self):
+        """Clears the smoothing, dwell and eye movement state, e.g. after a reconnect. The noise estimate is kept."""
+        self.sample.clear()
+        self.dwellDetector.reset()
+        self.eyeMovementDetector.reset()
+        self.qualityGate.reset()
+        self.dwellStart = None
+        self.gazeFrequency = 0
+
+    def setSmoothing(self, value):
+        self.updateConfig(smoothing=value)
+
+    def setDwellDuration(self, duration):
+        self.updateConfig(dwellDuration=duration)
+
+    def setDwellRadius(self, radius):
+        self.updateConfig(dwellRadius=radius)
+
+    def setAdaptiveDwell(self, enabled):
+        self.updateConfig(adaptiveDwell=enabled)
+
+    def sendPacket(self, packet):
+        try:
+            self.udpSocket.sendto(packet, self.endpoint)
+        except Exception as e:
+            print(f"Error sending UDP data: {e}")
+
+    def send(self, packet):
+        """Sends a gaze packet, never retransmitted."""
+        if self.link is not None:
+            self.link.sendGaze(packet)
+        else:
+            self.sendPacket(packet)
+
+    def sendEvent(self, event):
+        """Sends an eye movement or pointer event, if events are output; reliably when the output is sequenced."""
+        if not self.eventOutput:
+            return
+
+        packet = packEvent(event, self.deviceId)
+        if self.link is not None:
+            self.link.sendEvent(packet)
+        else:
+            self.sendPacket(packet)
+
+    def serviceLink(self):
+        """Reads acks and retransmits overdue events. Cheap when nothing is pending; call it even without samples."""
+        if self.link is None:
+            return
+
+        while True:
+            try:
+                data = self.udpSocket.recv(64)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:
+                # ICMP port unreachable reported on Windows while the receiver is not running
+                continue
+            except OSError:
+                break
+            self.link.handleAck(data)
+
+        self.link.service()
+
+    def process(self, frame, gaze):
+        """Runs one matched scene frame and gaze sample through the pipeline. Returns the sample."""
+        self.applyConfig()
+        self.serviceLink()
+
+        sample = self.sample
+        previousTimestamp = sample.timestamp
+        sample.fillFromGaze(gaze)
+
+        if previousTimestamp is not None:
+            time_difference = sample.timestamp - previousTimestamp
+            if time_difference > 1e-6:  # Ensure a positive and non-trivial time difference (e.g., > 1 microsecond)
+                self.gazeFrequency = 1.0 / time_difference
+                for observer in self.observers:
+                    observer.frequencyChanged(self.gazeFrequency)
+
+        previousQuality = self.qualityGate.quality
+        event = self.qualityGate.addSample(sample)
+        if event is not None:
+            self.sendEvent(event)
+
+        if sample.quality != previousQuality:
+            for observer in self.observers:
+                observer.qualityChanged(sample.quality)
+
+        if sample.quality != VALID:
+            if previousQuality == VALID:
+                self.interruptGaze(sample)
+            # Marker detection and mapping are skipped too, which is most of the CPU time per frame
+            return sample
+
+        # Classified on raw scene camera gaze, independent of the surface and smoothing
+        event = self.eyeMovementDetector.addPoint(sample.x, sample.y, sample.timestamp)
+        if event is not None:
+            self.sendEvent(event)
+
+        result = self.gazeMapper.process_frame(frame, gaze)
+
+        markerIds = [int(marker.uid.split(':')[-1]) for marker in result.markers]
+        for observer in self.observers:
+            observer.markersDetected(markerIds)
+
+        if self.surface is None or self.surface.uid not in result.mapped_gaze:
+            return sample
+
+        mappedGaze = result.mapped_gaze[self.surface.uid]
+        confidence = markerConfidence(markerIds, self.markerVerts)
+        for surface_gaze in mappedGaze:
+            sample.fillFromSurfaceGaze(surface_gaze, confidence)
+            self.processSurfaceGaze(sample)
+
+        if len(mappedGaze) == 0 and self.verbose:
+            print("No gaze data")
+
+        return sample
+
+    def interruptGaze(self, sample):
+        """The eyes closed or the device was taken off: no dwell or fixation continues across the gap."""
+        if self.dwellStart is not None:
+            self.sendEvent(PointerEvent(
+                'dwell_end', self.dwellStart, sample.timestamp, *self.transform.windowToScreen(sample.windowX, sample.windowY)
+            ))
+            self.dwellStart = None
+        self.dwellDetector.reset()
+        self.eyeMovementDetector.reset()
+
+        if sample.quality == NOT_WORN:
+            # Smoothing starts over when the device is put back on
+            sample.normX = sample.normY = None
+
+    def processSurfaceGaze(self, sample):
+        if not self.qualityGate.isConfident(sample):
+            return
+
+        self.heatmap.add(sample.surfaceX, sample.surfaceY, sample.timestamp)
+
+        # normX/normY still hold the previous sample's final position
+        if sample.normX is None:
+            sample.smoothedX = sample.surfaceX
+            sample.smoothedY = sample.surfaceY
+        else:
+            sample.smoothedX = sample.normX * self.smoothing + sample.surfaceX * (1.0 - self.smoothing)
+            sample.smoothedY = sample.normY * self.smoothing + sample.surfaceY * (1.0 - self.smoothing)
+
+        transform = self.transform
+        sample.screenX, sample.screenY = transform.toWindow(sample.smoothedX, sample.smoothedY)
+
+        self.dwellNoiseEstimator.addSample(sample)
+        if self.adaptiveDwell:
+            self.dwellDetector.setRange(self.dwellNoiseEstimator.radius)
+            for observer in self.observers:
+                observer.effectiveDwellChanged(
+                    self.dwellDetector.range, self.dwellDetector.minimumDelay, self.dwellNoiseEstimator.noise
+                )
+
+        self.dwellDetector.addSample(sample)
+
+        if sample.dwell and sample.dwellX is not None:
+            sample.windowX, sample.windowY = sample.dwellX, sample.dwellY
+            final_norm_x, final_norm_y = transform.fromWindow(sample.dwellX, sample.dwellY)
+        else:
+            sample.windowX, sample.windowY = sample.screenX, sample.screenY
+            final_norm_x, final_norm_y = sample.smoothedX, sample.smoothedY
+
+        sample.normX = max(0.0, min(1.0, final_norm_x))
+        sample.normY = max(0.0, min(1.0, final_norm_y))
+
+        sample.targetId = self.targets.hitTest(sample.windowX, sample.windowY) if self.targets else NO_TARGET
+
+        sample.pointX, sample.pointY = (int(value) for value in transform.toScreen(sample.normX, sample.normY))
+        self.send(packGaze(
+            sample.pointX, sample.pointY, sample.timestamp, sample.targetId if self.targets else None, self.deviceId
+        ))
+        if self.verbose:
+            print(f"Sent UDP data: {sample.pointX},{sample.pointY},  {sample.timestamp}")
+
+        if self.gazeRing is not None:
+            self.gazeRing.write(sample.pointX, sample.pointY, sample.timestamp)
+
+        for observer in self.observers:
+            observer.sampleProcessed(sample)
+
+        if sample.dwellChanged and not sample.dwell and self.dwellStart is not None:
+            # Ended when the gaze left, not when the exit delay confirmed it
+            self.sendEvent(PointerEvent(
+                'dwell_end', self.dwellStart, self.dwellDetector.releaseTime,
+                *self.transform.windowToScreen(sample.windowX, sample.windowY)
+            ))
+            self.dwellStart = None
+
+        if sample.dwellChanged and sample.dwell:
+            # Started with the first sample the dwell is made of, a whole duration or more before the click
+            self.dwellStart = self.dwellDetector.dwellStart
+            self.sendEvent(PointerEvent(
+                'dwell_start', self.dwellStart, sample.timestamp, *self.transform.windowToScreen(sample.dwellX, sample.dwellY)
+            ))
+
+            clickX, clickY = sample.dwellX, sample.dwellY
+            dwellTarget = self.targets.hitTest(clickX, clickY) if self.targets else NO_TARGET
+            if dwellTarget != NO_TARGET:
+                clickX, clickY = self.targets.center(dwellTarget)
+            clickX, clickY = self.transform.windowToScreen(clickX, clickY)
+            self.sendEvent(PointerEvent('click', sample.timestamp, sample.timestamp, clickX, clickY))
+            for observer in self.observers:
+                observer.dwellClicked(clickX, clickY, sample)
+
+    def close(self):
+        if self.link is not None and self.verbose:
+            print(f"Sequenced output: {self.link.getStats()}")
+        if self.verbose:
+            print(f"Sample quality: {self.qualityGate.getStats()}")
+        self.udpSocket.close()
+        if self.gazeRing is not None:
+            self.gazeRing.close()
+
+
+def main():
+    """Runs one pipeline on the first device found, without a display, e.g. for physical markers."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--markers', help='JSON marker file, see marker_layout.loadLayout')
+    parser.add_argument('--layout', default='physical', help='Marker layout profile, used without --markers (default: physical)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5005)
+    parser.add_argument('--pyramid-levels', type=int, default=0)
+    parser.add_argument('--events', action='store_true', help='Also send eye movement, blink, dwell and click events')
+    parser.add_argument('--sequenced', action='store_true', help='Sequence numbers, events acknowledged and retransmitted')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    layout = loadLayout(args.markers) if args.markers is not None else loadProfile(args.layout)
+    markerVerts, surfaceSize = layout.markers, layout.surfaceSize
+
+    from pupil_labs.realtime_api.simple import discover_one_device
+    from calibration_cache import CalibrationCache
+    from frame_preprocessor import FramePreprocessor, PreprocessingGazeMapper
+
+    device = discover_one_device()
+    if device is None:
+        print("No device found")
+        return
+
+    pipeline = GazePipeline((args.host, args.port), surfaceSize, eventOutput=args.events, sequenced=args.sequenced,
+                            verbose=args.verbose)
+    pipeline.setMarkers(markerVerts)
+    calibrationCache = CalibrationCache()
+    calibration = calibrationCache.getCalibration(device)
+    pipeline.setGazeMapper(PreprocessingGazeMapper(calibration, FramePreprocessor(args.pyramid_levels)))
+    print(f"Streaming from {device} to {args.host}:{args.port}")
+
+    revalidated = False
+    try:
+        while True:
+            frameAndGaze = device.receive_matched_scene_video_frame_and_gaze(timeout_seconds=1)
+            if frameAndGaze is not None and not revalidated:
+                # Checked once the device streams, so a cached calibration still saves the round trip before it
+                revalidated = True
+                changed = calibrationCache.revalidateCalibration(device, calibration)
+                if changed is not None:
+                    print("Calibration changed on the device, replacing the gaze mapper")
+                    pipeline.setGazeMapper(PreprocessingGazeMapper(changed, FramePreprocessor(args.pyramid_levels)))
+            if frameAndGaze is not None:
+                pipeline.process(*frameAndGaze)
+            else:
+                pipeline.serviceLink()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        device.close()
+        pipeline.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+import math
+import time
+
+from eye_movement_detector import EyeMovementEvent
+
+VALID = 'valid'
+BLINK = 'blink'
+NOT_WORN = 'not_worn'
+LOW_CONFIDENCE = 'low_confidence'
+
+# Neon eyelid aperture is ~8-12 mm with the eye open; below this on both eyes it is closed
+BLINK_APERTURE_MM = 2.0
+MIN_BLINK_SECONDS = 0.05 # Shorter closures are still gated, but reported as no blink event
+MAX_BLINK_SECONDS = 2.0 # Longer closures are reported as such, but are not blinks
+MIN_SURFACE_CONFIDENCE = 0.5
+
+
+class QualityGate():
+    """Classifies each gaze sample as valid, blink or not worn, before any mapping.
+
+    Not worn comes from the device's worn flag. A blink is both eyelid
+    apertures below blinkAperture (one closed eye is a wink, and the other
+    eye still gives gaze); samples without eye state are never blinks. Only
+    valid samples go on to marker detection, mapping, dwell and output. When
+    a blink ends, addSample() returns it as an EyeMovementEvent of kind
+    'blink' at the last valid gaze position. Surface confidence is only
+    known after mapping, so isConfident() gates that separately; see
+    markerConfidence().
+    """
+    def __init__(self, blinkAperture=BLINK_APERTURE_MM, minConfidence=MIN_SURFACE_CONFIDENCE,
+                 minBlinkDuration=MIN_BLINK_SECONDS, maxBlinkDuration=MAX_BLINK_SECONDS):
+        self.blinkAperture = blinkAperture
+        self.minConfidence = minConfidence
+        self.minBlinkDuration = minBlinkDuration
+        self.maxBlinkDuration = maxBlinkDuration
+        self.counts = {VALID: 0, BLINK: 0, NOT_WORN: 0, LOW_CONFIDENCE: 0}
+        self.blinks = 0
+        self.reset()
+
+    def reset(self):
+        self.quality = None
+        self.blinkStart = None
+        self.lastValid = None # (timestamp, x, y)
+
+    def isClosed(self, aperture):
+        # NaN and missing apertures count as open, so incomplete eye state never gates
+        return aperture is not None and aperture < self.blinkAperture
+
+    def classify(self, sample):
+        if sample.worn is False:
+            return NOT_WORN
+        if self.isClosed(sample.eyelid_aperture_left) and self.isClosed(sample.eyelid_aperture_right):
+            return BLINK
+        return VALID
+
+    def addSample(self, sample):
+        """Sets sample.quality. Returns a blink event when a blink has just ended, else None."""
+        quality = self.classify(sample)
+        sample.quality = quality
+        self.counts[quality] += 1
+
+        event = None
+        if quality == BLINK:
+            if self.blinkStart is None:
+                self.blinkStart = sample.timestamp
+        elif quality == NOT_WORN:
+            # Taking the glasses off is not a blink
+            self.blinkStart = None
+        else:
+            if self.blinkStart is not None:
+                event = self.blinkEvent(self.blinkStart, sample.timestamp)
+                self.blinkStart = None
+            self.lastValid = (sample.timestamp, sample.x, sample.y)
+
+        self.quality = quality
+        return event
+
+    def blinkEvent(self, start, end):
+        if not self.minBlinkDuration <= end - start <= self.maxBlinkDuration:
+            return None
+
+        self.blinks += 1
+        x, y = (math.nan, math.nan) if self.lastValid is None else self.lastValid[1:]
+        return EyeMovementEvent(BLINK, start, end, x, y, 0)
+
+    def isConfident(self, sample):
+        """Checks the surface confidence set from the mapper result, if any. Sets sample.quality."""
+        if sample.confidence is not None and sample.confidence < self.minConfidence:
+            sample.quality = LOW_CONFIDENCE
+            self.counts[LOW_CONFIDENCE] += 1
+            return False
+        return True
+
+    def getStats(self):
+        total = sum(self.counts[name] for name in (VALID, BLINK, NOT_WORN))
+        return dict(self.counts, blinks=self.blinks, gated_fraction=1 - self.counts[VALID] / total if total else 0.0)
+
+
+def markerConfidence(markerIds, registeredIds):
+    """Fraction of the surface's registered markers detected in the frame, as the mapped surface confidence.
+
+    The mapper's MarkerMappedGaze has no confidence of its own. A surface
+    located from one marker at the edge of the scene camera maps gaze much
+    less reliably than one located from all of them.
+    """
+    if not registeredIds:
+        return None
+    return len(set(markerIds).intersection(registeredIds)) / len(registeredIds)
+
+
+def simulateSession(seconds=300.0, rate=200.0, seed=0):
+    """Screen-pixel gaze from someone scanning a page: short fixations, blinks, eyes rested shut, glasses taken off.
+
+    Returns a list of GazeSamples, none of which is meant to click: saccades
+    go at least 300 pixels, so consecutive fixations never form a dwell.
+    While the eyes are shut or the glasses are off, the reported gaze
+    settles on one spot, which is what completes spurious dwells.
+    """
+    import numpy as np
+
+    from gaze_sample import GazeSample
+
+    rng = np.random.default_rng(seed)
+    count = int(seconds * rate)
+    state = np.full(count, VALID, dtype=object)
+    index = 0
+    while index < count:
+        event = rng.random()
+        if event < 0.02: # Glasses off for a few seconds
+            length = int(rng.uniform(2, 8) * rate)
+            state[index:index + length] = NOT_WORN
+        elif event < 0.05: # Eyes rested shut
+            length = int(rng.uniform(0.8, 1.5) * rate)
+            state[index:index + length] = BLINK
+        elif event < 0.5: # Blink
+            length = int(rng.uniform(0.1, 0.3) * rate)
+            state[index:index + length] = BLINK
+        else:
+            length = 0
+        index += length + int(rng.uniform(1.0, 4.0) * rate)
+
+    samples = []
+    center = np.array([960.0, 540.0])
+    nextSaccade = 0
+    start = time.time()
+    for index in range(count):
+        sample = GazeSample()
+        sample.timestamp = start + index / rate
+        sample.worn = state[index] != NOT_WORN
+        closed = state[index] == BLINK
+        sample.eyelid_aperture_left = rng.normal(0.5 if closed else 10.0, 0.3)
+        sample.eyelid_aperture_right = rng.normal(0.5 if closed else 10.0, 0.3)
+
+        if state[index] == VALID:
+            if index >= nextSaccade: # ~350 ms fixations, too short to dwell
+                previous = center
+                while np.hypot(*(center - previous)) < 300:
+                    center = rng.uniform((100, 100), (1820, 980))
+                nextSaccade = index + int(rng.uniform(0.2, 0.5) * rate)
+            sample.x, sample.y = center + rng.normal(0, 8, 2)
+        else:
+            # Closed eyes look down; without a wearer the estimate sits at a fixed point
+            sample.x, sample.y = (960.0, 1050.0) + rng.normal(0, 3, 2)
+        samples.append(sample)
+
+    return samples
+
+
+def benchmark(seconds=300.0, dwellDuration=0.75, dwellRadius=75):
+    """Spurious dwell clicks and marker detections on a simulated session, with and without gating."""
+    from dwell_detector import DwellDetector
+
+    samples = simulateSession(seconds)
+    results = {}
+    for gated in (False, True):
+        gate = QualityGate()
+        dwell = DwellDetector(dwellDuration, dwellRadius)
+        clicks = detections = events = 0
+        start = time.perf_counter()
+        for sample in samples:
+            event = gate.addSample(sample)
+            events += event is not None
+            if gated and sample.quality != VALID:
+                # As in GazePipeline: a dwell does not continue across closed eyes
+                dwell.reset()
+                continue
+
+            detections += 1 # Each sample's frame would go through marker detection
+            changed, inDwell, _ = dwell.addPoint(sample.x, sample.y, sample.timestamp)
+            clicks += changed and inDwell
+        elapsed = time.perf_counter() - start
+
+        results['gated' if gated else 'ungated'] = {
+            "clicks": clicks,
+            "marker_detections": detections,
+            "blink_events": events,
+            "us_per_sample": elapsed / len(samples) * 1e6,
+            **({"gate": gate.getStats()} if gated else {}),
+        }
+
+    return results
+
+
+if __name__ == "__main__":
+    results = benchmark()
+    for label, result in results.items():
+        print(f"{label}: {result['clicks']} spurious dwell clicks, {result['marker_detections']} marker detections, "
+              f"{result['us_per_sample']:.1f} us per sample")
+    gate = results['gated']['gate']
+    print(f"Gated {gate['gated_fraction']:.1%} of samples ({gate[BLINK]} blink, {gate[NOT_WORN]} not worn), "
+          f"{results['gated']['blink_events']} blink events")
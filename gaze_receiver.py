@@ -0,0 +1,155 @@
+import collections
+import selectors
+import socket
+
+from gaze_packet import DEVICE_EVENT_PACKET, DEVICE_GAZE_PACKET, EVENT_PACKET, GAZE_PACKET, GAZE_TARGET_PACKET, unpackEvent
+from reliable_link import GAZE_CHANNEL, SequencedReceiver, isFramed
+
+# --- Configuration ---
+UDP_IP = "127.0.0.1"
+UDP_PORT = 5005
+RECEIVE_BUFFER_SIZE = 2048
+EVENT_QUEUE_SIZE = 256 # Events kept for takeEvents(), oldest dropped first
+
+
+class GazeReceiver():
+    """Event-driven UDP receiver for the gaze packets sent by app.py.
+
+    Every wake-up drains all pending datagrams and keeps only the newest point,
+    so the consumer never falls behind the sender. Rendering backends either
+    call poll() or watch fileno() with their own event loop and call drain().
+
+    Plain and sequenced packets (see reliable_link.py) are both accepted,
+    and the events of both are queued for takeEvents(). Sequenced ones give
+    loss and reorder statistics, and their events are acknowledged and
+    queued in order.
+    """
+    def __init__(self, host=UDP_IP, port=UDP_PORT):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.setblocking(False)
+
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ)
+
+        self.buffer = bytearray(RECEIVE_BUFFER_SIZE)
+        self.latest = None
+        self.receivedCount = 0
+        self.supersededCount = 0
+        self.invalidCount = 0
+
+        self.link = SequencedReceiver()
+        self.events = collections.deque(maxlen=EVENT_QUEUE_SIZE)
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def drain(self):
+        """Reads every pending datagram. Returns the newest (x, y, timestamp) or None."""
+        newest = None
+        while True:
+            try:
+                size, address = self.sock.recvfrom_into(self.buffer)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError:
+                # ICMP port unreachable reported on Windows, the socket stays usable
+                continue
+            except OSError as e:
+                # Anything else may persist; retried on the next poll instead of spinning here
+                print(f"Error receiving gaze data: {e}")
+                break
+
+            if isFramed(self.buffer, size):
+                point = self.receiveFramed(memoryview(self.buffer)[:size], address)
+                if point is not None:
+                    if newest is not None:
+                        self.supersededCount += 1
+                    newest = point
+                    self.receivedCount += 1
+                continue
+
+            if size in (EVENT_PACKET.size, DEVICE_EVENT_PACKET.size):
+                # Plain events arrive in send order or not at all, and are queued as they come
+                event = unpackEvent(memoryview(self.buffer)[:size])
+                if event is None:
+                    self.invalidCount += 1
+                else:
+                    self.events.append(event)
+                continue
+
+            if size not in (GAZE_PACKET.size, GAZE_TARGET_PACKET.size, DEVICE_GAZE_PACKET.size):
+                self.invalidCount += 1
+                continue
+
+            if newest is not None:
+                self.supersededCount += 1
+            newest = GAZE_PACKET.unpack_from(self.buffer)
+            self.receivedCount += 1
+
+        if self.link.held:
+            # Stop waiting for an event the sender gave up on
+            self.events.extend(filter(None, map(unpackEvent, self.link.release())))
+
+        if newest is not None:
+            self.latest = newest
+
+        return newest
+
+    def receiveFramed(self, data, address):
+        """Acks and queues events. Returns the gaze point of a gaze packet, or None."""
+        channel, payloads, ack = self.link.receive(data)
+        if ack is not None:
+            try:
+                self.sock.sendto(ack, address)
+            except OSError:
+                pass # The sender retransmits and we ack again
+
+        if channel != GAZE_CHANNEL:
+            self.events.extend(filter(None, map(unpackEvent, payloads)))
+            return None
+
+        return GAZE_PACKET.unpack_from(payloads[0]) if payloads else None
+
+    def takeEvents(self):
+        """Events received since the last call, in order, as (kind, start, end, x, y)."""
+        events = list(self.events)
+        self.events.clear()
+        return events
+
+    def poll(self, timeout=None):
+        """Blocks until data arrives (or timeout) and returns the newest point, or None."""
+        if self.selector.select(timeout):
+            return self.drain()
+
+        return None
+
+    def close(self):
+        self.selector.close()
+        self.sock.close()
+
+
+def main():
+    try:
+        receiver = GazeReceiver()
+    except OSError as e:
+        print(f"Error binding UDP socket: {e}. Is another instance running or port in use?")
+        return
+
+    print(f"Listening for gaze data on UDP {UDP_IP}:{UDP_PORT}")
+    try:
+        while True:
+            point = receiver.poll()
+            if point is not None:
+                print(f"Gaze: {point[0]:.1f}, {point[1]:.1f} @ {point[2]:.3f}")
+            for kind, start, end, x, y in receiver.takeEvents():
+                print(f"Event: {kind} {start:.3f}-{end:.3f} at {x:.1f}, {y:.1f}")
+    except KeyboardInterrupt:
+        print(f"\nReceived {receiver.receivedCount}, superseded {receiver.supersededCount}, invalid {receiver.invalidCount}")
+        print(f"Sequenced: {receiver.link.getStats()}")
+    finally:
+        receiver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import multiprocessing
+import os
+import socket
+import statistics
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from gaze_packet import GAZE_PACKET, packGaze
+
+# --- Configuration ---
+RING_NAME = "pupil_pointer_gaze"
+RING_CAPACITY = 1024
+RING_MAGIC = 0x475A5249 # "GZRI"
+
+HEADER_DTYPE = np.dtype([('magic', '<u8'), ('capacity', '<u8'), ('head', '<u8'), ('pid', '<u8')])
+RECORD_DTYPE = np.dtype([('seq', '<u8'), ('x', '<f8'), ('y', '<f8'), ('timestamp', '<f8')])
+
+
+def processAlive(pid):
+    if os.name == 'nt':
+        # Windows frees a segment with its last handle, so one that still exists is in use
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def removeStaleRing(name):
+    """Unlinks a ring left behind by a writer that is gone. Raises FileExistsError if its writer is alive."""
+    try:
+        existing = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+
+    try:
+        pid = 0
+        if existing.size >= HEADER_DTYPE.itemsize:
+            header = np.ndarray((), dtype=HEADER_DTYPE, buffer=existing.buf)
+            if int(header['magic']) == RING_MAGIC:
+                pid = int(header['pid'])
+            del header
+        if pid == 0 or processAlive(pid):
+            # Attaching registered it for removal when this process exits, which must not happen to a ring in use
+            resource_tracker.unregister(existing._name, 'shared_memory')
+            raise FileExistsError(f"Shared memory '{name}' is in use" + (f" by the gaze ring of process {pid}" if pid else ""))
+    finally:
+        existing.close()
+    existing.unlink()
+
+
+class GazeRingWriter():
+    """Single producer side of the shared memory gaze ring.
+
+    Every slot carries the sequence number of the record it holds. The writer
+    clears it, writes the record, stores the sequence number and only then
+    publishes it in the header, so readers can detect slots that changed while
+    they were copying them without any lock or syscall. The header records
+    the writer's process id: a ring whose writer exited without close() is
+    replaced, while one with a live writer raises FileExistsError.
+    """
+    def __init__(self, name=RING_NAME, capacity=RING_CAPACITY):
+        size = HEADER_DTYPE.itemsize + capacity * RECORD_DTYPE.itemsize
+        removeStaleRing(name)
+
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+        self.records = np.ndarray((capacity,), dtype=RECORD_DTYPE, buffer=self.shm.buf, offset=HEADER_DTYPE.itemsize)
+        self.records[:] = 0
+
+        self.capacity = capacity
+        self.seq = 0
+        self.header['capacity'] = capacity
+        self.header['head'] = 0
+        self.header['pid'] = os.getpid()
+        self.header['magic'] = RING_MAGIC
+
+    def write(self, x, y, timestamp):
+        self.seq += 1
+        record = self.records[self.seq % self.capacity]
+        record['seq'] = 0
+        record['x'] = x
+        record['y'] = y
+        record['timestamp'] = timestamp
+        record['seq'] = self.seq
+        self.header['head'] = self.seq
+
+    def close(self):
+        del self.header, self.records
+        self.shm.close()
+        self.shm.unlink()
+
+
+class GazeRingReader():
+    """Lock-free consumer of a GazeRingWriter, any number may attach."""
+    def __init__(self, name=RING_NAME):
+        self.shm = shared_memory.SharedMemory(name=name)
+        # Readers must not unlink the segment when they exit, only the writer owns it
+        resource_tracker.unregister(self.shm._name, 'shared_memory')
+
+        self.header = np.ndarray((), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+        if int(self.header['magic']) != RING_MAGIC:
+            self.shm.close()
+            raise ValueError(f"Shared memory '{name}' is not a gaze ring")
+
+        self.capacity = int(self.header['capacity'])
+        self.records = np.ndarray((self.capacity,), dtype=RECORD_DTYPE, buffer=self.shm.buf, offset=HEADER_DTYPE.itemsize)
+        self.lastSeq = 0
+        self.overruns = 0
+
+    def readRecord(self, seq):
+        """Returns (seq, x, y, timestamp), or None if the slot no longer holds seq."""
+        record = self.records[seq % self.capacity]
+        if record['seq'] != seq:
+            return None
+
+        x, y, timestamp = float(record['x']), float(record['y']), float(record['timestamp'])
+        if record['seq'] != seq:
+            return None
+
+        return seq, x, y, timestamp
+
+    def latest(self):
+        """Returns the newest record or None. Retries if the writer overtakes the read."""
+        while True:
+            head = int(self.header['head'])
+            if head == 0:
+                return None
+
+            result = self.readRecord(head)
+            if result is not None:
+                self.lastSeq = head
+                return result
+
+    def readNew(self):
+        """Returns every record published since the previous call, oldest first."""
+        head = int(self.header['head'])
+        first = max(self.lastSeq + 1, head - self.capacity + 1)
+        if first > self.lastSeq + 1:
+            self.overruns += first - self.lastSeq - 1
+
+        results = []
+        for seq in range(first, head + 1):
+            result = self.readRecord(seq)
+            if result is None:
+                self.overruns += 1
+                continue
+            results.append(result)
+
+        self.lastSeq = max(self.lastSeq, head)
+        return results
+
+    def close(self):
+        del self.header, self.records
+        self.shm.close()
+
+
+def produceRing(name, samples, interval):
+    writer = GazeRingWriter(name)
+    time.sleep(0.5) # let the consumer attach
+    for i in range(samples):
+        writer.write(i, i, time.perf_counter())
+        time.sleep(interval)
+    time.sleep(0.2)
+    writer.close()
+
+
+def produceUdp(port, samples, interval):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    time.sleep(0.5)
+    for i in range(samples):
+        sock.sendto(packGaze(i, i, time.perf_counter()), ("127.0.0.1", port))
+        time.sleep(interval)
+    sock.close()
+
+
+def benchmark(samples=2000, rate=200.0, port=5099):
+    """One-way producer -> consumer latency (perf_counter is system wide) for the ring and loopback UDP."""
+    interval = 1.0 / rate
+    name = f"{RING_NAME}_bench"
+
+    producer = multiprocessing.Process(target=produceRing, args=(name, samples, interval))
+    producer.start()
+    reader = None
+    while reader is None:
+        try:
+            reader = GazeRingReader(name)
+        except (FileNotFoundError, ValueError):
+            time.sleep(0.01)
+
+    ringLatencies = []
+    while len(ringLatencies) < samples and producer.is_alive():
+        for _, _, _, timestamp in reader.readNew():
+            ringLatencies.append(time.perf_counter() - timestamp)
+    overruns = reader.overruns
+    reader.close()
+    producer.join()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", port))
+    sock.settimeout(2)
+    producer = multiprocessing.Process(target=produceUdp, args=(port, samples, interval))
+    producer.start()
+    udpLatencies = []
+    try:
+        while len(udpLatencies) < samples:
+            data = sock.recv(GAZE_PACKET.size)
+            udpLatencies.append(time.perf_counter() - GAZE_PACKET.unpack(data)[2])
+    except socket.timeout:
+        pass
+    sock.close()
+    producer.join()
+
+    def summary(latencies):
+        latencies = sorted(latencies)
+        if not latencies:
+            # Nothing arrived, e.g. the UDP packets were all dropped
+            return {"samples": 0, "median_us": None, "p99_us": None}
+        return {
+            "samples": len(latencies),
+            "median_us": 1e6 * statistics.median(latencies),
+            "p99_us": 1e6 * latencies[int(0.99 * (len(latencies) - 1))],
+        }
+
+    return {"ring": dict(summary(ringLatencies), overruns=overruns), "udp": summary(udpLatencies)}
+
+
+if __name__ == "__main__":
+    for transport, result in benchmark().items():
+        print(f"{transport}: {result}")
@@ -0,0 +1,158 @@
+import gc
+import time
+import tracemalloc
+
+# Eye state fields of EyestateEyelidGazeData, named as on the device API
+EYE_STATE_FIELDS = (
+    'pupil_diameter_left',
+    'eyeball_center_left_x',
+    'eyeball_center_left_y',
+    'eyeball_center_left_z',
+    'optical_axis_left_x',
+    'optical_axis_left_y',
+    'optical_axis_left_z',
+    'pupil_diameter_right',
+    'eyeball_center_right_x',
+    'eyeball_center_right_y',
+    'eyeball_center_right_z',
+    'optical_axis_right_x',
+    'optical_axis_right_y',
+    'optical_axis_right_z',
+    'eyelid_angle_top_left',
+    'eyelid_angle_bottom_left',
+    'eyelid_aperture_left',
+    'eyelid_angle_top_right',
+    'eyelid_angle_bottom_right',
+    'eyelid_aperture_right',
+)
+
+PIPELINE_FIELDS = (
+    # Surface mapping
+    'surfaceX', 'surfaceY', 'onSurface', 'confidence',
+    # Smoothing, in normalized surface coordinates
+    'smoothedX', 'smoothedY',
+    # Window pixels given to the dwell detector
+    'screenX', 'screenY',
+    # Dwell state, and progress from 0 to 1 towards the next dwell click
+    'dwell', 'dwellChanged', 'dwellX', 'dwellY', 'dwellProgress',
+    # Final position: window pixels, normalized (y up) and global screen point
+    'windowX', 'windowY', 'normX', 'normY', 'pointX', 'pointY',
+    # Gaze target hit by the final position (target_index.NO_TARGET if none)
+    'targetId',
+    # gaze_quality classification: valid, blink, not_worn or low_confidence
+    'quality',
+)
+
+
+class GazeSample():
+    """A gaze sample as it flows through the pipeline.
+
+    One instance is filled in place by the receiver for every sample and
+    passed by reference through mapping, smoothing, dwell and encoding, so no
+    per-sample dicts or lists are allocated. Fields that are not overwritten
+    keep the previous sample's value (e.g. normX/normY for smoothing).
+    """
+    __slots__ = ('timestamp', 'x', 'y', 'worn') + EYE_STATE_FIELDS + PIPELINE_FIELDS
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        for name in self.__slots__:
+            setattr(self, name, None)
+
+    def fillFromGaze(self, gaze):
+        self.timestamp = gaze.timestamp_unix_seconds
+        self.x = gaze.x
+        self.y = gaze.y
+        self.worn = gaze.worn
+        for name in EYE_STATE_FIELDS:
+            setattr(self, name, getattr(gaze, name, None))
+
+    def fillFromSurfaceGaze(self, surfaceGaze, confidence=None):
+        """confidence comes from the mapper result, see gaze_quality.markerConfidence."""
+        self.surfaceX = surfaceGaze.x
+        self.surfaceY = surfaceGaze.y
+        self.onSurface = getattr(surfaceGaze, 'is_on_aoi', None)
+        self.confidence = confidence
+
+    def writeRawGaze(self, target, xKey='x', yKey='y'):
+        """Writes the device fields into target (a dict reused between samples)."""
+        target['timestamp_unix_seconds'] = self.timestamp
+        target[xKey] = self.x
+        target[yKey] = self.y
+        target['worn'] = self.worn
+        for name in EYE_STATE_FIELDS:
+            target[name] = getattr(self, name)
+        return target
+
+    def writeSurfaceGaze(self, target, xKey='x', yKey='y'):
+        target['timestamp_unix_seconds'] = self.timestamp
+        target[xKey] = self.surfaceX
+        target[yKey] = self.surfaceY
+        target['on_surf'] = self.onSurface
+        target['confidence'] = self.confidence
+        return target
+
+
+def benchmark(samples=20000):
+    """Allocations and GC collections per sample: per-sample dicts versus one reused GazeSample."""
+    from pupil_labs.realtime_api.streaming.gaze import EyestateEyelidGazeData
+
+    gaze = EyestateEyelidGazeData(*([0.5] * (len(EyestateEyelidGazeData._fields) - 1)), time.time())
+
+    def dicts():
+        payload = {
+            "raw_gaze_data": {name: getattr(gaze, name) for name in ('timestamp_unix_seconds', 'x', 'y', 'worn') + EYE_STATE_FIELDS},
+            "surface_gaze_data": [{
+                "timestamp_unix_seconds": gaze.timestamp_unix_seconds, "x": gaze.x, "y": gaze.y,
+                "on_surf": True, "confidence": 1.0,
+            }],
+        }
+        position = [gaze.x, gaze.y]
+        return payload, position
+
+    sample = GazeSample()
+    rawGaze = {}
+    surfaceGaze = {}
+    payload = {"raw_gaze_data": rawGaze, "surface_gaze_data": [surfaceGaze]}
+
+    def slots():
+        sample.fillFromGaze(gaze)
+        sample.surfaceX, sample.surfaceY, sample.onSurface, sample.confidence = gaze.x, gaze.y, True, 1.0
+        sample.normX, sample.normY = gaze.x, gaze.y
+        sample.writeRawGaze(rawGaze)
+        sample.writeSurfaceGaze(surfaceGaze)
+        return payload
+
+    results = {}
+    for label, step in (("dicts", dicts), ("GazeSample", slots)):
+        step()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        kept = [step() for _ in range(100)] # keep results alive so their blocks are counted
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        blocks = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+        del kept
+
+        gc.collect()
+        collections = sum(stat['collections'] for stat in gc.get_stats())
+        start = time.perf_counter()
+        for _ in range(samples):
+            step()
+        elapsed = time.perf_counter() - start
+        collections = sum(stat['collections'] for stat in gc.get_stats()) - collections
+
+        results[label] = {
+            "blocks_per_sample": blocks / 100,
+            "gc_collections_per_1000_samples": 1000 * collections / samples,
+            "us_per_sample": 1e6 * elapsed / samples,
+        }
+
+    return results
+
+
+if __name__ == "__main__":
+    for label, result in benchmark().items():
+        print(f"{label}: {result}")
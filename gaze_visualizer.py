@@ -1,11 +1,12 @@
+# Win32 overlay backend. On other platforms use qt_gaze_overlay.py.
 import ctypes
 import ctypes.wintypes as wintypes
-import socket
 import time
 
+from gaze_receiver import GazeReceiver, UDP_IP, UDP_PORT
+
 # --- Configuration ---
-UDP_IP = "127.0.0.1"
-UDP_PORT = 5005
+MESSAGE_PUMP_INTERVAL = 0.010 # Longest wait for gaze data before window messages are pumped
 CIRCLE_RADIUS = 30
 CIRCLE_COLOR_RGB = (255, 0, 0)  # Red
 CIRCLE_STROKE_WIDTH = 3
@@ -27,6 +28,8 @@ WM_DESTROY = 0x0002
 WM_QUIT = 0x0012
 PS_SOLID = 0
 NULL_BRUSH = 5 # Stock GDI object
+VREFRESH = 116 # GetDeviceCaps index
+DEFAULT_REFRESH_RATE = 60
 PM_REMOVE = 0x0001
 
 # Window Procedure forward declaration for WNDCLASSEXW field type hint
@@ -65,6 +68,18 @@ running = True
 h_instance_global = None
 class_name_global = "GazeOverlayWindowClass"
 
+# Cached GDI resources and dirty-rectangle state
+hbr_erase = None
+h_pen = None
+h_old_pen = None
+h_old_brush = None
+drawn_rect = wintypes.RECT()
+circle_drawn = False
+frame_interval = 1.0 / DEFAULT_REFRESH_RATE
+pixels_touched_last_frame = 0
+pixels_touched_total = 0
+frames_rendered = 0
+
 def RGB(r,g,b):
     return r | (g << 8) | (b << 16)
 
@@ -142,53 +157,79 @@ def create_overlay_window():
     print("Overlay window created successfully.")
     return True
 
+def create_gdi_resources():
+    global hbr_erase, h_pen, h_old_pen, h_old_brush, frame_interval
+
+    hbr_erase = gdi32.CreateSolidBrush(transparent_colorref)
+    h_pen = gdi32.CreatePen(PS_SOLID, CIRCLE_STROKE_WIDTH, circle_colorref)
+    if not hbr_erase or not h_pen:
+        print(f"Failed to create GDI resources: {kernel32.GetLastError()}")
+        return False
+
+    # The pen and null brush stay selected for the lifetime of the DC
+    h_old_pen = gdi32.SelectObject(hdc, h_pen)
+    h_old_brush = gdi32.SelectObject(hdc, gdi32.GetStockObject(NULL_BRUSH))
+
+    refresh_rate = gdi32.GetDeviceCaps(hdc, VREFRESH)
+    if refresh_rate <= 1: # 0 and 1 mean "hardware default"
+        refresh_rate = DEFAULT_REFRESH_RATE
+    frame_interval = 1.0 / refresh_rate
+    return True
+
+def delete_gdi_resources():
+    global hbr_erase, h_pen
+    if hdc and h_old_pen: gdi32.SelectObject(hdc, h_old_pen)
+    if hdc and h_old_brush: gdi32.SelectObject(hdc, h_old_brush)
+    if h_pen: gdi32.DeleteObject(h_pen)
+    if hbr_erase: gdi32.DeleteObject(hbr_erase)
+    h_pen = None
+    hbr_erase = None
+
 def draw_gaze_circle():
+    global circle_drawn, pixels_touched_last_frame, pixels_touched_total, frames_rendered
     if not hwnd or not hdc: return
 
-    rect_fullscreen = wintypes.RECT(0, 0, screen_width, screen_height) # Full screen rect
-    
-    # Create a brush with the transparent color to fill the background
-    hbr_fill = gdi32.CreateSolidBrush(transparent_colorref)
-    if not hbr_fill: return
-    user32.FillRect(hdc, ctypes.byref(rect_fullscreen), hbr_fill)
-    gdi32.DeleteObject(hbr_fill)
-
-    hPen = gdi32.CreatePen(PS_SOLID, CIRCLE_STROKE_WIDTH, circle_colorref)
-    if not hPen: return
-    hOldPen = gdi32.SelectObject(hdc, hPen)
-    
-    hNullBrush = gdi32.GetStockObject(NULL_BRUSH)
-    hOldBrush = gdi32.SelectObject(hdc, hNullBrush)
+    pixels = 0
+    # Erase only the previous circle instead of the whole screen
+    if circle_drawn:
+        user32.FillRect(hdc, ctypes.byref(drawn_rect), hbr_erase)
+        pixels += (drawn_rect.right - drawn_rect.left) * (drawn_rect.bottom - drawn_rect.top)
 
     left, top = last_gaze_px - CIRCLE_RADIUS, last_gaze_py - CIRCLE_RADIUS
     right, bottom = last_gaze_px + CIRCLE_RADIUS, last_gaze_py + CIRCLE_RADIUS
     gdi32.Ellipse(hdc, left, top, right, bottom)
 
-    gdi32.SelectObject(hdc, hOldPen)
-    gdi32.SelectObject(hdc, hOldBrush)
-    gdi32.DeleteObject(hPen)
+    # The pen is centred on the ellipse outline, so grow the bounds by the stroke width
+    drawn_rect.left, drawn_rect.top = left - CIRCLE_STROKE_WIDTH, top - CIRCLE_STROKE_WIDTH
+    drawn_rect.right, drawn_rect.bottom = right + CIRCLE_STROKE_WIDTH, bottom + CIRCLE_STROKE_WIDTH
+    circle_drawn = True
+    pixels += (drawn_rect.right - drawn_rect.left) * (drawn_rect.bottom - drawn_rect.top)
+
+    pixels_touched_last_frame = pixels
+    pixels_touched_total += pixels
+    frames_rendered += 1
 
 def main_loop():
     global last_gaze_px, last_gaze_py, running, hwnd, hdc, h_instance_global, class_name_global
 
-    # --- UDP Socket Setup ---
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     try:
-        sock.bind((UDP_IP, UDP_PORT))
-        sock.setblocking(False)
+        receiver = GazeReceiver(UDP_IP, UDP_PORT)
         print(f"Listening for gaze data on UDP {UDP_IP}:{UDP_PORT}")
     except OSError as e:
         print(f"Error binding UDP socket: {e}. Is another instance running or port in use?")
         return # Exit if socket can't be bound
 
-    if not create_overlay_window():
+    if not create_overlay_window() or not create_gdi_resources():
         print("Could not create overlay window. Exiting.")
-        sock.close()
+        receiver.close()
         return
 
     print("Overlay active. Press Ctrl+C in the console to quit.")
     msg = wintypes.MSG()
     pMsg = ctypes.byref(msg)
+    needs_redraw = False
+    last_draw_time = 0.0
+    wait_timeout = MESSAGE_PUMP_INTERVAL
 
     try:
         while running:
@@ -200,40 +241,35 @@ def main_loop():
                 user32.DispatchMessageW(pMsg)
             if not running: break
 
-            try:
-                data, addr = sock.recvfrom(1024)
-                # Decode data to string and parse "x,y" format
-                message = data.decode('utf-8')
-                parts = message.split(',')
-                if len(parts) == 2:
-                    px_str, py_str = parts
-                    try:
-                        px = int(float(px_str)) # Convert to float first for robustness, then int
-                        py = int(float(py_str))
-
-                        new_gaze_px = max(0, min(screen_width - 1, px))
-                        new_gaze_py = max(0, min(screen_height - 1, py))
-
-                        if new_gaze_px != last_gaze_px or new_gaze_py != last_gaze_py:
-                            last_gaze_px, last_gaze_py = new_gaze_px, new_gaze_py
-                            draw_gaze_circle()
-                    except ValueError:
-                        print(f"Could not parse coordinates: {message}")
-                # else: # Optional: handle malformed messages
-                    # print(f"Received malformed message: {message}")
-
-            except BlockingIOError: pass
-            except socket.error: pass # Other socket errors
-            except UnicodeDecodeError:
-                print("Error decoding UDP message.")
-            
-            time.sleep(0.005) # Small delay to yield CPU
+            # Wakes as soon as data arrives, keeping only the newest of all pending points
+            gaze = receiver.poll(wait_timeout)
+            if gaze is not None:
+                new_gaze_px = max(0, min(screen_width - 1, int(gaze[0])))
+                new_gaze_py = max(0, min(screen_height - 1, int(gaze[1])))
+
+                if new_gaze_px != last_gaze_px or new_gaze_py != last_gaze_py:
+                    last_gaze_px, last_gaze_py = new_gaze_px, new_gaze_py
+                    needs_redraw = True
+
+            # Draw at most once per display refresh
+            wait_timeout = MESSAGE_PUMP_INTERVAL
+            if needs_redraw:
+                until_next_frame = last_draw_time + frame_interval - time.perf_counter()
+                if until_next_frame <= 0:
+                    draw_gaze_circle()
+                    last_draw_time = time.perf_counter()
+                    needs_redraw = False
+                else:
+                    wait_timeout = min(wait_timeout, until_next_frame)
 
     except KeyboardInterrupt:
         print("\nCtrl+C detected. Exiting.")
         running = False
     finally:
         print("Cleaning up...")
+        if frames_rendered:
+            print(f"Rendered {frames_rendered} frames, {pixels_touched_total / frames_rendered:.0f} pixels per frame")
+        delete_gdi_resources()
         if hdc and hwnd and user32.IsWindow(hwnd): user32.ReleaseDC(hwnd, hdc)
         if hwnd and user32.IsWindow(hwnd): user32.DestroyWindow(hwnd) # Triggers WM_DESTROY -> PostQuitMessage
         
@@ -255,7 +291,7 @@ def main_loop():
             else:
                 print("Window class unregistered.")
         
-        sock.close()
+        receiver.close()
         print("Cleanup complete.")
 
 if __name__ == "__main__":
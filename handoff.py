@@ -0,0 +1,176 @@
+import collections
+import sys
+import threading
+import time
+
+
+class SpscQueue():
+    """Bounded single-producer, single-consumer FIFO without locks.
+
+    head is only written by the consumer and tail only by the producer. The
+    producer stores the item before advancing tail, and the consumer reads it
+    before advancing head, so neither sees a slot the other is still using.
+    put() drops the item and returns False when the queue is full.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.slots = [None] * capacity
+        self.head = 0
+        self.tail = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def put(self, item):
+        tail = self.tail
+        if tail - self.head >= self.capacity:
+            self.dropped += 1
+            return False
+
+        self.slots[tail % self.capacity] = item
+        self.tail = tail + 1
+        return True
+
+    def get(self):
+        """The oldest item, or None if the queue is empty."""
+        head = self.head
+        if head == self.tail:
+            return None
+
+        index = head % self.capacity
+        item = self.slots[index]
+        self.slots[index] = None
+        self.head = head + 1
+        return item
+
+
+class SnapshotStore():
+    """Holds an immutable snapshot (a namedtuple) that writers replace as a whole.
+
+    Readers call current() once per unit of work and use that snapshot
+    throughout, so they never mix fields from two updates. Writers are
+    serialized by a lock that readers never take.
+    """
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.writeLock = threading.Lock()
+
+    def current(self):
+        return self.snapshot
+
+    def update(self, **changes):
+        """Swaps in a copy of the current snapshot with changes applied. Returns it."""
+        with self.writeLock:
+            self.snapshot = self.snapshot._replace(**changes)
+            return self.snapshot
+
+
+Geometry = collections.namedtuple('Geometry', ['width', 'height', 'margin', 'originX'])
+
+
+class UnsynchronizedGeometry():
+    """Mutable fields set one at a time, as the pipeline settings were before snapshots."""
+    def __init__(self):
+        self.width = self.height = self.margin = self.originX = 0
+
+    def update(self, value):
+        # One setter call per field, like setSurfaceGeometry() followed by setMarkers()
+        for field in Geometry._fields:
+            setattr(self, field, value)
+
+
+def isTorn(geometry):
+    return not (geometry.width == geometry.height == geometry.margin == geometry.originX)
+
+
+def stressTest(seconds=2.0, switchInterval=1e-6):
+    """Hammers each primitive from a producer and a consumer thread and counts inconsistent reads.
+
+    The writer always sets every field to the same number, so any read where
+    they differ is torn. The unsynchronized baseline shows the test does catch
+    torn reads. The switch interval is lowered so the threads interleave often.
+    """
+    store = SnapshotStore(Geometry(0, 0, 0, 0))
+    unsynchronized = UnsynchronizedGeometry()
+    queue = SpscQueue(64)
+    stopped = threading.Event()
+    counts = collections.Counter()
+
+    def produce():
+        value = 0
+        while not stopped.is_set():
+            value += 1
+            store.update(width=value, height=value, margin=value, originX=value)
+            unsynchronized.update(value)
+            queue.put(value)
+        counts['writes'] = value
+
+    def consume():
+        lastQueued = 0
+        while not stopped.is_set():
+            counts['reads'] += 1
+            counts['torn_snapshot'] += isTorn(store.current())
+            counts['torn_unsynchronized'] += isTorn(unsynchronized)
+
+            value = queue.get()
+            while value is not None:
+                # Values are consecutive except where the full queue dropped some
+                counts['queue_out_of_order'] += value <= lastQueued
+                lastQueued = value
+                counts['queued'] += 1
+                value = queue.get()
+
+    previousInterval = sys.getswitchinterval()
+    sys.setswitchinterval(switchInterval)
+    threads = [threading.Thread(target=produce), threading.Thread(target=consume)]
+    try:
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+    finally:
+        stopped.set()
+        for thread in threads:
+            thread.join()
+        sys.setswitchinterval(previousInterval)
+
+    queueLost = counts['writes'] - counts['queued'] - len(queue) - queue.dropped
+    return {
+        "writes": counts['writes'],
+        "reads": counts['reads'],
+        "torn_snapshot": counts['torn_snapshot'],
+        "queue_out_of_order": counts['queue_out_of_order'],
+        "queue_lost": queueLost,
+        "queue_dropped": queue.dropped,
+        "torn_unsynchronized": counts['torn_unsynchronized'],
+    }
+
+
+def benchmark(repeats=1000000):
+    """Nanoseconds per uncontended operation."""
+    store = SnapshotStore(Geometry(0, 0, 0, 0))
+    queue = SpscQueue(1024)
+
+    def timed(operation):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            operation()
+        return (time.perf_counter() - start) / repeats * 1e9
+
+    return {
+        "snapshot_read_ns": timed(store.current),
+        "queue_put_get_ns": timed(lambda: (queue.put(1), queue.get())),
+    }
+
+
+if __name__ == "__main__":
+    for name, value in benchmark().items():
+        print(f"{name}: {value:.0f}")
+
+    result = stressTest()
+    print(result)
+    failures = ('torn_snapshot', 'queue_out_of_order', 'queue_lost')
+    if any(result[name] for name in failures):
+        print("FAILED: inconsistent reads")
+        sys.exit(1)
+    print("No torn reads")
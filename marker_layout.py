@@ -0,0 +1,241 @@
+import argparse
+import functools
+import json
+import os
+import time
+
+LAYOUT_PROFILE_DIR = os.path.join(os.path.expanduser('~'), '.config', 'pupil_pointer', 'layouts')
+
+# Marker anchors on the surface, in marker id order
+CORNERS = ('top-left', 'top-right', 'bottom-right', 'bottom-left')
+EDGE_MIDPOINTS = ('top', 'right', 'bottom', 'left')
+# data_sender.py numbers the bottom corners the other way round
+INSET_CORNERS = ('top-left', 'top-right', 'bottom-left', 'bottom-right')
+
+# --- Physical tags around a 1920x1080 screen (previously in backup_ui.py) ---
+PHYSICAL_SCREEN_WIDTH = 1920
+PHYSICAL_SCREEN_HEIGHT = 1080
+
+# Dimensions des AprilTags physiques
+TAG_PATTERN_SIZE = 114  # Taille du motif AprilTag lui-même (sans bordure papier)
+PAPER_TAG_SIZE = 168    # Taille totale du tag avec sa bordure papier
+PAPER_TO_PATTERN_OFFSET = (PAPER_TAG_SIZE - TAG_PATTERN_SIZE) / 2 # 27 pixels
+
+# Marge verticale pour le positionnement des tags (à ajuster selon votre installation)
+# C'est la distance entre le bord supérieur/inférieur de l'écran et le bord supérieur/inférieur du MOTIF AprilTag.
+VERTICAL_MARGIN_TOP = 0
+VERTICAL_MARGIN_BOTTOM = 0 # Peut être différent de VERTICAL_MARGIN_TOP si besoin
+
+
+class MarkerLayout():
+    """Marker positions on one surface.
+
+    markers maps marker id to its four vertices (top-left, top-right,
+    bottom-right, bottom-left) in surface pixels, as GazeMapper.add_surface
+    expects. For layouts drawn on screen, rects maps marker id to the padded
+    square (left, top, size) that the marker image is drawn into.
+    """
+    def __init__(self, name, surfaceSize, markers, rects=None):
+        self.name = name
+        self.surfaceSize = tuple(surfaceSize)
+        self.markers = markers
+        self.rects = rects or {}
+
+    def __len__(self):
+        return len(self.markers)
+
+    def __eq__(self, other):
+        return isinstance(other, MarkerLayout) and (self.surfaceSize, self.markers) == (other.surfaceSize, other.markers)
+
+    def toDict(self):
+        return {
+            "name": self.name,
+            "surface_size": list(self.surfaceSize),
+            "markers": {str(markerId): [list(vertex) for vertex in verts] for markerId, verts in self.markers.items()},
+            "rects": {str(markerId): list(rect) for markerId, rect in self.rects.items()},
+        }
+
+    @classmethod
+    def fromDict(cls, data, name=None):
+        return cls(
+            data.get('name', name) if name is None else name,
+            data['surface_size'],
+            {int(markerId): [tuple(vertex) for vertex in verts] for markerId, verts in data['markers'].items()},
+            {int(markerId): tuple(rect) for markerId, rect in data.get('rects', {}).items()},
+        )
+
+
+def squareVerts(left, top, size):
+    return [(left, top), (left + size, top), (left + size, top + size), (left, top + size)]
+
+
+def anchorPosition(anchor, width, height, size, leftOffset=0, rightOffset=0):
+    """Top-left corner of a size x size square at anchor. Offsets move the left and right columns horizontally."""
+    left = leftOffset
+    right = width - size + rightOffset
+    center = (width - size + leftOffset + rightOffset) / 2
+    middle = (height - size) / 2
+    bottom = height - size
+
+    return {
+        'top-left': (left, 0),
+        'top-right': (right, 0),
+        'bottom-right': (right, bottom),
+        'bottom-left': (left, bottom),
+        'top': (center, 0),
+        'right': (right, middle),
+        'bottom': (center, bottom),
+        'left': (left, middle),
+    }[anchor]
+
+
+@functools.lru_cache(maxsize=32)
+def screenLayout(width, height, tagSize, leftOffset=0, rightOffset=0, edgeMarkers=False):
+    """Markers drawn by TagWindow: padded squares along the window edges. Cached per geometry."""
+    padding = tagSize / 8
+    paddedSize = tagSize + 2*padding
+    anchors = CORNERS + EDGE_MIDPOINTS if edgeMarkers else CORNERS
+
+    markers = {}
+    rects = {}
+    for markerId, anchor in enumerate(anchors):
+        left, top = anchorPosition(anchor, width, height, paddedSize, leftOffset, rightOffset)
+        rects[markerId] = (left, top, paddedSize)
+        markers[markerId] = squareVerts(left + padding, top + padding, tagSize)
+
+    return MarkerLayout('screen', (width, height), markers, rects)
+
+
+@functools.lru_cache(maxsize=8)
+def insetLayout(width, height, markerSize, padding, anchors=INSET_CORNERS):
+    """Markers of markerSize, padding pixels in from the surface edges, as data_sender.py shows them."""
+    markers = {}
+    for markerId, anchor in enumerate(anchors):
+        left, top = anchorPosition(anchor, width - 2*padding, height - 2*padding, markerSize)
+        markers[markerId] = squareVerts(left + padding, top + padding, markerSize)
+
+    return MarkerLayout('inset', (width, height), markers)
+
+
+@functools.lru_cache(maxsize=1)
+def physicalLayout():
+    """Printed tags beside a physical screen: pattern edges outside the screen's left and right borders."""
+    outerLeft = -PAPER_TAG_SIZE + PAPER_TO_PATTERN_OFFSET
+    outerRight = PHYSICAL_SCREEN_WIDTH + PAPER_TO_PATTERN_OFFSET
+    top = VERTICAL_MARGIN_TOP
+    bottom = PHYSICAL_SCREEN_HEIGHT - VERTICAL_MARGIN_BOTTOM - TAG_PATTERN_SIZE
+
+    markers = {
+        0: squareVerts(outerLeft, top, TAG_PATTERN_SIZE), # Tag en haut à gauche (sur le bord GAUCHE)
+        1: squareVerts(outerRight, top, TAG_PATTERN_SIZE), # Tag en haut à droite (sur le bord DROIT)
+        2: squareVerts(outerRight, bottom, TAG_PATTERN_SIZE), # Tag en bas à droite (sur le bord DROIT)
+        3: squareVerts(outerLeft, bottom, TAG_PATTERN_SIZE), # Tag en bas à gauche (sur le bord GAUCHE)
+    }
+    return MarkerLayout('physical', (PHYSICAL_SCREEN_WIDTH, PHYSICAL_SCREEN_HEIGHT), markers)
+
+
+PHYSICAL_MARKER_VERTICES = physicalLayout().markers
+
+BUILTIN_PROFILES = {
+    'physical': physicalLayout,
+    'inset': lambda: insetLayout(1920, 1080, 80, 50),
+    'screen': lambda: screenLayout(1920, 1080, 206, -256, 256),
+    'screen-edges': lambda: screenLayout(1920, 1080, 206, -256, 256, edgeMarkers=True),
+}
+
+
+def profilePath(name, directory=LAYOUT_PROFILE_DIR):
+    return os.path.join(directory, f'{name}.json')
+
+
+def saveProfile(layout, name=None, directory=LAYOUT_PROFILE_DIR):
+    name = layout.name if name is None else name
+    os.makedirs(directory, exist_ok=True)
+    path = profilePath(name, directory)
+    with open(path + '.tmp', 'w') as file:
+        json.dump(dict(layout.toDict(), name=name), file, indent=1)
+    os.replace(path + '.tmp', path)
+    loadProfile.cache_clear()
+    return path
+
+
+@functools.lru_cache(maxsize=16)
+def loadProfile(name, directory=LAYOUT_PROFILE_DIR):
+    """A saved profile by name, else a built-in one. Raises KeyError for unknown names."""
+    path = profilePath(name, directory)
+    if os.path.exists(path):
+        return loadLayout(path, name)
+
+    if name in BUILTIN_PROFILES:
+        return BUILTIN_PROFILES[name]()
+
+    raise KeyError(f"Unknown marker layout profile '{name}'")
+
+
+def loadLayout(path, name=None):
+    """Reads a layout JSON file: {"surface_size": [w, h], "markers": {"<id>": [[x, y] x 4]}, "rects": {...}}."""
+    with open(path) as file:
+        return MarkerLayout.fromDict(json.load(file), name)
+
+
+def listProfiles(directory=LAYOUT_PROFILE_DIR):
+    saved = [name[:-len('.json')] for name in os.listdir(directory) if name.endswith('.json')] if os.path.isdir(directory) else []
+    return sorted(set(saved) | set(BUILTIN_PROFILES))
+
+
+def benchmark(repeats=10000):
+    """Microseconds per TagWindow layout lookup, cached vs computed, plus a profile load from disk."""
+    import tempfile
+
+    geometry = (1920, 1080, 206, -256, 256, True)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        screenLayout.__wrapped__(*geometry)
+    computed = (time.perf_counter() - start) / repeats
+
+    screenLayout(*geometry)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        screenLayout(*geometry)
+    cached = (time.perf_counter() - start) / repeats
+
+    with tempfile.TemporaryDirectory() as directory:
+        saveProfile(screenLayout(*geometry), 'benchmark', directory)
+        start = time.perf_counter()
+        loadProfile.__wrapped__('benchmark', directory)
+        loaded = time.perf_counter() - start
+
+    return {"computed_us": computed*1e6, "cached_us": cached*1e6, "profile_load_us": loaded*1e6}
+
+
+def main():
+    """Saves a named marker layout profile, or lists the known ones."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('name', nargs='?', help='Profile to save; lists the profiles if omitted')
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--tag-size', type=int, default=206)
+    parser.add_argument('--left-offset', type=int, default=-256)
+    parser.add_argument('--right-offset', type=int, default=256)
+    parser.add_argument('--edge-markers', action='store_true', help='Add markers at the edge midpoints (ids 4-7)')
+    parser.add_argument('--benchmark', action='store_true')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        result = benchmark()
+        print(f"Layout: {result['computed_us']:.1f} us computed, {result['cached_us']:.2f} us cached, "
+              f"{result['profile_load_us']:.0f} us to load a profile")
+        return
+
+    if args.name is None:
+        for name in listProfiles():
+            layout = loadProfile(name)
+            print(f"{name}: {len(layout)} markers on {layout.surfaceSize[0]}x{layout.surfaceSize[1]}")
+        return
+
+    layout = screenLayout(args.width, args.height, args.tag_size, args.left_offset, args.right_offset, args.edge_markers)
+    print(f"Saved {saveProfile(layout, args.name)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import sys
+
+from PySide6.QtCore import *
+from PySide6.QtGui import *
+from PySide6.QtWidgets import *
+
+from gaze_receiver import GazeReceiver, UDP_IP, UDP_PORT
+
+# --- Configuration ---
+CIRCLE_RADIUS = 30
+CIRCLE_COLOR_RGB = (255, 0, 0)  # Red
+CIRCLE_STROKE_WIDTH = 3
+
+
+def circleBounds(point):
+    margin = CIRCLE_RADIUS + CIRCLE_STROKE_WIDTH
+    return QRect(point[0] - margin, point[1] - margin, 2 * margin + 1, 2 * margin + 1)
+
+
+class GazeOverlay(QWidget):
+    """Click-through, always-on-top overlay drawing the latest gaze point.
+
+    Only the previous and the new circle bounds are repainted, at most once
+    per display refresh.
+    """
+    def __init__(self, receiver, refreshRate=60.0):
+        super().__init__()
+
+        self.setWindowFlags(
+            Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool | Qt.WindowTransparentForInput
+        )
+        self.setAttribute(Qt.WA_TranslucentBackground)
+        self.setAttribute(Qt.WA_ShowWithoutActivating)
+
+        self.receiver = receiver
+        self.point = None
+        self.paintedPoint = None
+        self.pen = QPen(QColor(*CIRCLE_COLOR_RGB), CIRCLE_STROKE_WIDTH)
+
+        self.framesRendered = 0
+        self.pixelsTouchedLastFrame = 0
+        self.pixelsTouchedTotal = 0
+
+        self.renderTimer = QTimer(self)
+        self.renderTimer.setTimerType(Qt.PreciseTimer)
+        self.renderTimer.setInterval(max(1, int(1000 / refreshRate)))
+        self.renderTimer.timeout.connect(self.render)
+        self.renderTimer.start()
+
+        self.notifier = QSocketNotifier(self.receiver.fileno(), QSocketNotifier.Read, self)
+        self.notifier.activated.connect(self.onGazeReady)
+
+    def onGazeReady(self):
+        gaze = self.receiver.drain()
+        if gaze is None:
+            return
+
+        local = self.mapFromGlobal(QPoint(int(gaze[0]), int(gaze[1])))
+        self.point = (
+            max(0, min(self.width() - 1, local.x())),
+            max(0, min(self.height() - 1, local.y())),
+        )
+
+    def render(self):
+        if self.point == self.paintedPoint:
+            return
+
+        if self.paintedPoint is not None:
+            self.update(circleBounds(self.paintedPoint))
+        self.update(circleBounds(self.point))
+        self.paintedPoint = self.point
+
+    def paintEvent(self, event):
+        pixels = sum(rect.width() * rect.height() for rect in event.region())
+        self.pixelsTouchedLastFrame = pixels
+        self.pixelsTouchedTotal += pixels
+        self.framesRendered += 1
+
+        if self.paintedPoint is None:
+            return
+
+        painter = QPainter(self)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(self.pen)
+        painter.setBrush(Qt.NoBrush)
+        painter.drawEllipse(QPoint(*self.paintedPoint), CIRCLE_RADIUS, CIRCLE_RADIUS)
+
+
+def main():
+    app = QApplication(sys.argv)
+
+    try:
+        receiver = GazeReceiver(UDP_IP, UDP_PORT)
+    except OSError as e:
+        print(f"Error binding UDP socket: {e}. Is another instance running or port in use?")
+        return
+
+    print(f"Listening for gaze data on UDP {UDP_IP}:{UDP_PORT}")
+    overlay = GazeOverlay(receiver, app.primaryScreen().refreshRate())
+    overlay.setGeometry(app.primaryScreen().geometry())
+    overlay.show()
+
+    try:
+        app.exec()
+    finally:
+        receiver.close()
+        if overlay.framesRendered:
+            print(f"Rendered {overlay.framesRendered} frames, {overlay.pixelsTouchedTotal / overlay.framesRendered:.0f} pixels per frame")
+
+
+if __name__ == "__main__":
+    main()
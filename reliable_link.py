@@ -0,0 +1,410 @@
+import os
+import random
+import struct
+import time
+
+from gaze_packet import DEVICE_EVENT_PACKET, DEVICE_GAZE_PACKET, EVENT_PACKET, GAZE_PACKET, GAZE_TARGET_PACKET
+
+# Magic, channel, sender session (random per sender, so a receiver notices restarts), sequence number
+LINK_HEADER = struct.Struct('<BBBI')
+LINK_MAGIC = 0xA5
+GAZE_CHANNEL = 1 # Fire-and-forget: a late sample is worse than a lost one
+EVENT_CHANNEL = 2 # Acknowledged and retransmitted, delivered in order
+ACK_CHANNEL = 3 # Header only, acknowledges one event sequence number
+
+# Events carry, after the header, the oldest sequence number the sender still retransmits, so a receiver that
+# starts mid-stream or after a loss knows where the events it must deliver begin
+EVENT_BASE = struct.Struct('<I')
+
+# The header makes every framed packet a size no unframed packet has, so both can share a port
+GAZE_PAYLOAD_SIZES = (GAZE_PACKET.size, GAZE_TARGET_PACKET.size, DEVICE_GAZE_PACKET.size)
+EVENT_PAYLOAD_SIZES = (EVENT_PACKET.size, DEVICE_EVENT_PACKET.size)
+FRAMED_SIZES = frozenset(
+    [LINK_HEADER.size + size for size in GAZE_PAYLOAD_SIZES]
+    + [LINK_HEADER.size + EVENT_BASE.size + size for size in EVENT_PAYLOAD_SIZES]
+)
+
+RETRANSMIT_INTERVAL = 0.03 # Seconds before the first retransmit, doubled on every retry
+MAX_RETRANSMIT_INTERVAL = 0.5
+MAX_ATTEMPTS = 8 # Sends per event before giving up (~2 s with the defaults)
+HOLD_TIMEOUT = 2.5 # Seconds a receiver holds events back waiting for a missing one; longer than a sender retries
+
+# SequenceStats.update() results
+NEW = 'new'
+LATE = 'late'
+DUPLICATE = 'duplicate'
+STALE = 'stale'
+SEEN_WINDOW = 64 # Sequence numbers behind the newest for which duplicates are told apart from late packets
+
+
+def frame(channel, session, sequence, payload=b''):
+    return LINK_HEADER.pack(LINK_MAGIC, channel, session, sequence) + payload
+
+
+def parse(data):
+    """Returns (channel, session, sequence, payload), or None if data is not a framed packet."""
+    if len(data) < LINK_HEADER.size or data[0] != LINK_MAGIC:
+        return None
+
+    _, channel, session, sequence = LINK_HEADER.unpack_from(data)
+    return channel, session, sequence, data[LINK_HEADER.size:]
+
+
+def isFramed(data, size=None):
+    size = len(data) if size is None else size
+    return size in FRAMED_SIZES and data[0] == LINK_MAGIC
+
+
+class SequenceStats():
+    """Loss, reorder and duplicate counts for one stream of sequence numbers.
+
+    A gap counts as lost until the missing packets turn up late. The last
+    SEEN_WINDOW sequence numbers are kept as a bit mask, so a packet arriving
+    twice is told from one arriving late in constant time. Packets older
+    than the first one received were never counted as lost, so they are
+    stale.
+    """
+    def __init__(self):
+        self.first = None
+        self.highest = None
+        self.seen = 0 # Bit n set: highest - n was received
+        self.received = 0
+        self.lost = 0
+        self.reordered = 0
+        self.duplicates = 0
+        self.restarts = 0
+
+    def restart(self):
+        if self.highest is not None:
+            self.restarts += 1
+        self.first = None
+        self.highest = None
+        self.seen = 0
+
+    def update(self, sequence):
+        if self.highest is None or sequence > self.highest:
+            if self.highest is None:
+                self.first = sequence
+                self.seen = 1
+            else:
+                gap = sequence - self.highest
+                self.lost += gap - 1
+                self.seen = ((self.seen << gap) | 1) & ((1 << SEEN_WINDOW) - 1) if gap < SEEN_WINDOW else 1
+            self.highest = sequence
+            self.received += 1
+            return NEW
+
+        age = self.highest - sequence
+        if age >= SEEN_WINDOW or sequence < self.first:
+            self.reordered += 1
+            return STALE
+
+        if self.seen >> age & 1:
+            self.duplicates += 1
+            return DUPLICATE
+
+        self.seen |= 1 << age
+        self.received += 1
+        self.reordered += 1
+        self.lost -= 1
+        return LATE
+
+    def getStats(self):
+        expected = self.received + self.lost
+        return {
+            "received": self.received,
+            "lost": self.lost,
+            "loss_rate": self.lost / expected if expected else 0.0,
+            "reordered": self.reordered,
+            "duplicates": self.duplicates,
+            "restarts": self.restarts,
+        }
+
+
+class SequencedSender():
+    """Frames outgoing packets with sequence numbers; events are retransmitted until acknowledged.
+
+    sendto(packet) does the actual send, so the same sender works with a
+    plain socket and with an asyncio transport. Acks arriving on that socket
+    are handed to handleAck(), and service() is called regularly (every
+    processed sample is enough) to retransmit overdue events. Gaze is sent
+    once and never waits for anything.
+    """
+    def __init__(self, sendto, retransmitInterval=RETRANSMIT_INTERVAL, maxAttempts=MAX_ATTEMPTS):
+        self.sendto = sendto
+        self.retransmitInterval = retransmitInterval
+        self.maxAttempts = maxAttempts
+        self.session = random.Random(os.urandom(4)).randrange(256)
+
+        self.gazeSequence = 0
+        self.eventSequence = 0
+        self.pending = {} # Event sequence number: [packet, first sent, next due, attempts]
+
+        self.gazeSent = 0
+        self.eventsSent = 0
+        self.retransmits = 0
+        self.acked = 0
+        self.givenUp = 0
+        self.ackTimeTotal = 0.0
+
+    def sendGaze(self, payload):
+        self.sendto(frame(GAZE_CHANNEL, self.session, self.gazeSequence, payload))
+        self.gazeSequence += 1
+        self.gazeSent += 1
+
+    def sendEvent(self, payload, now=None):
+        now = time.monotonic() if now is None else now
+        # Sequence numbers are pending in ascending order, so the first is the oldest
+        base = next(iter(self.pending), self.eventSequence)
+        packet = frame(EVENT_CHANNEL, self.session, self.eventSequence, EVENT_BASE.pack(base) + payload)
+        self.pending[self.eventSequence] = [packet, now, now + self.retransmitInterval, 1]
+        self.eventSequence += 1
+        self.eventsSent += 1
+        self.sendto(packet)
+
+    def handleAck(self, data, now=None):
+        """Returns True if data was an ack (of a pending event or not)."""
+        parsed = parse(data)
+        if parsed is None or parsed[0] != ACK_CHANNEL or parsed[1] != self.session:
+            return False
+
+        entry = self.pending.pop(parsed[2], None)
+        if entry is not None:
+            self.acked += 1
+            self.ackTimeTotal += (time.monotonic() if now is None else now) - entry[1]
+        return True
+
+    def service(self, now=None):
+        """Retransmits overdue events and drops those out of attempts. Returns the number still pending."""
+        if not self.pending:
+            return 0
+
+        now = time.monotonic() if now is None else now
+        for sequence, entry in list(self.pending.items()):
+            if entry[2] > now:
+                continue
+
+            if entry[3] >= self.maxAttempts:
+                del self.pending[sequence]
+                self.givenUp += 1
+                continue
+
+            entry[3] += 1
+            entry[2] = now + min(MAX_RETRANSMIT_INTERVAL, self.retransmitInterval * 2 ** (entry[3] - 1))
+            self.retransmits += 1
+            self.sendto(entry[0])
+
+        return len(self.pending)
+
+    def getStats(self):
+        return {
+            "gaze_sent": self.gazeSent,
+            "events_sent": self.eventsSent,
+            "retransmits": self.retransmits,
+            "acked": self.acked,
+            "given_up": self.givenUp,
+            "pending": len(self.pending),
+            "mean_ack_ms": 1000 * self.ackTimeTotal / self.acked if self.acked else None,
+        }
+
+
+class SequencedReceiver():
+    """Receiving side of SequencedSender.
+
+    receive() returns the channel, the payloads to deliver and an ack to send
+    back to the sender (or None). Gaze is delivered as it arrives; a late
+    gaze sample is dropped, since a newer one was already delivered. Events
+    are acknowledged every time they arrive (the previous ack may have been
+    lost) and delivered exactly once, in order: after a gap, later events
+    are held until the missing one is retransmitted, or for at most
+    holdTimeout seconds if the sender gave up on it. Each event carries the
+    oldest one its sender still retransmits, where delivery starts (also
+    when the first events of a session are lost) and below which nothing is
+    waited for.
+    """
+    def __init__(self, holdTimeout=HOLD_TIMEOUT):
+        self.holdTimeout = holdTimeout
+        self.gazeStats = SequenceStats()
+        self.eventStats = SequenceStats()
+        self.session = None
+
+        self.nextEvent = None
+        self.held = {} # Event sequence number: payload
+        self.holdingSince = None
+        self.skippedEvents = 0
+        self.invalid = 0
+
+    def restart(self, session):
+        self.session = session
+        self.gazeStats.restart()
+        self.eventStats.restart()
+        self.nextEvent = None
+        self.held.clear()
+        self.holdingSince = None
+
+    def receive(self, data, now=None):
+        parsed = parse(data)
+        if parsed is None or parsed[0] not in (GAZE_CHANNEL, EVENT_CHANNEL):
+            self.invalid += 1
+            return None, (), None
+
+        channel, session, sequence, payload = parsed
+        if session != self.session:
+            self.restart(session)
+
+        if channel == GAZE_CHANNEL:
+            status = self.gazeStats.update(sequence)
+            return channel, ((bytes(payload),) if status == NEW else ()), None
+
+        if len(payload) < EVENT_BASE.size:
+            self.invalid += 1
+            return None, (), None
+
+        ack = frame(ACK_CHANNEL, session, sequence)
+        self.eventStats.update(sequence)
+        base, = EVENT_BASE.unpack_from(payload)
+        delivered = []
+        if self.nextEvent is None:
+            self.nextEvent = base
+        elif base > self.nextEvent:
+            # The sender no longer retransmits anything before base: deliver what arrived of it, skip the rest
+            ready = sorted(held for held in self.held if held < base)
+            delivered.extend(self.held.pop(held) for held in ready)
+            self.skippedEvents += base - self.nextEvent - len(ready)
+            self.nextEvent = base
+        if sequence >= self.nextEvent and sequence not in self.held:
+            self.held[sequence] = bytes(payload[EVENT_BASE.size:])
+        delivered.extend(self.release(now))
+        return channel, delivered, ack
+
+    def release(self, now=None):
+        """Events that are ready in order, skipping a gap that was held too long."""
+        delivered = []
+        while self.nextEvent in self.held:
+            delivered.append(self.held.pop(self.nextEvent))
+            self.nextEvent += 1
+
+        if not self.held:
+            self.holdingSince = None
+            return delivered
+
+        now = time.monotonic() if now is None else now
+        if self.holdingSince is None:
+            self.holdingSince = now
+        elif now - self.holdingSince > self.holdTimeout:
+            first = min(self.held)
+            self.skippedEvents += first - self.nextEvent
+            self.nextEvent = first
+            self.holdingSince = None
+            delivered.extend(self.release(now))
+
+        return delivered
+
+    def getStats(self):
+        return {
+            "gaze": self.gazeStats.getStats(),
+            "events": dict(self.eventStats.getStats(), held=len(self.held), skipped=self.skippedEvents),
+            "invalid": self.invalid,
+        }
+
+
+class LossyLink():
+    """Simulated network for the benchmark: drops, duplicates and delays packets at random."""
+    def __init__(self, rng, lossRate, duplicateRate, minDelay, maxDelay):
+        self.rng = rng
+        self.lossRate = lossRate
+        self.duplicateRate = duplicateRate
+        self.minDelay = minDelay
+        self.maxDelay = maxDelay
+        self.now = 0.0
+        self.inFlight = [] # (arrival time, order, packet)
+
+    def send(self, packet):
+        if self.rng.random() < self.lossRate:
+            return
+        copies = 2 if self.rng.random() < self.duplicateRate else 1
+        for _ in range(copies):
+            self.inFlight.append((self.now + self.rng.uniform(self.minDelay, self.maxDelay), self.rng.random(), packet))
+
+    def arrived(self, now):
+        self.inFlight.sort()
+        count = 0
+        while count < len(self.inFlight) and self.inFlight[count][0] <= now:
+            count += 1
+        packets = [packet for _, _, packet in self.inFlight[:count]]
+        del self.inFlight[:count]
+        return packets
+
+
+def simulate(seconds=60.0, rate=200.0, eventRate=2.0, lossRate=0.05, duplicateRate=0.01, minDelay=0.001, maxDelay=0.008, seed=0):
+    """Sends gaze and events over a LossyLink in both directions and checks what the receiver got."""
+    rng = random.Random(seed)
+    toReceiver = LossyLink(rng, lossRate, duplicateRate, minDelay, maxDelay)
+    toSender = LossyLink(rng, lossRate, duplicateRate, minDelay, maxDelay)
+    sender = SequencedSender(toReceiver.send)
+    receiver = SequencedReceiver()
+
+    eventsSent = []
+    eventsDelivered = []
+    gazeDelivered = 0
+    step = 1.0 / rate
+    now = 0.0
+    receiveTime = 0.0
+    receiveCount = 0
+    while now < seconds + 3.0:
+        toReceiver.now = toSender.now = now
+        if now < seconds:
+            sender.sendGaze(GAZE_PACKET.pack(1.0, 2.0, now))
+            if rng.random() < eventRate * step:
+                payload = EVENT_PACKET.pack(4, now, now, 1.0, 2.0)
+                eventsSent.append(payload)
+                sender.sendEvent(payload, now)
+
+        for packet in toReceiver.arrived(now):
+            start = time.perf_counter()
+            channel, payloads, ack = receiver.receive(packet, now)
+            receiveTime += time.perf_counter() - start
+            receiveCount += 1
+            if channel == GAZE_CHANNEL:
+                gazeDelivered += len(payloads)
+            else:
+                eventsDelivered.extend(payloads)
+            if ack is not None:
+                toSender.send(ack)
+
+        for packet in toSender.arrived(now):
+            sender.handleAck(packet, now)
+        sender.service(now)
+        now += step
+
+    gazeStats = receiver.getStats()['gaze']
+    return {
+        "sender": sender.getStats(),
+        "receiver": receiver.getStats(),
+        "gaze_delivered": gazeDelivered / sender.gazeSent,
+        "gaze_loss_detected": gazeStats['lost'] / sender.gazeSent,
+        "events_delivered": len(eventsDelivered) / max(1, len(eventsSent)),
+        "events_in_order": eventsDelivered == eventsSent[:len(eventsDelivered)],
+        "receive_us": receiveTime / max(1, receiveCount) * 1e6,
+    }
+
+
+def benchmark():
+    """Event delivery with and without retransmits at several loss rates."""
+    results = []
+    for lossRate in (0.0, 0.01, 0.05, 0.2):
+        result = simulate(lossRate=lossRate)
+        results.append(dict(result, loss_rate=lossRate))
+    return results
+
+
+if __name__ == "__main__":
+    for result in benchmark():
+        sender = result['sender']
+        print(
+            f"loss {result['loss_rate']:4.0%}: gaze delivered {result['gaze_delivered']:.1%} "
+            f"(loss seen {result['gaze_loss_detected']:.1%}, reordered {result['receiver']['gaze']['reordered']}), "
+            f"events delivered {result['events_delivered']:.1%} in order={result['events_in_order']} "
+            f"after {sender['retransmits']} retransmits, mean ack {sender['mean_ack_ms'] or 0:.1f} ms, "
+            f"{result['receive_us']:.1f} us per packet"
+        )
@@ -0,0 +1,454 @@
+import argparse
+import asyncio
+import collections
+import threading
+import time
+
+import numpy as np
+
+from handoff import SpscQueue
+
+# Neon scene camera
+SCENE_SIZE = (1600, 1200)
+SCENE_FRAME_RATE = 30
+
+
+def planeView(plane, width, height):
+    """A plane of an av.VideoFrame as a (height, width) array, without copying. Rows may be padded."""
+    return np.frombuffer(plane, np.uint8, count=plane.line_size*height).reshape(height, plane.line_size)[:, :width]
+
+
+class FramePool():
+    """Recycled frame buffers.
+
+    The decoder thread acquires buffers and the consumer releases them, through
+    an SpscQueue, so neither side locks. At most maxFrames buffers exist; when
+    all are in use acquire() returns None and the frame is dropped. Buffers of
+    an old size are discarded when the stream size changes.
+    """
+    def __init__(self, maxFrames=4):
+        self.maxFrames = maxFrames
+        self.free = SpscQueue(maxFrames)
+        self.allocated = 0
+        self.allocations = 0
+
+    def acquire(self, shape):
+        buffer = self.free.get()
+        while buffer is not None and buffer.shape != shape:
+            self.allocated -= 1
+            buffer = self.free.get()
+
+        if buffer is None:
+            if self.allocated >= self.maxFrames:
+                return None
+            buffer = np.empty(shape, dtype=np.uint8)
+            self.allocated += 1
+            self.allocations += 1
+
+        return buffer
+
+    def release(self, buffer):
+        self.free.put(buffer)
+
+
+class PooledFrame():
+    """A decoded scene frame in a pooled buffer: grayscale (height, width) or BGR (height, width, 3).
+
+    release() hands the buffer back for reuse; the frame must not be used after that.
+    """
+    __slots__ = ('pixels', 'timestamp_unix_seconds', 'pool')
+
+    def __init__(self, pixels, timestamp, pool=None):
+        self.pixels = pixels
+        self.timestamp_unix_seconds = timestamp
+        self.pool = pool
+
+    @property
+    def bgr_pixels(self):
+        # Only colour frames have one, so GazeMapper and other SimpleVideoFrame users keep working
+        if self.pixels.ndim != 3:
+            raise AttributeError('bgr_pixels')
+        return self.pixels
+
+    def release(self):
+        if self.pool is not None:
+            self.pool.release(self.pixels)
+            self.pool = None
+
+
+class FrameConverter():
+    """Copies a decoded av.VideoFrame into a preallocated buffer.
+
+    Grayscale is the Y plane of the YUV 4:2:0 frames the scene camera
+    streams, copied as is with no colour conversion. Colour frames are packed
+    into a reused I420 buffer and converted to BGR in place.
+    """
+    def __init__(self, colour=False):
+        self.colour = colour
+        self.i420 = None
+
+    def shape(self, avFrame):
+        return (avFrame.height, avFrame.width, 3) if self.colour else (avFrame.height, avFrame.width)
+
+    def convert(self, avFrame, out):
+        import cv2
+
+        if avFrame.format.name not in ('yuv420p', 'yuvj420p'):
+            avFrame = avFrame.reformat(format='yuv420p')
+
+        height, width = avFrame.height, avFrame.width
+        luma = planeView(avFrame.planes[0], width, height)
+        if not self.colour:
+            np.copyto(out, luma)
+            return out
+
+        if self.i420 is None or self.i420.shape != (height * 3 // 2, width):
+            self.i420 = np.empty((height * 3 // 2, width), dtype=np.uint8)
+
+        packed = self.i420.reshape(-1)
+        lumaSize = height * width
+        chromaSize = lumaSize // 4
+        np.copyto(packed[:lumaSize].reshape(height, width), luma)
+        for index, plane in enumerate(avFrame.planes[1:3]):
+            start = lumaSize + index*chromaSize
+            np.copyto(packed[start:start + chromaSize].reshape(height // 2, width // 2), planeView(plane, width // 2, height // 2))
+
+        cv2.cvtColor(self.i420, cv2.COLOR_YUV2BGR_I420, dst=out)
+        return out
+
+
+def createCodec(encoding, decoderThreads=0):
+    import av
+
+    codec = av.CodecContext.create(encoding, 'r')
+    # Frame and slice threads; 0 lets libav pick from the CPU count
+    codec.thread_type = 'AUTO'
+    codec.thread_count = decoderThreads
+    return codec
+
+
+class SceneDecoder():
+    """Receives and decodes the RTSP scene video on its own thread.
+
+    This replaces the decoding in pupil_labs.realtime_api, which allocates a
+    new BGR image per frame on the thread that also maps gaze. Frames are
+    converted into a FramePool and queued in an SpscQueue of queueSize. While
+    the queue is full, new frames are dropped before conversion. The consumer
+    calls get(), which returns the newest frame and releases older ones.
+    Packet timestamps are carried through the decoder in pts, so frame
+    threading keeps every frame's timestamp. Given gazeUrl, the whole gaze
+    stream is received on the same thread too, into the gaze deque, so every
+    frame can be matched to the samples around it.
+    """
+    def __init__(self, url, colour=False, poolSize=4, queueSize=2, decoderThreads=0, gazeUrl=None, gazeHistory=400):
+        self.url = url
+        self.gazeUrl = gazeUrl
+        self.gaze = collections.deque(maxlen=gazeHistory)
+        self.decoderThreads = decoderThreads
+        self.converter = FrameConverter(colour)
+        self.pool = FramePool(max(poolSize, queueSize + 2))
+        self.frames = SpscQueue(queueSize)
+        self.frameReady = threading.Event()
+
+        self.loop = None
+        self.task = None
+        self.thread = None
+        self.error = None
+        self.decoded = 0
+        self.dropped = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='SceneDecoder', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.loop is not None and self.task is not None:
+            self.loop.call_soon_threadsafe(self.task.cancel)
+        if self.thread is not None:
+            self.thread.join(timeout=2.0)
+            self.thread = None
+
+    def run(self):
+        self.loop = asyncio.new_event_loop()
+        self.task = self.loop.create_task(self.receiveStreams())
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.error = e
+            self.frameReady.set()
+        finally:
+            self.loop.close()
+
+    async def receiveStreams(self):
+        tasks = [asyncio.ensure_future(self.receive())]
+        if self.gazeUrl is not None:
+            tasks.append(asyncio.ensure_future(self.receiveGaze()))
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def receiveGaze(self):
+        from pupil_labs.realtime_api.streaming.gaze import RTSPGazeStreamer
+
+        async with RTSPGazeStreamer(url=self.gazeUrl) as streamer:
+            async for gaze in streamer.receive():
+                self.gaze.append(gaze)
+        raise ConnectionError("gaze stream ended")
+
+    async def receive(self):
+        from pupil_labs.realtime_api.streaming.base import RTSPRawStreamer, SDPDataNotAvailableError
+        from pupil_labs.realtime_api.streaming.nal_unit import extract_payload_from_nal_unit
+
+        async with RTSPRawStreamer(self.url, media_type='video') as streamer:
+            codec = None
+            frameTimestamp = None
+            timestamps = {}
+            packetIndex = 0
+
+            async for data in streamer.receive():
+                if codec is None:
+                    try:
+                        codec = createCodec(streamer.encoding, self.decoderThreads)
+                        for parameterSet in self.parameterSets(streamer):
+                            codec.parse(extract_payload_from_nal_unit(parameterSet))
+                    except SDPDataNotAvailableError:
+                        codec = None
+                        continue
+
+                # A parsed packet holds the previous fragments, so it has the previous timestamp
+                for packet in codec.parse(extract_payload_from_nal_unit(data.raw)):
+                    packetIndex += 1
+                    packet.pts = packetIndex
+                    timestamps[packetIndex] = frameTimestamp
+                    for avFrame in codec.decode(packet):
+                        self.publish(avFrame, timestamps.pop(avFrame.pts, frameTimestamp))
+
+                frameTimestamp = data.timestamp_unix_seconds
+
+    def parameterSets(self, streamer):
+        """H.264 SPS/PPS from the session description, as RTSPVideoFrameStreamer reads them."""
+        import base64
+
+        from pupil_labs.realtime_api.streaming.base import SDPDataNotAvailableError
+
+        try:
+            parameterSets = streamer.reader.get_primary_media()["attributes"]["fmtp"]["sprop-parameter-sets"]
+        except (IndexError, KeyError) as e:
+            raise SDPDataNotAvailableError(f"SDP data is missing {e} field") from e
+        return [base64.b64decode(parameterSet) for parameterSet in parameterSets.split(",")]
+
+    def publish(self, avFrame, timestamp):
+        """Decoder thread: converts avFrame into a pooled buffer and queues it, unless the consumer is behind."""
+        self.decoded += 1
+        if timestamp is None or len(self.frames) >= self.frames.capacity:
+            self.dropped += 1
+            return
+
+        buffer = self.pool.acquire(self.converter.shape(avFrame))
+        if buffer is None:
+            self.dropped += 1
+            return
+
+        self.converter.convert(avFrame, buffer)
+        self.frames.put(PooledFrame(buffer, timestamp, self.pool))
+        if not self.frameReady.is_set():
+            self.frameReady.set()
+
+    def latest(self):
+        """The newest queued frame, or None. Older queued frames are released unseen."""
+        frame = self.frames.get()
+        newer = self.frames.get()
+        while newer is not None:
+            frame.release()
+            frame = newer
+            newer = self.frames.get()
+        return frame
+
+    def get(self, timeout=None):
+        """Waits up to timeout seconds for a frame. Raises the decoder thread's error, if it failed."""
+        frame = self.latest()
+        if frame is None:
+            self.frameReady.clear()
+            frame = self.latest()
+            if frame is None and self.frameReady.wait(timeout):
+                frame = self.latest()
+
+        if frame is None and self.error is not None:
+            raise RuntimeError(f"Scene decoder failed: {self.error!r}")
+        return frame
+
+    def getStats(self):
+        return {
+            "decoded": self.decoded,
+            "dropped": self.dropped,
+            "buffer_allocations": self.pool.allocations,
+        }
+
+
+class DecodedSceneDevice():
+    """Wraps a simple.Device so its scene video is decoded by a SceneDecoder.
+
+    The decoder thread also receives the gaze stream, as simple.Device only
+    keeps the newest sample of it. Each frame gets the first sample after it,
+    else the newest one. Everything else is forwarded to the device. A
+    returned frame stays valid until the next receive call, which releases it.
+    """
+    def __init__(self, device, colour=False, poolSize=4, decoderThreads=0, gazeHistory=400):
+        sensor = device.world_sensor
+        if sensor is None or sensor.url is None:
+            raise RuntimeError(f"{device} has no scene camera stream")
+        gazeSensor = device.gaze_sensor
+        if gazeSensor is None or gazeSensor.url is None:
+            raise RuntimeError(f"{device} has no gaze stream")
+
+        self.device = device
+        self.decoder = SceneDecoder(
+            sensor.url, colour, poolSize, decoderThreads=decoderThreads, gazeUrl=gazeSensor.url, gazeHistory=gazeHistory
+        )
+        self.gaze = self.decoder.gaze # Appended by the decoder thread, consumed here
+        self.current = None
+        self.decoder.start()
+
+    def __getattr__(self, name):
+        return getattr(self.device, name)
+
+    def __str__(self):
+        return str(self.device)
+
+    def matchGaze(self, timestamp):
+        if not self.gaze:
+            return None
+
+        gaze = self.gaze.popleft()
+        while gaze.timestamp_unix_seconds <= timestamp and self.gaze:
+            gaze = self.gaze.popleft()
+        return gaze
+
+    def receive_matched_scene_video_frame_and_gaze(self, timeout_seconds=None):
+        from pupil_labs.realtime_api.simple.models import MatchedItem
+
+        if self.current is not None:
+            self.current.release()
+            self.current = None
+
+        frame = self.decoder.get(timeout_seconds)
+        if frame is None:
+            return None
+
+        gaze = self.matchGaze(frame.timestamp_unix_seconds)
+        if gaze is None:
+            frame.release()
+            return None
+
+        self.current = frame
+        return MatchedItem(frame, gaze)
+
+    def close(self):
+        self.decoder.stop()
+        self.device.close()
+
+
+def encodeSimulatedVideo(path, frameCount=300, sceneSize=SCENE_SIZE, frameRate=SCENE_FRAME_RATE):
+    """H.264 scene video of the simulated marker scene with camera noise, like a Neon recording."""
+    import av
+    from device_supervisor import renderSimulatedScene
+    from marker_layout import screenLayout
+
+    scene, _, _ = renderSimulatedScene(screenLayout(1920, 1080, 206).markers, (1920, 1080), sceneSize)
+    rng = np.random.default_rng(0)
+    with av.open(path, 'w') as container:
+        stream = container.add_stream('libx264', rate=frameRate)
+        stream.width, stream.height = sceneSize
+        stream.pix_fmt = 'yuv420p'
+        for _ in range(frameCount):
+            noisy = np.clip(scene + rng.normal(0, 4, scene.shape), 0, 255).astype(np.uint8)
+            for packet in stream.encode(av.VideoFrame.from_ndarray(noisy, format='bgr24')):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+
+
+def decodeRecorded(path, mode, decoderThreads=0):
+    """Decodes a recording as simple.Device ('library') or SceneDecoder ('pooled-gray', 'pooled-colour') would.
+
+    Returns (frames, seconds, new frame buffers, bytes per frame buffer). A
+    frame counts as a new buffer if it shares no memory with the previous
+    frame, which is still alive at that point.
+    """
+    import av
+
+    pool = FramePool()
+    converter = FrameConverter(colour=(mode == 'pooled-colour'))
+    frames = 0
+    newBuffers = 0
+    previous = None
+
+    with av.open(path) as container:
+        stream = container.streams.video[0]
+        stream.codec_context.thread_type = 'AUTO'
+        stream.codec_context.thread_count = decoderThreads
+
+        start = time.perf_counter()
+        for avFrame in container.decode(stream):
+            if mode == 'library':
+                pixels = avFrame.to_ndarray(format='bgr24') # SimpleVideoFrame.from_video_frame
+            else:
+                pixels = converter.convert(avFrame, pool.acquire(converter.shape(avFrame)))
+                pool.release(pixels)
+
+            if previous is None or not np.shares_memory(previous, pixels):
+                newBuffers += 1
+            previous = pixels
+            frames += 1
+
+        seconds = time.perf_counter() - start
+
+    return frames, seconds, newBuffers, previous.nbytes if previous is not None else 0
+
+
+def benchmark(path=None, decoderThreads=0):
+    """Decode throughput and frame buffer allocations: library BGR frames vs pooled grayscale and colour."""
+    import os
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as directory:
+        if path is None:
+            path = os.path.join(directory, 'scene.mp4')
+            encodeSimulatedVideo(path)
+
+        results = []
+        for mode in ('library', 'pooled-gray', 'pooled-colour'):
+            frames, seconds, newBuffers, bufferSize = decodeRecorded(path, mode, decoderThreads)
+            results.append({
+                "mode": mode,
+                "frames": frames,
+                "frames_per_second": frames / seconds,
+                "buffer_allocations": newBuffers,
+                "kb_allocated_per_frame": newBuffers * bufferSize / frames / 1024,
+            })
+
+    return results
+
+
+def main():
+    """Benchmarks scene frame decoding on a recorded scene video, or a simulated one."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('path', nargs='?', help='Recorded scene video; a simulated one is encoded if omitted')
+    parser.add_argument('--decoder-threads', type=int, default=0, help='0 lets libav decide')
+    args = parser.parse_args()
+
+    for result in benchmark(args.path, args.decoder_threads):
+        print(f"{result['mode']:13} {result['frames_per_second']:6.1f} frames/s, "
+              f"{result['buffer_allocations']} frame buffers allocated for {result['frames']} frames "
+              f"({result['kb_allocated_per_frame']:.0f} kB per frame)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+import argparse
+import collections
+import gc
+import os
+import sys
+import time
+
+from gaze_sample import EYE_STATE_FIELDS
+
+SAMPLE_RATE = 200.0
+CHECKPOINTS = 40 # Resource measurements per run
+WARMUP_FRACTION = 0.25 # Growth is measured from the end of the warm-up, once caches and pools are full
+
+# A run fails if a resource grows more than this after the warm-up
+MAX_RSS_GROWTH_MB = 16.0
+MAX_OBJECT_GROWTH = 5000
+MAX_HANDLE_GROWTH = 8
+MAX_STRUCTURE_SIZE = 10000 # Items in any one of structureSizes(), which depend on settings but never on session length
+
+Gaze = collections.namedtuple('Gaze', ('x', 'y', 'worn', 'timestamp_unix_seconds') + EYE_STATE_FIELDS)
+Marker = collections.namedtuple('Marker', ['uid'])
+SurfaceGaze = collections.namedtuple('SurfaceGaze', ['x', 'y', 'is_on_aoi'])
+MappedResult = collections.namedtuple('MappedResult', ['markers', 'mapped_gaze'])
+Surface = collections.namedtuple('Surface', ['uid'])
+
+
+class SyntheticGazeMapper():
+    """Stands in for a GazeMapper: all markers seen, gaze mapped linearly from the scene camera to the surface."""
+    def __init__(self, sceneSize=(1600, 1200)):
+        self.sceneSize = sceneSize
+        self.markers = [Marker(f'apriltag:tag36h11:{markerId}') for markerId in range(4)]
+        self.surface = Surface('soak-surface')
+
+    def clear_surfaces(self):
+        pass
+
+    def add_surface(self, markerVerts, surfaceSize):
+        return self.surface
+
+    def process_frame(self, frame, gaze):
+        surfaceGaze = SurfaceGaze(gaze.x / self.sceneSize[0], 1.0 - gaze.y / self.sceneSize[1], True)
+        return MappedResult(self.markers, {self.surface.uid: [surfaceGaze]})
+
+
+class SyntheticSession():
+    """Endless gaze in simulated time: reading, long stares, dwell clicks, blinks, the device taken off and reconnects.
+
+    Every phase that could make a structure grow with session length
+    appears: stares of several minutes (fixation and dwell windows), long
+    not-worn stretches, and clock jumps backwards as after a reconnect to
+    another device.
+    """
+    def __init__(self, rate=SAMPLE_RATE, seed=0, sceneSize=(1600, 1200)):
+        import numpy as np
+
+        self.rng = np.random.default_rng(seed)
+        self.rate = rate
+        self.sceneSize = sceneSize
+        self.timestamp = 1.7e9
+        self.eyeState = {name: 1.0 for name in EYE_STATE_FIELDS}
+
+    def phases(self):
+        rng = self.rng
+        while True:
+            choice = rng.random()
+            if choice < 0.6:
+                yield 'reading', rng.uniform(5, 60)
+            elif choice < 0.75:
+                yield 'dwelling', rng.uniform(5, 30)
+            elif choice < 0.85:
+                yield 'staring', rng.uniform(60, 600)
+            elif choice < 0.95:
+                yield 'not_worn', rng.uniform(10, 300)
+            else:
+                yield 'reconnect', 0.0
+
+    def samples(self):
+        rng = self.rng
+        width, height = self.sceneSize
+        step = 1.0 / self.rate
+        for phase, seconds in self.phases():
+            if phase == 'reconnect':
+                self.timestamp -= rng.uniform(1, 3600) # Another device's clock
+                continue
+
+            center = rng.uniform((100, 100), (width - 100, height - 100))
+            fixationEnd = 0
+            count = int(seconds * self.rate)
+            for index in range(count):
+                self.timestamp += step
+                worn = phase != 'not_worn'
+                blink = worn and index % int(4 * self.rate) < int(0.15 * self.rate) # 150 ms every 4 s
+                if phase == 'reading' and index >= fixationEnd:
+                    center = rng.uniform((100, 100), (width - 100, height - 100))
+                    fixationEnd = index + int(rng.uniform(0.2, 0.4) * self.rate)
+                elif phase == 'dwelling' and index >= fixationEnd:
+                    center = rng.uniform((100, 100), (width - 100, height - 100))
+                    fixationEnd = index + int(rng.uniform(1.0, 2.0) * self.rate)
+
+                # A stare stays within the fixation dispersion for its whole length
+                x, y = center + (rng.uniform(-3, 3, 2) if phase == 'staring' else rng.normal(0, 4, 2))
+                # Stares come without eye state, as from a device that reports none, so no blink breaks them up
+                aperture = None if phase == 'staring' else 0.5 if blink else 10.0
+                self.eyeState['eyelid_aperture_left'] = self.eyeState['eyelid_aperture_right'] = aperture
+                yield Gaze(float(x), float(y), worn, self.timestamp, **self.eyeState)
+
+
+def residentBytes():
+    """Current (not peak) resident set size, or None where it cannot be read."""
+    if sys.platform.startswith('linux'):
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+    if sys.platform == 'win32':
+        import ctypes
+        import ctypes.wintypes as wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                    'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 'PagefileUsage', 'PeakPagefileUsage',
+                )
+            ]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+        return None
+
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def handleCounts():
+    """Open OS handles: file descriptors, or on Windows kernel handles plus GDI and USER objects."""
+    if sys.platform == 'win32':
+        import ctypes
+        import ctypes.wintypes as wintypes
+
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        handles = wintypes.DWORD()
+        ctypes.windll.kernel32.GetProcessHandleCount(process, ctypes.byref(handles))
+        return {
+            "handles": handles.value,
+            "gdi": ctypes.windll.user32.GetGuiResources(process, 0),
+            "user": ctypes.windll.user32.GetGuiResources(process, 1),
+        }
+
+    for path in ('/proc/self/fd', '/dev/fd'):
+        if os.path.isdir(path):
+            return {"handles": len(os.listdir(path))}
+    return {}
+
+
+def structureSizes(pipeline, receiver=None):
+    """Lengths of the containers that depend on the input, so growth can be traced to one of them."""
+    detector = pipeline.eyeMovementDetector
+    sizes = {
+        "eye_movement_window": len(getattr(detector, 'window', ())) + len(getattr(detector, 'history', ())),
+        "observers": len(pipeline.observers),
+    }
+    if pipeline.link is not None:
+        sizes["link_pending"] = len(pipeline.link.pending)
+    if receiver is not None:
+        sizes["receiver_held"] = len(receiver.link.held)
+        sizes["receiver_events"] = len(receiver.events)
+    return sizes
+
+
+def measure(pipeline, receiver=None):
+    gc.collect()
+    rss = residentBytes()
+    return {
+        "rss_mb": None if rss is None else rss / 2**20,
+        "objects": len(gc.get_objects()),
+        **handleCounts(),
+        **structureSizes(pipeline, receiver),
+    }
+
+
+class TagWindowDriver():
+    """Drives an offscreen TagWindow the way the app's observer does, every few samples.
+
+    Needs Python 3.12 or later: PySide6 (seen with 6.12) drops a reference to
+    None on every call returning void, and before None was immortal that
+    aborts a long soak with "Fatal Python error: none_dealloc", however few
+    calls are made per sample.
+    """
+    def __init__(self, every=10):
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        from PySide6.QtWidgets import QApplication
+
+        from gaze_pipeline import PipelineObserver
+        from ui import TagWindow
+
+        self.app = QApplication.instance() or QApplication([])
+        self.window = TagWindow()
+        self.window.resize(1280, 720)
+        self.window.show()
+        self.every = every
+        self.count = 0
+
+        driver = self
+
+        class Observer(PipelineObserver):
+            def markersDetected(self, markerIds):
+                if driver.count % driver.every == 0:
+                    driver.window.showMarkerFeedback(markerIds)
+
+            def sampleProcessed(self, sample):
+                driver.count += 1
+                if driver.count % driver.every == 0:
+                    driver.window.showGlobalPoint(sample.pointX, sample.pointY)
+                    driver.app.processEvents()
+
+            def dwellClicked(self, x, y, sample):
+                driver.window.setSettingsVisible(not driver.window.settingsVisible)
+
+        self.observer = Observer()
+
+    def close(self):
+        self.window.close()
+        self.app.processEvents()
+
+
+def runSoak(hours=1.0, rate=SAMPLE_RATE, qt=False, checkpoints=CHECKPOINTS, seed=0, port=5098, verbose=False):
+    """Feeds hours of simulated gaze through a GazePipeline (plus a loopback receiver) as fast as it runs.
+
+    Returns the measurements at each checkpoint and the growth of each
+    resource from the end of the warm-up to the end of the run.
+    """
+    from gaze_pipeline import GazePipeline
+    from gaze_receiver import GazeReceiver
+    from marker_layout import screenLayout
+    from target_index import TargetRegistry
+
+    targets = TargetRegistry(snapRadius=40)
+    for targetId in range(20):
+        targets.add(targetId, 90 * targetId, 500, 80, 80)
+
+    receiver = GazeReceiver(port=port)
+    pipeline = GazePipeline(('127.0.0.1', port), (1920, 1080), targets=targets, eventOutput=True, sequenced=True,
+                            verbose=False)
+    pipeline.setSurfaceGeometry(1920, 1080, 20, 0, 0, screenLayout(1920, 1080, 206).markers)
+    pipeline.setGazeMapper(SyntheticGazeMapper())
+    pipeline.setAdaptiveDwell(True)
+
+    driver = None
+    if qt:
+        driver = TagWindowDriver()
+        pipeline.addObserver(driver.observer)
+
+    total = int(hours * 3600 * rate)
+    interval = max(1, total // checkpoints)
+    samples = SyntheticSession(rate, seed).samples()
+    series = []
+    events = 0
+    start = time.perf_counter()
+    try:
+        for index in range(total):
+            pipeline.process(None, next(samples))
+            if index % 64 == 0:
+                receiver.drain()
+                events += len(receiver.takeEvents())
+
+            if (index + 1) % interval == 0:
+                point = measure(pipeline, receiver)
+                point["simulated_hours"] = (index + 1) / rate / 3600
+                point["elapsed_seconds"] = time.perf_counter() - start
+                series.append(point)
+                if verbose:
+                    print(", ".join(f"{name}={value:.2f}" if isinstance(value, float) else f"{name}={value}"
+                                    for name, value in point.items()))
+    finally:
+        if driver is not None:
+            driver.close()
+        pipeline.close()
+        receiver.close()
+
+    # Growth is the highest value after the warm-up, so a structure that only grows within a long stare counts too
+    warmup = min(len(series) - 1, int(len(series) * WARMUP_FRACTION))
+    baseline = series[warmup]
+    names = [name for name, value in baseline.items() if name not in ("simulated_hours", "elapsed_seconds") and value is not None]
+    growth = {name: max(point[name] for point in series[warmup:]) - baseline[name] for name in names}
+    return {
+        "samples": total,
+        "events_received": events,
+        "samples_per_second": total / (time.perf_counter() - start),
+        "series": series,
+        "growth": growth,
+        "peak": {name: max(point[name] for point in series) for name in names},
+    }
+
+
+def findFailures(result, maxRssGrowthMb=MAX_RSS_GROWTH_MB, maxObjectGrowth=MAX_OBJECT_GROWTH, maxHandleGrowth=MAX_HANDLE_GROWTH,
+                 maxStructureSize=MAX_STRUCTURE_SIZE):
+    growth = result["growth"]
+    limits = {"rss_mb": maxRssGrowthMb, "objects": maxObjectGrowth, "handles": maxHandleGrowth,
+              "gdi": maxHandleGrowth, "user": maxHandleGrowth}
+    failures = [
+        f"{name} grew by {growth[name]:.1f} (limit {limit})"
+        for name, limit in limits.items() if name in growth and growth[name] > limit
+    ]
+    # Floats and tuples of them are not tracked by the gc, so a growing buffer of samples shows here first
+    failures += [
+        f"{name} reached {peak} items (limit {maxStructureSize})"
+        for name, peak in result["peak"].items() if name not in limits and peak > maxStructureSize
+    ]
+    return failures
+
+
+def benchmark(hours=0.25):
+    """A short soak: samples per second, and growth that should be zero."""
+    result = runSoak(hours)
+    return {"samples_per_second": result["samples_per_second"], **result["growth"]}
+
+
+def main():
+    """Runs the pipeline on hours of synthetic gaze, compressed in time, and fails if memory or handles grow."""
+    parser = argparse.ArgumentParser(description=main.__doc__)
+    parser.add_argument('--hours', type=float, default=1.0, help='Simulated hours (default 1)')
+    parser.add_argument('--rate', type=float, default=SAMPLE_RATE)
+    parser.add_argument('--qt', action='store_true', help='Also drive an offscreen TagWindow (Python 3.12+)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--port', type=int, default=5098, help='Loopback port of the receiver')
+    parser.add_argument('--max-rss-growth', type=float, default=MAX_RSS_GROWTH_MB, help='MB')
+    parser.add_argument('--max-object-growth', type=int, default=MAX_OBJECT_GROWTH)
+    parser.add_argument('--max-handle-growth', type=int, default=MAX_HANDLE_GROWTH)
+    parser.add_argument('--max-structure-size', type=int, default=MAX_STRUCTURE_SIZE)
+    parser.add_argument('--verbose', action='store_true', help='Print every checkpoint')
+    args = parser.parse_args()
+    if args.qt and sys.version_info < (3, 12):
+        parser.error("--qt needs Python 3.12 or later, see TagWindowDriver")
+
+    result = runSoak(args.hours, args.rate, args.qt, seed=args.seed, port=args.port, verbose=args.verbose)
+    print(f"{result['samples']} samples ({args.hours:g} simulated hours) at {result['samples_per_second']:.0f} samples/s, "
+          f"{result['events_received']} events received")
+    for name, value in result["growth"].items():
+        print(f"  {name}: up to {value:+.1f} after warm-up (peak {result['peak'][name]:.1f})")
+
+    failures = findFailures(result, args.max_rss_growth, args.max_object_growth, args.max_handle_growth,
+                            args.max_structure_size)
+    if failures:
+        print("FAILED: " + "; ".join(failures))
+        sys.exit(1)
+    print("No growth beyond the limits")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import time
+
+
+class SurfaceTransform():
+    """Normalized surface coordinates (y up) to window pixels (y down) to global screen pixels.
+
+    Gaze is mapped into the window inset by margin on every side, and the
+    window's top-left corner is at (originX, originY) on the screen. Both
+    steps are axis-aligned affine maps, kept as one scale and offset per
+    axis, so a point costs two multiply-adds and arrays of points map in one
+    NumPy expression. Instances are immutable: build a new one when the
+    window is resized or moved or the tags change.
+    """
+    __slots__ = ('width', 'height', 'margin', 'originX', 'originY', 'scaleX', 'scaleY', 'offsetX', 'offsetY',
+                 'inverseScaleX', 'inverseScaleY')
+
+    def __init__(self, width, height, margin=0, originX=0, originY=0):
+        self.width = width
+        self.height = height
+        self.margin = margin
+        self.originX = originX
+        self.originY = originY
+
+        # Normalized y = 0 is the bottom edge of the gaze area
+        self.scaleX = width - 2*margin
+        self.scaleY = -(height - 2*margin)
+        self.offsetX = margin
+        self.offsetY = height - margin
+        # A window smaller than its margins maps everything to the middle of the gaze area
+        self.inverseScaleX = 1.0 / self.scaleX if self.scaleX else 0.0
+        self.inverseScaleY = 1.0 / self.scaleY if self.scaleY else 0.0
+
+    @property
+    def geometry(self):
+        return (self.width, self.height, self.margin, self.originX, self.originY)
+
+    def __eq__(self, other):
+        return isinstance(other, SurfaceTransform) and self.geometry == other.geometry
+
+    def __hash__(self):
+        return hash(self.geometry)
+
+    def __repr__(self):
+        return 'SurfaceTransform(%s, %s, %s, %s, %s)' % self.geometry
+
+    def toWindow(self, normX, normY):
+        return normX*self.scaleX + self.offsetX, normY*self.scaleY + self.offsetY
+
+    def fromWindow(self, windowX, windowY):
+        if not self.inverseScaleX or not self.inverseScaleY:
+            return 0.5, 0.5
+        return (windowX - self.offsetX) * self.inverseScaleX, (windowY - self.offsetY) * self.inverseScaleY
+
+    def windowToScreen(self, windowX, windowY):
+        return windowX + self.originX, windowY + self.originY
+
+    def screenToWindow(self, screenX, screenY):
+        return screenX - self.originX, screenY - self.originY
+
+    def toScreen(self, normX, normY):
+        return normX*self.scaleX + self.offsetX + self.originX, normY*self.scaleY + self.offsetY + self.originY
+
+    def toWindowArray(self, points):
+        """(n, 2) normalized points to window pixels."""
+        import numpy as np
+
+        return np.asarray(points, dtype=np.float64) * (self.scaleX, self.scaleY) + (self.offsetX, self.offsetY)
+
+    def fromWindowArray(self, points):
+        import numpy as np
+
+        if not self.inverseScaleX or not self.inverseScaleY:
+            return np.full(np.shape(points), 0.5)
+        return (np.asarray(points, dtype=np.float64) - (self.offsetX, self.offsetY)) * (self.inverseScaleX, self.inverseScaleY)
+
+    def toScreenArray(self, points):
+        """(n, 2) normalized points to global screen pixels."""
+        import numpy as np
+
+        return np.asarray(points, dtype=np.float64) * (self.scaleX, self.scaleY) + (
+            self.offsetX + self.originX, self.offsetY + self.originY
+        )
+
+
+def benchmark(count=100000, width=1920, height=1080, margin=20.6, origin=(1920, 0)):
+    """Per-point cost of re-deriving the mapping from the window size each time vs the transform, and of a NumPy batch."""
+    import numpy as np
+
+    points = np.random.default_rng(0).random((count, 2))
+    pairs = points.tolist()
+    results = {}
+
+    def rederived(normX, normY):
+        gazeWidth = width - 2*margin
+        gazeHeight = height - 2*margin
+        return origin[0] + normX*gazeWidth + margin, origin[1] + (gazeHeight - normY*gazeHeight) + margin
+
+    start = time.perf_counter()
+    expected = [rederived(x, y) for x, y in pairs]
+    results['rederived_us'] = (time.perf_counter() - start) / count * 1e6
+
+    transform = SurfaceTransform(width, height, margin, *origin)
+    start = time.perf_counter()
+    mapped = [transform.toScreen(x, y) for x, y in pairs]
+    results['transform_us'] = (time.perf_counter() - start) / count * 1e6
+
+    start = time.perf_counter()
+    batch = transform.toScreenArray(points)
+    results['batch_us'] = (time.perf_counter() - start) / count * 1e6
+
+    results['max_error_px'] = max(float(np.abs(np.array(mapped) - expected).max()), float(np.abs(batch - expected).max()))
+    results['roundtrip_error'] = float(np.abs(transform.fromWindowArray(transform.toWindowArray(points)) - points).max())
+    return results
+
+
+if __name__ == "__main__":
+    results = benchmark()
+    print(f"Re-derived per point: {results['rederived_us']:.3f} us, transform: {results['transform_us']:.3f} us, "
+          f"NumPy batch: {results['batch_us']:.4f} us per point")
+    print(f"Max difference {results['max_error_px']:.2e} px, round trip error {results['roundtrip_error']:.2e}")
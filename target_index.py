@@ -0,0 +1,155 @@
+import json
+import math
+import random
+import time
+
+NO_TARGET = -1
+
+
+class TargetRegistry():
+    """Rectangular gaze targets (buttons, UI regions) in a uniform grid.
+
+    Each target is listed in every grid cell it overlaps, so a hit test only
+    looks at the targets in the cells around the point, however many targets
+    are registered. Targets can be added, moved and removed at any time.
+    """
+    def __init__(self, cellSize=64, snapRadius=0):
+        self.cellSize = cellSize
+        self.snapRadius = snapRadius
+        self.targets = {} # id -> (left, top, right, bottom)
+        self.cells = {} # (column, row) -> set of ids
+
+    def __len__(self):
+        return len(self.targets)
+
+    def setSnapRadius(self, radius):
+        self.snapRadius = radius
+
+    def cellRange(self, left, top, right, bottom):
+        size = self.cellSize
+        return (
+            range(math.floor(left / size), math.floor(right / size) + 1),
+            range(math.floor(top / size), math.floor(bottom / size) + 1),
+        )
+
+    def add(self, targetId, left, top, width, height):
+        if targetId in self.targets:
+            self.remove(targetId)
+
+        rect = (left, top, left + width, top + height)
+        self.targets[targetId] = rect
+        columns, rows = self.cellRange(*rect)
+        for column in columns:
+            for row in rows:
+                self.cells.setdefault((column, row), set()).add(targetId)
+
+    def remove(self, targetId):
+        rect = self.targets.pop(targetId, None)
+        if rect is None:
+            return
+
+        columns, rows = self.cellRange(*rect)
+        for column in columns:
+            for row in rows:
+                cell = self.cells[(column, row)]
+                cell.discard(targetId)
+                if not cell:
+                    del self.cells[(column, row)]
+
+    def clear(self):
+        self.targets.clear()
+        self.cells.clear()
+
+    def containing(self, x, y):
+        """Returns the smallest target containing (x, y), or NO_TARGET."""
+        size = self.cellSize
+        cell = self.cells.get((math.floor(x / size), math.floor(y / size)))
+        if not cell:
+            return NO_TARGET
+
+        best = NO_TARGET
+        bestArea = math.inf
+        for targetId in cell:
+            left, top, right, bottom = self.targets[targetId]
+            if left <= x <= right and top <= y <= bottom:
+                area = (right - left) * (bottom - top)
+                if area < bestArea:
+                    best, bestArea = targetId, area
+
+        return best
+
+    def nearest(self, x, y, maxDistance):
+        """Returns (id, distance) of the closest target edge within maxDistance, or (NO_TARGET, inf)."""
+        best = NO_TARGET
+        bestDistance = math.inf
+        columns, rows = self.cellRange(x - maxDistance, y - maxDistance, x + maxDistance, y + maxDistance)
+        for column in columns:
+            for row in rows:
+                for targetId in self.cells.get((column, row), ()):
+                    left, top, right, bottom = self.targets[targetId]
+                    dx = max(left - x, 0, x - right)
+                    dy = max(top - y, 0, y - bottom)
+                    distance = math.hypot(dx, dy)
+                    if distance < bestDistance:
+                        best, bestDistance = targetId, distance
+
+        if bestDistance > maxDistance:
+            return NO_TARGET, math.inf
+
+        return best, bestDistance
+
+    def hitTest(self, x, y):
+        """Containing target, else the nearest one within snapRadius. Returns its id or NO_TARGET."""
+        targetId = self.containing(x, y)
+        if targetId == NO_TARGET and self.snapRadius > 0:
+            targetId, _ = self.nearest(x, y, self.snapRadius)
+
+        return targetId
+
+    def center(self, targetId):
+        left, top, right, bottom = self.targets[targetId]
+        return (left + right) / 2, (top + bottom) / 2
+
+    def load(self, path):
+        """Replaces the targets with a JSON list of {"id", "x", "y", "width", "height"}."""
+        with open(path) as file:
+            targets = json.load(file)
+
+        self.clear()
+        for target in targets:
+            self.add(int(target['id']), target['x'], target['y'], target['width'], target['height'])
+
+
+def benchmark(counts=(10, 100, 1000, 10000), queries=20000, screenSize=(1920, 1080)):
+    """Hit test cost with a growing number of targets, grid versus linear scan."""
+    rng = random.Random(0)
+    points = [(rng.uniform(0, screenSize[0]), rng.uniform(0, screenSize[1])) for _ in range(queries)]
+
+    results = []
+    for count in counts:
+        registry = TargetRegistry(snapRadius=20)
+        for targetId in range(count):
+            width, height = rng.uniform(20, 120), rng.uniform(20, 60)
+            registry.add(targetId, rng.uniform(0, screenSize[0] - width), rng.uniform(0, screenSize[1] - height), width, height)
+
+        start = time.perf_counter()
+        for x, y in points:
+            registry.hitTest(x, y)
+        gridTime = (time.perf_counter() - start) / queries
+
+        linearPoints = points[:max(100, queries // max(1, count // 10))]
+        start = time.perf_counter()
+        for x, y in linearPoints:
+            min(registry.targets.items(), key=lambda item: math.hypot(
+                max(item[1][0] - x, 0, x - item[1][2]), max(item[1][1] - y, 0, y - item[1][3])
+            ))
+        linearTime = (time.perf_counter() - start) / len(linearPoints)
+
+        results.append({"targets": count, "grid_us": 1e6 * gridTime, "linear_us": 1e6 * linearTime})
+
+    return results
+
+
+if __name__ == "__main__":
+    for result in benchmark():
+        print(f"{result['targets']:>6} targets: grid {result['grid_us']:.2f} us, linear scan {result['linear_us']:.2f} us per hit test")
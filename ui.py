@@ -1,26 +1,45 @@
+import functools
+import os
 import sys
 
-from PySide6.QtCore import *
-from PySide6.QtGui import *
-from PySide6.QtWidgets import *
+from PySide6.QtCore import QMargins, QPoint, QRect, QRectF, Qt, Signal
+from PySide6.QtGui import QColor, QImage, QPainter, QPen, QPixmap, QRegion
+from PySide6.QtWidgets import (
+    QCheckBox, QDoubleSpinBox, QFormLayout, QGridLayout, QLabel, QSizePolicy, QSpacerItem, QSpinBox, QWidget
+)
 
-from pupil_labs.real_time_screen_gaze import marker_generator
+from marker_layout import screenLayout
+from surface_transform import SurfaceTransform
+
+MARKER_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pupil_pointer', 'markers')
+DWELL_RING_WIDTH = 6 # Pixels, drawn just outside the dwell circle
+
+def generateMarkerImage(marker_id):
+    # OpenCV is only needed the first time a marker is generated
+    import numpy as np
+    from pupil_labs.real_time_screen_gaze import marker_generator
 
-def createMarker(marker_id):
     marker = marker_generator.generate_marker(marker_id, flip_x=True, flip_y=True)
+    marker = np.ascontiguousarray(np.pad(marker, 1, constant_values=255), dtype=np.uint8)
+
+    height, width = marker.shape
+    return QImage(marker.data, width, height, width, QImage.Format_Grayscale8).copy()
 
-    image = QImage(10, 10, QImage.Format_Mono)
-    image.fill(1)
-    for y in range(marker.shape[0]):
-        for x in range(marker.shape[1]):
-            color = marker[y][x]//255
-            image.setPixel(x+1, y+1, color)
+@functools.lru_cache(maxsize=None)
+def createMarker(marker_id):
+    path = os.path.join(MARKER_CACHE_DIR, f'tag36h11_{marker_id}.png')
+    image = QImage(path)
+    if image.isNull():
+        image = generateMarkerImage(marker_id)
+        os.makedirs(MARKER_CACHE_DIR, exist_ok=True)
+        image.save(path)
 
     # Convert the QImage to a QPixmap
     return QPixmap.fromImage(image)
 
-def pointToTuple(qpoint):
-    return (qpoint.x(), qpoint.y())
+def rectToQRect(rect):
+    left, top, size = rect
+    return QRect(int(left), int(top), int(size), int(size))
 
 class TagWindow(QWidget):
     surfaceChanged = Signal()
@@ -30,25 +49,27 @@ class TagWindow(QWidget):
     smoothingChanged = Signal(float)
     leftTagOffsetChanged = Signal(int) # Renamed signal
     rightTagOffsetChanged = Signal(int) # New signal for right offset
+    heatmapEnableChanged = Signal(bool)
+    adaptiveDwellChanged = Signal(bool)
 
     def __init__(self):
         super().__init__()
 
         self.setStyleSheet('* { font-size: 18pt }')
 
-        self.markerIDs = []
-        self.pixmaps = []
-        for markerID in range(4):
-            self.markerIDs.append(markerID)
-            self.pixmaps.append(createMarker(markerID))
-
         self.point = (0, 0)
         self.clicked = False
+        self.dwellProgress = 0.0
+        self.dwellRingPen = QPen(QColor(255, 0, 0), DWELL_RING_WIDTH, Qt.SolidLine, Qt.FlatCap)
         self.settingsVisible = True
         self.visibleMarkerIds = []
         self.leftTagHorizontalOffset = 0 # Renamed variable
         self.rightTagHorizontalOffset = 0 # New variable for right offset
         self.frequency = 0 # Add new instance variable for frequency
+        self.heatmap = None
+        self.maskKey = None # (settings visible, marker layout) the window mask was built for
+        self.surfaceTransform = None # Rebuilt after the window moves or resizes or the tag size changes
+        self.effectiveDwellRadius = None # Set while the dwell radius is adapted to measured noise
 
         self.form = QWidget()
         self.form.setLayout(QFormLayout())
@@ -88,6 +109,12 @@ class TagWindow(QWidget):
         self.dwellTimeInput.setValue(0.75)
         self.dwellTimeInput.valueChanged.connect(self.dwellTimeChanged.emit)
 
+        self.adaptiveDwellInput = QCheckBox('Adaptive Dwell Radius')
+        self.adaptiveDwellInput.setChecked(False)
+        self.adaptiveDwellInput.toggled.connect(self.onAdaptiveDwellChanged)
+
+        self.effectiveDwellLabel = QLabel()
+
         self.mouseEnabledInput = QCheckBox('Mouse Control')
         self.mouseEnabledInput.setChecked(False)
         self.mouseEnabledInput.toggled.connect(self.mouseEnableChanged.emit)
@@ -99,7 +126,19 @@ class TagWindow(QWidget):
         self.form.layout().addRow('Smoothing', self.smoothingInput)
         self.form.layout().addRow('Dwell Radius', self.dwellRadiusInput)
         self.form.layout().addRow('Dwell Time', self.dwellTimeInput)
+        self.form.layout().addRow('', self.adaptiveDwellInput)
+        self.form.layout().addRow('', self.effectiveDwellLabel)
+        self.heatmapEnabledInput = QCheckBox('Show Heatmap')
+        self.heatmapEnabledInput.setChecked(False)
+        self.heatmapEnabledInput.toggled.connect(self.onHeatmapEnabledChanged)
+
+        self.edgeMarkersInput = QCheckBox('Edge Markers')
+        self.edgeMarkersInput.setChecked(False)
+        self.edgeMarkersInput.toggled.connect(self.onEdgeMarkersChanged)
+
+        self.form.layout().addRow('', self.edgeMarkersInput)
         self.form.layout().addRow('', self.mouseEnabledInput)
+        self.form.layout().addRow('', self.heatmapEnabledInput)
 
         self.instructionsLabel = QLabel('Right-click one of the tags to toggle settings view.')
         self.instructionsLabel.setAlignment(Qt.AlignHCenter)
@@ -153,20 +192,55 @@ class TagWindow(QWidget):
         self.clicked = clicked
         self.repaint()
 
-    def updatePoint(self, norm_x, norm_y):
-        tagMargin = 0.1 * self.tagSizeInput.value()
-        surfaceSize = (
-            self.width() - 2*tagMargin,
-            self.height() - 2*tagMargin,
-        )
-
-        self.point = (
-            norm_x*surfaceSize[0] + tagMargin,
-            (surfaceSize[1] - norm_y*surfaceSize[1]) + tagMargin
-        )
+    def setDwellProgress(self, progress, clicked):
+        """Progress (0 to 1, or None) towards the next dwell click, and whether it clicked. Painted with the next point."""
+        self.dwellProgress = progress or 0.0
+        self.clicked = clicked
 
+    def setEffectiveDwell(self, radius, duration, noise=None):
+        """Shows the dwell parameters in use while the radius is adapted to measured noise."""
+        self.effectiveDwellRadius = radius
+        noiseText = 'measuring noise' if noise is None else f'noise {noise:.1f} px'
+        self.effectiveDwellLabel.setText(f'Dwell: {radius:.0f} px, {duration:.2f} s ({noiseText})')
+
+    def onAdaptiveDwellChanged(self, enabled):
+        self.dwellRadiusInput.setEnabled(not enabled)
+        if not enabled:
+            self.effectiveDwellRadius = None
+            self.effectiveDwellLabel.clear()
+        self.adaptiveDwellChanged.emit(enabled)
+
+    def getDwellRadius(self):
+        if self.effectiveDwellRadius is not None:
+            return self.effectiveDwellRadius
+        return self.dwellRadiusInput.value()
+
+    def setHeatmap(self, bgrImage):
+        """Shows a gaze_heatmap.GazeHeatmap.snapshotImage() stretched over the surface."""
+        height, width, _ = bgrImage.shape
+        self.heatmap = QImage(bgrImage.data, width, height, bgrImage.strides[0], QImage.Format_BGR888).copy()
+        self.update()
+
+    def onHeatmapEnabledChanged(self, enabled):
+        if not enabled:
+            self.heatmap = None
+            self.update()
+        self.heatmapEnableChanged.emit(enabled)
+
+    def getGazeMargin(self):
+        """Distance between the window edge and the area gaze points are mapped into."""
+        return 0.1 * self.tagSizeInput.value()
+
+    def getSurfaceTransform(self):
+        """Normalized surface to window to screen coordinates, for the current geometry and gaze margin."""
+        if self.surfaceTransform is None:
+            origin = self.mapToGlobal(QPoint(0, 0))
+            self.surfaceTransform = SurfaceTransform(self.width(), self.height(), self.getGazeMargin(), origin.x(), origin.y())
+        return self.surfaceTransform
+
+    def showGlobalPoint(self, x, y):
+        self.point = tuple(int(value) for value in self.getSurfaceTransform().screenToWindow(x, y))
         self.repaint()
-        return self.mapToGlobal(QPoint(*self.point))
 
     def showMarkerFeedback(self, markerIds):
         self.visibleMarkerIds = markerIds
@@ -175,23 +249,44 @@ class TagWindow(QWidget):
     def paintEvent(self, event):
         painter = QPainter(self)
 
+        if self.settingsVisible and self.heatmap is not None:
+            painter.setOpacity(0.5)
+            painter.drawImage(self.rect(), self.heatmap)
+            painter.setOpacity(1.0)
+
         if self.settingsVisible:
             if self.clicked:
                 painter.setBrush(Qt.red)
             else:
                 painter.setBrush(Qt.white)
 
-            painter.drawEllipse(QPoint(*self.point), self.dwellRadiusInput.value(), self.dwellRadiusInput.value())
-
-        for cornerIdx in range(4):
-            cornerRect = self.getCornerRect(cornerIdx)
-            if cornerIdx not in self.visibleMarkerIds:
+            dwellRadius = self.getDwellRadius()
+            painter.drawEllipse(QPoint(*self.point), dwellRadius, dwellRadius)
+
+            if 0.0 < self.dwellProgress < 1.0:
+                # Clockwise from 12 o'clock, in 1/16 degrees
+                ringRadius = dwellRadius + DWELL_RING_WIDTH / 2
+                x, y = self.point
+                painter.setPen(self.dwellRingPen)
+                painter.setBrush(Qt.NoBrush)
+                painter.drawArc(QRectF(x - ringRadius, y - ringRadius, 2*ringRadius, 2*ringRadius),
+                                90 * 16, -int(self.dwellProgress * 360 * 16))
+                painter.setPen(Qt.black)
+
+        for markerId, rect in self.getMarkerLayout().rects.items():
+            cornerRect = rectToQRect(rect)
+            if markerId not in self.visibleMarkerIds:
                 painter.fillRect(cornerRect.marginsAdded(QMargins(5, 5, 5, 5)), QColor(255, 0, 0))
 
-            painter.drawPixmap(cornerRect, self.pixmaps[cornerIdx])
+            painter.drawPixmap(cornerRect, createMarker(markerId))
             painter.fillRect(cornerRect, QColor(0, 0, 0, 255-self.tagBrightnessInput.value()))
 
+    def moveEvent(self, event):
+        self.surfaceTransform = None
+        self.surfaceChanged.emit()
+
     def resizeEvent(self, event):
+        self.surfaceTransform = None
         self.updateMask()
         self.surfaceChanged.emit()
         # Update range of offset input on resize
@@ -201,68 +296,65 @@ class TagWindow(QWidget):
             self.rightTagOffsetInput.setRange(-self.width() // 2, self.width() // 2)
 
     def onTagSizeChanged(self, value):
+        self.surfaceTransform = None
+        self.updateMask()
         self.repaint()
         self.surfaceChanged.emit()
 
     def onLeftTagOffsetChanged(self, value): # Renamed method
         self.leftTagHorizontalOffset = value
+        self.updateMask()
         self.repaint()
         self.surfaceChanged.emit()
         self.leftTagOffsetChanged.emit(value)
 
     def onRightTagOffsetChanged(self, value): # New method for right offset
         self.rightTagHorizontalOffset = value
+        self.updateMask()
         self.repaint()
         self.surfaceChanged.emit()
         self.rightTagOffsetChanged.emit(value)
 
+    def onEdgeMarkersChanged(self, enabled):
+        self.updateMask()
+        self.repaint()
+        self.surfaceChanged.emit()
+
     def getMarkerSize(self):
         return self.tagSizeInput.value()
 
-    def getTagPadding(self):
-        return self.getMarkerSize()/8
+    def getMarkerLayout(self):
+        return screenLayout(
+            self.width(), self.height(), self.getMarkerSize(),
+            self.leftTagHorizontalOffset, self.rightTagHorizontalOffset, self.edgeMarkersInput.isChecked()
+        )
 
     def getMarkerVerts(self):
-        tagPadding = self.getTagPadding()
-        markers_verts = {}
-
-        for cornerIdx, markerID in enumerate(self.markerIDs):
-            rect = self.getCornerRect(cornerIdx) - QMargins(tagPadding, tagPadding, tagPadding, tagPadding)
-
-            markers_verts[markerID] = [
-                pointToTuple(rect.topLeft()),
-                pointToTuple(rect.topRight()),
-                pointToTuple(rect.bottomRight()),
-                pointToTuple(rect.bottomLeft()),
-            ]
-
-        return markers_verts
+        return self.getMarkerLayout().markers
 
     def getSurfaceSize(self):
         return (self.width(), self.height())
 
     def updateMask(self):
+        if not hasattr(self, 'edgeMarkersInput'): # Offsets are set while the inputs are created
+            return
+
+        # Layouts are cached, so an unchanged layout is the same object and the mask is not rebuilt
+        layout = self.getMarkerLayout()
+        maskKey = (self.settingsVisible, layout)
+        if self.maskKey is not None and self.maskKey[0] == maskKey[0] and self.maskKey[1] is layout:
+            return
+        self.maskKey = maskKey
+
         if self.settingsVisible:
             mask = QRegion(0, 0, self.width(), self.height())
 
         else:
             mask = QRegion(0, 0, 0, 0)
-            for cornerIdx in range(4):
-                rect = self.getCornerRect(cornerIdx).marginsAdded(QMargins(2, 2, 2, 2))
-                mask = mask.united(rect)
+            for rect in layout.rects.values():
+                mask = mask.united(rectToQRect(rect).marginsAdded(QMargins(2, 2, 2, 2)))
 
         self.setMask(mask)
 
-
     def getCornerRect(self, cornerIdx):
-        tagSize = self.tagSizeInput.value()
-        tagSizePadded = tagSize + self.getTagPadding()*2
-        
-        if cornerIdx == 0: # Top-left
-            return QRect(0 + self.leftTagHorizontalOffset, 0, tagSizePadded, tagSizePadded)
-        elif cornerIdx == 1: # Top-right
-            return QRect(self.width()-tagSizePadded + self.rightTagHorizontalOffset, 0, tagSizePadded, tagSizePadded)
-        elif cornerIdx == 2: # Bottom-right
-            return QRect(self.width()-tagSizePadded + self.rightTagHorizontalOffset, self.height()-tagSizePadded, tagSizePadded, tagSizePadded)
-        elif cornerIdx == 3: # Bottom-left
-            return QRect(0 + self.leftTagHorizontalOffset, self.height()-tagSizePadded, tagSizePadded, tagSizePadded)
+        return rectToQRect(self.getMarkerLayout().rects[cornerIdx])